@@ -1,71 +1,552 @@
-import pandas as pd
+import time
+_IMPORT_START = time.perf_counter()
+
+import os
 import json
-from langchain_ollama import OllamaLLM
-from langchain.agents import AgentType, initialize_agent, Tool
-from analysis import (predict_delay_for_new_time, find_top_cascading_flights, 
+import pandas as pd
+import re
+import queue
+import threading
+from collections import namedtuple
+from analysis import (predict_delay_for_new_time, find_top_cascading_flights,
                       optimize_flight_schedule, parse_delay_from_string,
-                      run_system_wide_optimization, process_flight_data)
+                      run_system_wide_optimization, iter_system_wide_optimization,
+                      process_flight_data, warm_prediction_cache, get_model, use_model)
+from flight_index import FlightIndex
+from time_index import MAX_LOOKAHEAD_MINS, TimeIndex, WEEKDAYS
+from live_feed import FEED_ENV, start_live_tracker
+from data_loader import RAW_DATA_PATH, load_flights
+from aggregates import STATE_PATH, FlightAggregator
+from cascade import CascadeEngine
+from snapshot import SNAPSHOT_PATH, SUMMARY_PATH, Snapshot, summary_to_markdown
+from partitions import AIRPORT_ENV, AIRPORT_TASKS, fan_out, list_partitions, load_airport_flights, shared_pool, use_airport
+from telemetry import span, increment, observe
+
+# Seconds spent in each startup step (and in each deferred load, once it happens)
+STARTUP_TIMINGS = {"import agent_engine": time.perf_counter() - _IMPORT_START}
+
+# Same fields as langchain's Tool, so tools can be called without importing LangChain.
+# `stream`, if set, is a generator version of `func` yielding progressively more complete answers.
+ToolSpec = namedtuple('ToolSpec', ['name', 'func', 'description', 'stream'], defaults=[None])
+
+
+class LazyResource:
+    """Defers building a heavy object until a tool first needs it, and records how long that took."""
+
+    def __init__(self, name, loader):
+        self.name = name
+        self._loader = loader
+        self._value = None
+        self.loaded = False
+        self._lock = threading.Lock()
+
+    def get(self):
+        if not self.loaded:
+            with self._lock:
+                if not self.loaded:
+                    start = time.perf_counter()
+                    with span('data_load', source=self.name):
+                        self._value = self._loader()
+                    self.loaded = True
+                    STARTUP_TIMINGS[f"deferred: {self.name}"] = time.perf_counter() - start
+        return self._value
+
+    def set(self, value):
+        with self._lock:
+            self._value, self.loaded = value, True
 
-def load_agent_and_precomputed_data():
+
+class LazyAnswers(dict):
+    """Pre-computed answers; values that are still callables are computed on first access."""
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        if callable(value):
+            value = value()
+            self[key] = value
+        return value
+
+
+class LazyAgent:
     """
-    This is the main function that loads all data and initializes the agent.
+    Imports LangChain and builds the ReAct agent around `tools` on the first
+    invoke(). `llm` defaults to the local Ollama llama3 (benchmarks pass a stub).
     """
-    print("--- LOADING LIGHTWEIGHT AGENT ENGINE ---")
-    
-    # Load all data from files, no heavy computation on startup
-    full_df = pd.read_csv('data/bom_week_flights_synthetic.csv')
-    full_df['sched_time_local'] = pd.to_datetime(full_df['sched_time_local'])
-    avg_delay_df = pd.read_csv('data/avg_delay_by_hour.csv')
-    busiest_df = pd.read_csv('data/busiest_hours.csv')
-    best_df = pd.read_csv('data/best_hours.csv')
-    
-    # Load the pre-computed optimization summary from the JSON file
+
+    def __init__(self, tools, llm=None):
+        self.tools = tools
+        self.llm = llm
+        self._agent = None
+        self._lock = threading.Lock()
+
+    def _get_agent(self):
+        with self._lock:
+            return self._build_agent()
+
+    def _build_agent(self):
+        if self._agent is None:
+            start = time.perf_counter()
+            print("\nInitializing AI Agent...")
+            from langchain.agents import AgentType, initialize_agent, Tool
+            handler = _llm_telemetry_handler()
+            llm = self.llm
+            if llm is None:
+                from langchain_ollama import OllamaLLM
+                llm = OllamaLLM(model="llama3", temperature=0)
+            llm.callbacks = list(llm.callbacks or []) + [handler]
+            tools = [Tool(name=spec.name, func=spec.func, description=spec.description) for spec in self.tools]
+            self._agent = initialize_agent(tools, llm, agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION, verbose=True,
+                                           handle_parsing_errors=True, callbacks=[handler])
+            STARTUP_TIMINGS["deferred: LLM agent"] = time.perf_counter() - start
+            print("✅ Final, efficient AI Agent is ready.")
+        return self._agent
+
+    def invoke(self, *args, **kwargs):
+        return self._get_agent().invoke(*args, **kwargs)
+
+    def stream(self, query: str):
+        """Yields ('token', text) for each LLM token as it is generated (reasoning included), then ('output', answer)."""
+        from langchain_core.callbacks import BaseCallbackHandler
+        agent = self._get_agent()
+        events = queue.Queue()
+
+        class TokenQueue(BaseCallbackHandler):
+            def on_llm_new_token(self, token, **kwargs):
+                events.put(('token', token))
+
+        def run():
+            try:
+                events.put(('output', agent.invoke({"input": query}, config={"callbacks": [TokenQueue()]})['output']))
+            except Exception as e:
+                events.put(('error', e))
+
+        threading.Thread(target=run, daemon=True).start()
+        while True:
+            kind, value = events.get()
+            if kind == 'error':
+                raise value
+            yield kind, value
+            if kind == 'output':
+                return
+
+
+def _markdown(df, **kwargs) -> str:
+    with span('render_markdown'):
+        return df.to_markdown(**kwargs)
+
+def _instrumented(spec: ToolSpec) -> ToolSpec:
+    """Times every call of a tool (and, for streaming tools, the time to its first partial answer)."""
+    def func(inputs=""):
+        increment('tool_calls', tool=spec.name)
+        with span('tool_call', tool=spec.name):
+            return spec.func(inputs)
+
+    def stream(inputs=""):
+        increment('tool_calls', tool=spec.name)
+        with span('tool_call', tool=spec.name):
+            start, first = time.perf_counter(), True
+            for output in spec.stream(inputs):
+                if first:
+                    observe('tool_first_output_seconds', time.perf_counter() - start, tool=spec.name)
+                    first = False
+                yield output
+
+    return spec._replace(func=func, stream=stream if spec.stream is not None else None)
+
+def _llm_telemetry_handler():
+    """LangChain callback handler that records LLM call latency, streamed tokens and agent steps."""
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class TelemetryHandler(BaseCallbackHandler):
+        def __init__(self):
+            self._starts = {}
+
+        def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+            self._starts[run_id] = time.perf_counter()
+
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            start = self._starts.pop(run_id, None)
+            if start is not None:
+                observe('llm_call_seconds', time.perf_counter() - start)
+
+        def on_llm_error(self, error, *, run_id, **kwargs):
+            self._starts.pop(run_id, None)
+            increment('llm_call_errors')
+
+        def on_llm_new_token(self, token, **kwargs):
+            increment('llm_tokens')
+
+        def on_agent_action(self, action, **kwargs):
+            increment('agent_steps', tool=action.tool)
+
+    return TelemetryHandler()
+
+def startup_timings() -> dict:
+    return dict(STARTUP_TIMINGS)
+
+def _split_date(inputs: str):
+    """Pulls an optional YYYY-MM-DD date out of a tool input string."""
+    match = re.search(r"\d{4}-\d{2}-\d{2}", inputs)
+    if not match:
+        return inputs, None
+    return inputs.replace(match.group(0), ""), match.group(0)
+
+def _valid_date(date):
+    """`date` (YYYY-MM-DD, or None) if it is a real calendar date; raises ValueError otherwise."""
+    if date is not None:
+        pd.Timestamp(date)
+    return date
+
+def _valid_clock(clock: str) -> str:
+    """`clock` (HH:MM) if it is a time of day between 00:00 and 23:59; raises ValueError otherwise."""
+    hours, minutes = map(int, clock.split(':'))
+    if not (0 <= hours <= 23 and 0 <= minutes <= 59):
+        raise ValueError(f"'{clock}' is not a time of day")
+    return clock
+
+def _parse_count(n: str, default=5) -> int:
+    digits = "".join(filter(str.isdigit, n or ""))
+    return int(digits) if digits else default
+
+def _cascade_sources_tool(inputs: str, cascade_engine):
+    """Parses 'airline=6E, hour=9, day=Tuesday, top=5' style filters (all optional)."""
+    filters = dict(re.findall(r"(airline|hour|day|top)\s*[=:]\s*([\w-]+)", inputs or "", flags=re.IGNORECASE))
+    filters = {key.lower(): value for key, value in filters.items()}
+    # A bare number (e.g. '5') is the number of flights to show
+    top = filters.pop('top', None) or (_parse_count(inputs, default=10) if not filters else 10)
+    try:
+        top = int(top)
+        if 'hour' in filters:
+            filters['hour'] = int(filters['hour'])
+            if not 0 <= filters['hour'] <= 23:
+                raise ValueError(f"hour {filters['hour']} is out of range")
+        if 'day' in filters and filters['day'].capitalize() not in WEEKDAYS:
+            _valid_date(filters['day'])
+        if 'airline' in filters:
+            filters['airline'] = filters['airline'].upper()
+            if not re.fullmatch(r"[A-Z0-9]{2,3}", filters['airline']):
+                raise ValueError(f"'{filters['airline']}' is not an airline code")
+    except ValueError:
+        return ("Please filter with airline=<code>, hour=<0-23>, day=<YYYY-MM-DD or weekday> and top=<n> "
+                "(all optional), e.g. 'airline=6E, hour=9, day=Tuesday, top=5'.")
+    return _markdown(cascade_engine.top_k(top, **filters))
+
+def _predict_tool(inputs: str, flight_index):
+    """Parses 'AI101, 14' or 'AI101, 14, 2025-08-12' (flight, new hour 0-23, optional date)."""
+    inputs, date = _split_date(inputs)
+    parts = inputs.split(',')
+    try:
+        hour = int("".join(filter(str.isdigit, parts[1])))
+        if not 0 <= hour <= 23:
+            raise ValueError(f"hour {hour} is out of range")
+        _valid_date(date)
+    except (ValueError, IndexError):
+        return "Please give a flight ID, a new hour (0-23) and optionally a date, e.g. 'AI101, 14' or 'AI101, 14, 2025-08-12'."
+    return predict_delay_for_new_time(flight_id=parts[0].strip(), new_time_hour=hour, full_flight_df=flight_index, date=date)
+
+def _optimize_tool(inputs: str, flight_index, avg_delay_df):
+    """Parses 'AI101' or 'AI101, 2025-08-12'."""
+    inputs, date = _split_date(inputs)
+    try:
+        _valid_date(date)
+    except ValueError:
+        return f"'{date}' is not a valid date. Please use 'AI101' or 'AI101, 2025-08-12' (YYYY-MM-DD)."
+    return optimize_flight_schedule(inputs.split(',')[0].strip(), flight_index, avg_delay_df, date=date)
+
+def _day_plan_tool(inputs: str, full_df, busiest_df):
+    """Parses '2025-08-12'."""
+    # scipy is only imported once somebody actually asks for a day plan
+    from slot_assignment import summarize_day_assignment
+    date = _split_date(inputs or "")[1] or (inputs or "").strip()
+    try:
+        _valid_date(date)
+    except ValueError:
+        return f"'{date}' is not a valid date. Please give the day to plan as YYYY-MM-DD, e.g. '2025-08-12'."
+    return summarize_day_assignment(full_df, busiest_df, date)
+
+def _runway_load_tool(inputs: str, time_index, slot_mins=15):
+    """Parses '45' or '45, 2025-08-12 09:30': minutes ahead (default 60) and an optional start (default: now)."""
+    rest, date = _split_date(inputs or "")
+    clock = re.search(r"\b(\d{1,2}:\d{2})\b", rest)
+    minutes = _parse_count(rest.replace(clock.group(0), "") if clock else rest, default=60)
+    usage = (f"Please give the minutes ahead (1-{MAX_LOOKAHEAD_MINS}) and optionally a start time, "
+             f"e.g. '45' or '45, 2025-08-12 09:30'.")
+    if not 1 <= minutes <= MAX_LOOKAHEAD_MINS:
+        return usage
+    start = time_index.reference_time()
+    if clock:
+        try:
+            start = (pd.Timestamp(_valid_date(date) or start.normalize()).normalize()
+                     + pd.Timedelta(f"{_valid_clock(clock.group(1))}:00"))
+        except ValueError:
+            return usage
+    end = start + pd.Timedelta(minutes=minutes)
+
+    scheduled = time_index.between(start, end)
+    late = time_index.overlap(start, end)
+    late = late[(late['sched_time_local'] < start) & (late['actual_time_local'] >= start)]
+    op_counts = scheduled['op_type'].astype(str).value_counts()
+    slots = time_index.occupancy(start, end, slot_mins, slot_mins).rename(columns={'movements': 'scheduled'})
+    slots['actual'] = time_index.occupancy(start, end, slot_mins, slot_mins, column='actual')['movements']
+    slots['window_start'] = slots['window_start'].dt.strftime('%H:%M')
+    slots['window_end'] = slots['window_end'].dt.strftime('%H:%M')
+
+    report = (f"**Runway load {start:%a %Y-%m-%d %H:%M} - {end:%H:%M} ({minutes} min):** "
+              f"{len(scheduled)} scheduled movements ({op_counts.get('ARRIVAL', 0)} arrivals, "
+              f"{op_counts.get('DEPARTURE', 0)} departures), {time_index.count(start, end, column='actual')} by actual "
+              f"times, plus {len(late)} late flight(s) from earlier slots still to operate.\n\n"
+              + _markdown(slots, index=False))
+    if len(scheduled):
+        columns = ['flight', 'op_type', 'origin', 'destination', 'sched_time_local', 'actual_time_local', 'delay_min']
+        report += "\n\nScheduled flights:\n\n" + _markdown(scheduled[columns].head(20), index=False)
+    return report
+
+def _time_window_tool(inputs: str, time_index, slot_mins=15):
+    """Parses 'Tuesday, 09:30-10:15' or '2025-08-12, 09:30-10:15' (without a day: every day in the schedule)."""
+    rest, date = _split_date(inputs or "")
+    times = re.findall(r"\b\d{1,2}:\d{2}\b", rest)
+    usage = "Please give a time window between 00:00 and 23:59, e.g. 'Tuesday, 09:30-10:15' or '2025-08-12, 09:30-10:15'."
+    if len(times) < 2:
+        return usage
+    try:
+        _valid_date(date)
+        times = [_valid_clock(t) for t in times[:2]]
+    except ValueError:
+        return usage
+    weekday = next((day for day in WEEKDAYS if re.search(rf"\b{day}\b", rest, re.IGNORECASE)), None)
+    windows = time_index.day_windows(date or weekday, times[0], times[1])
+    if not windows:
+        return f"The schedule has no {weekday or date} between {time_index.first_time:%Y-%m-%d} and {time_index.last_time:%Y-%m-%d}."
+
+    rows = []
+    for start, end in windows:
+        scheduled = time_index.between(start, end)
+        peak = time_index.peak_window(start, end, window_mins=slot_mins)
+        late = time_index.overlap(start, end)
+        rows.append({'date': f"{start:%a %Y-%m-%d}", 'scheduled': len(scheduled),
+                     'actual': time_index.count(start, end, column='actual'),
+                     'late_from_earlier': int(((late['sched_time_local'] < start) & (late['actual_time_local'] >= start)).sum()),
+                     f'peak_{slot_mins}min': int(peak['movements']) if peak is not None else 0,
+                     'peak_starts': f"{peak['window_start']:%H:%M}" if peak is not None else "",
+                     'avg_delay_min': round(float(scheduled['delay_min'].mean()), 2) if len(scheduled) else 0.0})
+    report = (f"**Flights between {times[0]} and {times[1]}** ({'every day' if not (date or weekday) else date or weekday + 's'}; "
+              f"'late_from_earlier' counts flights scheduled before the window that operate in or after it):\n\n"
+              + _markdown(pd.DataFrame(rows), index=False))
+    if len(windows) == 1:
+        flights = time_index.between(*windows[0])
+        columns = ['flight', 'op_type', 'origin', 'destination', 'sched_time_local', 'actual_time_local', 'delay_min']
+        report += "\n\n" + _markdown(flights[columns].head(30), index=False)
+    return report
+
+def _live_delay_tool(inputs: str, tracker):
+    """Parses 'SQ279' or 'SQ279, 2025-08-12'."""
+    rest, date = _split_date(inputs or "")
     try:
-        with open('data/optimization_summary.json', 'r') as f:
-            optimization_summary = json.load(f)
+        e = tracker.expected_delay(rest.split(',')[0].strip(), _valid_date(date))
+    except KeyError as err:
+        return err.args[0]
+    except ValueError:
+        return f"'{date}' is not a valid date. Please use 'SQ279' or 'SQ279, 2025-08-12' (YYYY-MM-DD)."
+    stats = tracker.stats()
+    if e['status'] == 'observed':
+        basis = "observed from its actual movement time"
+    elif e['propagated_delay_min'] > 0:
+        basis = (f"{e['propagated_delay_min']:.1f} min knocked on from earlier legs of {e['tail_id']}; "
+                 f"model alone: {e['model_delay_min']:.1f} min")
+    else:
+        basis = "model forecast; no knock-on delay from earlier legs"
+    feed = ("no live event feed is connected" if not stats['events'] else
+            f"{stats['events']} live events so far, last one {stats['last_event_age_seconds']:.1f}s ago")
+    return (f"**{e['flight']}** (scheduled {e['sched_time_local']:%Y-%m-%d %H:%M}): current expected delay "
+            f"**{e['expected_delay_min']:.1f} min** ({basis}). Updated {e['age_seconds']:.1f}s ago; {feed}.")
+
+def _compare_airports_tool(inputs: str):
+    """Parses 'summary', 'busiest, BOM DEL', 'cascades' or 'optimize 50' (task, optional airport codes, optional count)."""
+    available = list_partitions()
+    if not available:
+        return "No partitioned airports found. Run `python partitions.py split <flights.csv>` and `python partitions.py build` first."
+    task = next((name for name in AIRPORT_TASKS if re.search(rf"\b{name[:6]}", inputs or "", re.IGNORECASE)), 'summary')
+    airports = [code for code in re.findall(r"\b[A-Z]{3}\b", (inputs or "").upper()) if code in available] or None
+    count = {'busiest': 'n', 'cascades': 'n', 'optimize': 'sample_size'}.get(task)
+    kwargs = {count: _parse_count(inputs, default=5 if count == 'n' else 100)} if count else {}
+    # A long-lived pool keeps each worker's loaded flight tables, and keeps model switches out of this process
+    merged = fan_out(task, airports, pool=shared_pool(min(os.cpu_count() or 1, len(available))), **kwargs)
+    return f"**{task.capitalize()} for {', '.join(airports or available)}:**\n\n" + _markdown(merged, index=False)
+
+def _last(stream):
+    result = None
+    for result in stream:
+        pass
+    return result
+
+def _system_wide_stream(inputs: str, flight_index, aggregator, optimization_summary, top_n=5):
+    """Runs the system-wide optimization, yielding a progress report with the best moves so far after every batch."""
+    if get_model() is None:
+        yield "ML model is not loaded. Please run train_model.py."
+        return
+    sample_size = None if re.search(r"\b(all|every|full)\b", inputs or "", re.IGNORECASE) else _parse_count(inputs, default=100)
+    best = None
+    # Chat-triggered runs are often samples; they must not replace the results of the last full run on disk
+    for event in iter_system_wide_optimization(flight_index, aggregator.avg_delay_by_hour(), sample_size=sample_size,
+                                               persist=False):
+        if event['event'] == 'summary':
+            if event['summary'] is not None:
+                optimization_summary.set(event['summary'])
+            yield summary_to_markdown(event['summary'])
+            return
+        if not event['results'].empty:
+            best = event['results'] if best is None else pd.concat([best, event['results'].nlargest(top_n, 'delay_reduction_mins')])
+            best = best.nlargest(top_n, 'delay_reduction_mins')
+        totals = event['totals']
+        progress = (f"**Optimizing:** {event['flights_done']:,} / {event['flights_total']:,} flights "
+                    f"({event['flights_done'] / max(event['flights_total'], 1):.0%}) in {event['elapsed']:.1f}s; "
+                    f"predicted delay so far {totals['original_predicted_delay']:,.2f} -> "
+                    f"{totals['optimized_predicted_delay']:,.2f} mins (saved {totals['delay_reduction_mins']:,.2f}).")
+        yield progress if best is None else progress + "\n\nBiggest savings so far:\n\n" + _markdown(best, index=False)
+
+def _load_model_and_warm_cache(full_df):
+    model = get_model()
+    # Pre-score every route x hour x weekday so what-if answers are cache lookups
+    routes = full_df[['origin', 'destination']].drop_duplicates().itertuples(index=False, name=None)
+    warm_prediction_cache(list(routes), full_df['sched_time_local'].dt.month.unique().tolist())
+    return model
+
+def _load_optimization_summary(flight_index, aggregator, summary_path=SUMMARY_PATH):
+    try:
+        with open(summary_path, 'r') as f:
+            return json.load(f)
     except FileNotFoundError:
         print("WARNING: optimization_summary.json not found. Running optimization now...")
         # Fallback: run optimization if the file doesn't exist
-        optimization_summary = run_system_wide_optimization(full_df, avg_delay_df)
+        return run_system_wide_optimization(flight_index, aggregator.avg_delay_by_hour())
+
+def _load_live_aggregator(fallback, state_path=STATE_PATH):
+    # Busiest/best hours come from the live running aggregates, which append jobs keep updating
+    try:
+        return FlightAggregator.load(state_path)
+    except FileNotFoundError:
+        return fallback()
+
+def load_agent_and_precomputed_data(use_snapshot=True, snapshot_path=SNAPSHOT_PATH, data_path=RAW_DATA_PATH, llm=None,
+                                    airport=None):
+    """
+    This is the main function that loads all data and initializes the agent.
+
+    Nothing heavy happens here: with a fresh snapshot (built by `python snapshot.py`)
+    startup only reads its manifest. The flight table, indexes, model and the
+    LangChain agent are loaded the first time a tool or query needs them.
+
+    With `airport` (default: $FLIGHT_AIRPORT) the engine serves that airport of
+    the partitioned dataset (see partitions.py): only its partitions, model and
+    summaries are loaded. The snapshot is single-airport, so it is not used.
+    """
+    start = time.perf_counter()
+    print("--- LOADING LIGHTWEIGHT AGENT ENGINE ---")
+
+    airport = airport or os.environ.get(AIRPORT_ENV)
+    airport_files = use_airport(airport) if airport else None
+    if airport_files is not None:
+        use_snapshot = False
+        STARTUP_TIMINGS["airport"] = airport_files.airport
+
+    snapshot = None
+    if use_snapshot:
+        try:
+            snapshot = Snapshot(snapshot_path)
+            if not snapshot.is_fresh():
+                print(f"WARNING: '{snapshot_path}' is older than the data or model; loading from source files. "
+                      f"Run `python snapshot.py` to rebuild it.")
+                snapshot = None
+        except FileNotFoundError:
+            snapshot = None
+
+    if snapshot is not None:
+        flight_index = LazyResource("flight index", lambda: snapshot.load('flight_index.pkl'))
+        flights = LazyResource("flight table", lambda: flight_index.get().df)
+        time_index = LazyResource("time index", lambda: TimeIndex(flights.get()))
+        cascade = LazyResource("cascade engine", lambda: snapshot.load('cascade_engine.pkl'))
+        model = LazyResource("delay model", lambda: use_model(snapshot.load('model.pkl'), snapshot.model_signature,
+                                                              snapshot.load('prediction_cache.pkl')))
+        saved_aggregates = snapshot.manifest['aggregates']
+        aggregator = _load_live_aggregator(lambda: FlightAggregator.from_dict(saved_aggregates))
+        optimization_summary = LazyResource("optimization summary", lambda: snapshot.manifest['optimization_summary'])
+        precomputed_answers = LazyAnswers(snapshot.manifest['precomputed_answers'])
+        STARTUP_TIMINGS["snapshot"] = snapshot_path
+    else:
+        flights = LazyResource("flight table", lambda: load_airport_flights(airport_files.airport) if airport_files
+                               else load_flights(data_path))
+        flight_index = LazyResource("flight index", lambda: FlightIndex(flights.get()))
+        time_index = LazyResource("time index", lambda: TimeIndex(flights.get()))
+        cascade = LazyResource("cascade engine", lambda: CascadeEngine(flights.get()))
+        model = LazyResource("delay model", lambda: _load_model_and_warm_cache(flights.get()))
+        aggregator = _load_live_aggregator(lambda: FlightAggregator().update(flights.get()),
+                                           airport_files.aggregates_path if airport_files else STATE_PATH)
+        summary_path = os.path.join(airport_files.root, 'optimization_summary.json') if airport_files else SUMMARY_PATH
+        optimization_summary = LazyResource("optimization summary",
+                                            lambda: _load_optimization_summary(flight_index.get(), aggregator, summary_path))
+        # Prepare the pre-computed answers dictionary for the UI's safety net
+        precomputed_answers = LazyAnswers({
+            "What are the 3 busiest hours?": lambda: aggregator.busiest_hours().head(3).to_markdown(),
+            "What are the best hours to fly?": lambda: aggregator.best_hours().to_markdown(),
+            "Which flights are the biggest cascade risks?": lambda: find_top_cascading_flights(flight_index.get()).to_markdown(),
+            "Show me the optimization summary": lambda: summary_to_markdown(optimization_summary.get()),
+        })
+        STARTUP_TIMINGS["snapshot"] = "not used"
 
+    # Fed from $FLIGHT_EVENT_FEED (a JSONL file to tail, or tcp://host:port) once the model is loaded
+    live = LazyResource("live delay tracker", lambda: start_live_tracker(flight_index.get()))
 
-    print("\nInitializing AI Agent...")
-    llm = OllamaLLM(model="llama3", temperature=0)
+    def with_model(func):
+        def call(inputs=""):
+            model.get()
+            return func(inputs)
+        return call
 
     tools = [
-        Tool(name="Get Busiest Hours",
-             func=lambda n="5": busiest_df.head(int("".join(filter(str.isdigit, n))) if n else 5).to_markdown(),
-             description="Use for finding the busiest hours. Input can be the number of hours to show."),
-        Tool(name="Get Best Hours",
-             func=lambda n="5": best_df.head(int("".join(filter(str.isdigit, n))) if n else 5).to_markdown(),
-             description="Use for finding the best (least delayed) hours. Input can be the number of hours to show."),
-        Tool(name="Predict Schedule Impact",
-             func=lambda inputs: predict_delay_for_new_time(
-                 flight_id=inputs.split(',')[0].strip(), 
-                 new_time_hour=int("".join(filter(str.isdigit, inputs.split(',')[1]))), 
-                 full_flight_df=full_df),
-             description="Use for a 'what-if' analysis on a SPECIFIC FLIGHT. Input must be the FLIGHT ID and the new hour, separated by a comma. Example: 'SQ279, 14'."),
-        Tool(name="Optimize Single Flight Schedule",
-             func=lambda flight_id: optimize_flight_schedule(flight_id, full_df, avg_delay_df),
-             description="Use this to find a better, less-delayed time for a single, specific flight. The input MUST be the flight ID string (e.g., 'SQ279')."),
-        Tool(name="Find Cascade Flights",
-             func=lambda x: find_top_cascading_flights(full_df).to_markdown(),
-             description="Use this to find the top 10 flights that cause cascading delays. Takes no input."),
-        Tool(name="Get System-Wide Optimization Summary",
-             func=lambda x: pd.DataFrame.from_dict(optimization_summary, orient='index', columns=['Value']).to_markdown(),
-             description="Use this to get the summary of the system-wide optimization, including total delays, savings, and costs. Takes no input.")
+        ToolSpec(name="Get Busiest Hours",
+                 func=lambda n="5": _markdown(aggregator.refresh().busiest_hours().head(_parse_count(n))),
+                 description="Use for finding the busiest hours. Input can be the number of hours to show."),
+        ToolSpec(name="Get Best Hours",
+                 func=lambda n="5": _markdown(aggregator.refresh().best_hours(_parse_count(n))),
+                 description="Use for finding the best (least delayed) hours. Input can be the number of hours to show."),
+        ToolSpec(name="Predict Schedule Impact",
+                 func=with_model(lambda inputs: _predict_tool(inputs, flight_index.get())),
+                 description="Use for a 'what-if' analysis on a SPECIFIC FLIGHT. Input must be the FLIGHT ID and the new hour, separated by a comma, optionally followed by the date. Example: 'SQ279, 14' or 'SQ279, 14, 2025-08-12'."),
+        ToolSpec(name="Optimize Single Flight Schedule",
+                 func=with_model(lambda inputs: _optimize_tool(inputs, flight_index.get(), aggregator.avg_delay_by_hour())),
+                 description="Use this to find a better, less-delayed time for a single, specific flight. The input MUST be the flight ID string (e.g., 'SQ279'), optionally followed by the date (e.g., 'SQ279, 2025-08-12')."),
+        ToolSpec(name="Optimize Day Schedule With Capacity",
+                 func=with_model(lambda inputs: _day_plan_tool(inputs, flights.get(), aggregator.refresh().busiest_hours())),
+                 description="Use this to re-plan ALL flights of one day at once while respecting runway capacity per hour. The input MUST be the date (e.g., '2025-08-12')."),
+        ToolSpec(name="Find Cascade Flights",
+                 func=lambda x="": _markdown(find_top_cascading_flights(flight_index.get())),
+                 description="Use this to find the top 10 flights that cause cascading delays. Takes no input."),
+        ToolSpec(name="Rank Cascade Sources",
+                 func=lambda inputs="": _cascade_sources_tool(inputs, cascade.get()),
+                 description="Use this to rank flights by the TOTAL downstream delay they trigger along the aircraft's rotation (multi-hop, across days). Optional filters: 'airline=6E', 'hour=9', 'day=Tuesday' or 'day=2025-08-12', 'top=5'."),
+        ToolSpec(name="Get Runway Load",
+                 func=lambda inputs="": _runway_load_tool(inputs, time_index.get()),
+                 description="Use this for the runway load (arrivals and departures) in the next N minutes, per 15-minute slot. Input is the number of minutes (default 60), optionally followed by a start like '2025-08-12 09:30' or '09:30' (default: now). Example: '45' or '45, 2025-08-12 09:30'."),
+        ToolSpec(name="Get Flights In Time Window",
+                 func=lambda inputs="": _time_window_tool(inputs, time_index.get()),
+                 description="Use this for the flights and sub-hour congestion in a time-of-day window, on a date, on a weekday or on every day. Input is an optional day and the window. Example: 'Tuesday, 09:30-10:15' or '2025-08-12, 09:30-10:15'."),
+        ToolSpec(name="Get Current Expected Delay",
+                 func=with_model(lambda inputs: _live_delay_tool(inputs, live.get())),
+                 description=f"Use this for a flight's CURRENT expected delay, updated from the live movement feed (${FEED_ENV}) with knock-on delay from earlier legs of the same aircraft. Input is the FLIGHT ID, optionally followed by the date. Example: 'SQ279' or 'SQ279, 2025-08-12'."),
+        ToolSpec(name="Compare Airports",
+                 func=lambda inputs="": _compare_airports_tool(inputs),
+                 description="Use this to compare or combine AIRPORTS of the partitioned multi-airport dataset; each airport is answered from its own data and model, in parallel. Input is the task ('summary', 'busiest', 'cascades' or 'optimize'), optionally followed by airport codes and a count. Example: 'summary' or 'busiest, BOM DEL'."),
+        ToolSpec(name="Run System-Wide Optimization",
+                 func=with_model(lambda inputs: _last(_system_wide_stream(inputs, flight_index.get(), aggregator, optimization_summary))),
+                 stream=with_model(lambda inputs: _system_wide_stream(inputs, flight_index.get(), aggregator, optimization_summary)),
+                 description="Use this to (re-)run the system-wide schedule optimization now. Input is the number of flights to sample (default 100), or 'all' to optimize every flight. Slow for 'all'."),
+        ToolSpec(name="Get System-Wide Optimization Summary",
+                 func=lambda x="": summary_to_markdown(optimization_summary.get()),
+                 description="Use this to get the summary of the system-wide optimization, including total delays, savings, and costs. Takes no input.")
     ]
 
-    agent = initialize_agent(tools, llm, agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION, verbose=True, handle_parsing_errors=True)
-
-    print("✅ Final, efficient AI Agent is ready.")
-    
-    # Prepare the pre-computed answers dictionary for the UI's safety net
-    precomputed_answers = {
-        "What are the 3 busiest hours?": busiest_df.head(3).to_markdown(),
-        "What are the best hours to fly?": best_df.to_markdown(),
-        "Which flights are the biggest cascade risks?": find_top_cascading_flights(full_df).to_markdown(),
-        "Show me the optimization summary": pd.DataFrame.from_dict(optimization_summary, orient='index', columns=['Value']).to_markdown()
-    }
-    
+    agent = LazyAgent([_instrumented(tool) for tool in tools], llm=llm)
+    STARTUP_TIMINGS["load_agent_and_precomputed_data"] = time.perf_counter() - start
+    print(f"✅ Agent engine ready in {STARTUP_TIMINGS['load_agent_and_precomputed_data']:.2f}s "
+          f"(the LLM agent is initialized on the first open-ended question).")
     return agent, precomputed_answers
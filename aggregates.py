@@ -0,0 +1,203 @@
+import os
+import sys
+import json
+import numpy as np
+import pandas as pd
+from data_loader import parse_flights_csv
+
+OUTPUT_DIR = 'data'
+STATE_PATH = os.path.join(OUTPUT_DIR, 'aggregates_state.json')
+DAYS_ORDER = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+class FlightAggregator:
+    """
+    Running per-hour flight counts and delay sums, with day-of-week x hour and
+    airline x hour breakdowns.
+
+    `update()` costs time proportional to the new batch only, so records can be
+    appended every few minutes without regrouping the whole history. Means and
+    the summary tables are derived from the running sums on demand.
+    """
+
+    def __init__(self, state_path=None):
+        self.state_path = state_path
+        self._state_mtime = None
+        self.n_flights = 0
+        self.hour_count = np.zeros(24, dtype=np.int64)
+        # Flights with a known delay; means skip missing delays, like pandas' groupby mean
+        self.hour_delay_count = np.zeros(24, dtype=np.int64)
+        self.hour_delay_sum = np.zeros(24)
+        self.hour_delay_sq_sum = np.zeros(24)
+        self.dow_hour_count = np.zeros((7, 24), dtype=np.int64)
+        self.dow_hour_delay_sum = np.zeros((7, 24))
+        self.airline_hour_count = {}
+        self.airline_hour_delay_count = {}
+        self.airline_hour_delay_sum = {}
+
+    @staticmethod
+    def _batch_columns(batch: pd.DataFrame):
+        sched = pd.to_datetime(batch['sched_time_local'])
+        if 'actual_time_local' in batch.columns:
+            delay = (pd.to_datetime(batch['actual_time_local']) - sched).dt.total_seconds().to_numpy() / 60
+        else:
+            delay = batch['delay_min'].to_numpy(dtype=float)
+        return sched.dt.hour.to_numpy(), sched.dt.weekday.to_numpy(), delay
+
+    def update(self, batch: pd.DataFrame):
+        """Absorbs a batch of new flight rows into the running aggregates."""
+        if len(batch) == 0:
+            return self
+        hour, dow, delay = self._batch_columns(batch)
+        known = ~np.isnan(delay)
+        delay = np.where(known, delay, 0.0)
+        self.n_flights += len(batch)
+        self.hour_count += np.bincount(hour, minlength=24)
+        self.hour_delay_count += np.bincount(hour[known], minlength=24)
+        self.hour_delay_sum += np.bincount(hour, weights=delay, minlength=24)
+        self.hour_delay_sq_sum += np.bincount(hour, weights=delay ** 2, minlength=24)
+        cell = dow * 24 + hour
+        # dow_hour_count only feeds the day x hour mean, so it counts flights with a known delay
+        self.dow_hour_count += np.bincount(cell[known], minlength=7 * 24).reshape(7, 24)
+        self.dow_hour_delay_sum += np.bincount(cell, weights=delay, minlength=7 * 24).reshape(7, 24)
+        airlines = batch['airline'].astype(str).to_numpy()
+        for airline in np.unique(airlines):
+            mask = airlines == airline
+            counts = self.airline_hour_count.setdefault(airline, np.zeros(24, dtype=np.int64))
+            delay_counts = self.airline_hour_delay_count.setdefault(airline, np.zeros(24, dtype=np.int64))
+            sums = self.airline_hour_delay_sum.setdefault(airline, np.zeros(24))
+            counts += np.bincount(hour[mask], minlength=24)
+            delay_counts += np.bincount(hour[mask & known], minlength=24)
+            sums += np.bincount(hour[mask], weights=delay[mask], minlength=24)
+        return self
+
+    # --- Summary tables (same shape as the CSVs process_flight_data writes) ---
+
+    def busiest_hours(self) -> pd.DataFrame:
+        hours = np.flatnonzero(self.hour_count)
+        busiest = pd.DataFrame({'hour': hours, 'ops_count': self.hour_count[hours]})
+        return busiest.sort_values('ops_count', ascending=False).reset_index(drop=True)
+
+    def avg_delay_by_hour(self) -> pd.DataFrame:
+        hours = np.flatnonzero(self.hour_count)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = self.hour_delay_sum[hours] / self.hour_delay_count[hours]
+        return pd.DataFrame({'hour': hours, 'delay_min': mean})
+
+    def best_hours(self, n=5) -> pd.DataFrame:
+        return self.avg_delay_by_hour().sort_values('delay_min').head(n).reset_index(drop=True)
+
+    def delay_std_by_hour(self) -> pd.DataFrame:
+        hours = np.flatnonzero(self.hour_count)
+        count = self.hour_delay_count[hours]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = self.hour_delay_sum[hours] / count
+            var = np.maximum(self.hour_delay_sq_sum[hours] / count - mean ** 2, 0)
+        return pd.DataFrame({'hour': hours, 'delay_std': np.sqrt(var)})
+
+    def delay_by_day_and_hour(self) -> pd.DataFrame:
+        """Mean delay with weekdays as rows and hours as columns (NaN where no flights)."""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(self.dow_hour_count > 0, self.dow_hour_delay_sum / self.dow_hour_count, np.nan)
+        return pd.DataFrame(mean, index=pd.Index(DAYS_ORDER, name='day_of_week'), columns=range(24))
+
+    def airline_summary(self) -> pd.DataFrame:
+        rows = [{'airline': airline, 'ops_count': int(counts.sum()),
+                 'delay_min': self.airline_hour_delay_sum[airline].sum() / max(self.airline_hour_delay_count[airline].sum(), 1),
+                 'busiest_hour': int(counts.argmax())}
+                for airline, counts in self.airline_hour_count.items()]
+        return pd.DataFrame(rows, columns=['airline', 'ops_count', 'delay_min', 'busiest_hour']).sort_values('ops_count', ascending=False)
+
+    def write_summaries(self, output_dir=OUTPUT_DIR):
+        self.busiest_hours().to_csv(os.path.join(output_dir, 'busiest_hours.csv'), index=False)
+        self.avg_delay_by_hour().to_csv(os.path.join(output_dir, 'avg_delay_by_hour.csv'), index=False)
+        self.best_hours().to_csv(os.path.join(output_dir, 'best_hours.csv'), index=False)
+        self.delay_by_day_and_hour().to_csv(os.path.join(output_dir, 'delay_by_day_and_hour.csv'))
+        self.airline_summary().to_csv(os.path.join(output_dir, 'airline_summary.csv'), index=False)
+
+    # --- Persistence, so append jobs and the agent can share the running state ---
+
+    def to_dict(self) -> dict:
+        return {
+            'n_flights': self.n_flights,
+            'hour_count': self.hour_count.tolist(),
+            'hour_delay_count': self.hour_delay_count.tolist(),
+            'hour_delay_sum': self.hour_delay_sum.tolist(),
+            'hour_delay_sq_sum': self.hour_delay_sq_sum.tolist(),
+            'dow_hour_count': self.dow_hour_count.tolist(),
+            'dow_hour_delay_sum': self.dow_hour_delay_sum.tolist(),
+            'airline_hour_count': {k: v.tolist() for k, v in self.airline_hour_count.items()},
+            'airline_hour_delay_count': {k: v.tolist() for k, v in self.airline_hour_delay_count.items()},
+            'airline_hour_delay_sum': {k: v.tolist() for k, v in self.airline_hour_delay_sum.items()},
+        }
+
+    def _load_dict(self, state: dict):
+        self.n_flights = state['n_flights']
+        self.hour_count = np.array(state['hour_count'], dtype=np.int64)
+        # States saved before delay counts were kept had no missing delays to skip
+        self.hour_delay_count = np.array(state.get('hour_delay_count', state['hour_count']), dtype=np.int64)
+        self.hour_delay_sum = np.array(state['hour_delay_sum'])
+        self.hour_delay_sq_sum = np.array(state['hour_delay_sq_sum'])
+        self.dow_hour_count = np.array(state['dow_hour_count'], dtype=np.int64)
+        self.dow_hour_delay_sum = np.array(state['dow_hour_delay_sum'])
+        self.airline_hour_count = {k: np.array(v, dtype=np.int64) for k, v in state['airline_hour_count'].items()}
+        self.airline_hour_delay_count = {k: np.array(v, dtype=np.int64) for k, v
+                                         in state.get('airline_hour_delay_count', state['airline_hour_count']).items()}
+        self.airline_hour_delay_sum = {k: np.array(v) for k, v in state['airline_hour_delay_sum'].items()}
+
+    def save(self, path=None):
+        path = path or self.state_path or STATE_PATH
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+        if path == self.state_path:
+            self._state_mtime = os.stat(path).st_mtime_ns
+
+    @classmethod
+    def from_dict(cls, state: dict):
+        """Rebuilds an aggregator from to_dict() output (e.g. the copy stored in the agent snapshot)."""
+        aggregator = cls()
+        aggregator._load_dict(state)
+        return aggregator
+
+    @classmethod
+    def load(cls, path=STATE_PATH):
+        """Loads saved state. Raises FileNotFoundError if nothing was saved yet."""
+        aggregator = cls(state_path=path)
+        aggregator.refresh()
+        if aggregator._state_mtime is None:
+            raise FileNotFoundError(path)
+        return aggregator
+
+    def refresh(self):
+        """Reloads the saved state if another process (e.g. an ingest job) updated it."""
+        if self.state_path is None:
+            return self
+        try:
+            mtime = os.stat(self.state_path).st_mtime_ns
+        except FileNotFoundError:
+            return self
+        if mtime != self._state_mtime:
+            with open(self.state_path) as f:
+                self._load_dict(json.load(f))
+            self._state_mtime = mtime
+        return self
+
+
+def ingest_new_flights(batch_path: str, state_path=STATE_PATH, output_dir=OUTPUT_DIR) -> FlightAggregator:
+    """Appends a CSV batch of new flight records to the saved aggregates and re-emits the summaries."""
+    aggregator = FlightAggregator.load(state_path)
+    batch = parse_flights_csv(batch_path)
+    aggregator.update(batch)
+    aggregator.write_summaries(output_dir)
+    aggregator.save()
+    print(f"✅ Ingested {len(batch)} new flights ({aggregator.n_flights} total); summaries updated in '{output_dir}/'.")
+    return aggregator
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print("Usage: python aggregates.py <new_flights.csv>")
+        sys.exit(1)
+    ingest_new_flights(sys.argv[1])
@@ -2,19 +2,147 @@ import pandas as pd
 import os
 import joblib
 import re
+import time
+import argparse
+import multiprocessing
+import itertools
+import threading
+from collections import OrderedDict
 import numpy as np # THIS IS THE FIX
+from concurrent.futures import ProcessPoolExecutor
 from warnings import filterwarnings
+from flight_index import FlightIndex, as_flight_index
+from data_loader import RAW_DATA_PATH, load_flights, iter_flight_chunks
+from aggregates import FlightAggregator
+from telemetry import span, timed, increment, observe, SIZE_BUCKETS
+from fast_model import ARTIFACT_PATH, load_fast_model
+from delay_surface import SURFACE_PATH, build_delay_surface, load_delay_surface
 
 # Ignore harmless warnings from sklearn
 filterwarnings('ignore', category=UserWarning, module='sklearn')
 
-# Load the trained ML model once when the script is imported
-try:
-    ML_MODEL = joblib.load('flight_delay_model.joblib')
-    print("✅ XGBoost delay prediction model loaded successfully.")
-except FileNotFoundError:
-    print("⚠️ Model file 'flight_delay_model.joblib' not found. Please run train_model.py first.")
-    ML_MODEL = None
+MODEL_PATH = 'flight_delay_model.joblib'
+# The model's fast inference artifact and delay surface; use_model_files() points all three elsewhere
+FAST_MODEL_PATH = ARTIFACT_PATH
+DELAY_SURFACE_PATH = SURFACE_PATH
+
+class PredictionCache:
+    """
+    Bounded LRU cache of predicted delays keyed on the model feature tuple
+    (origin, destination, sched_hour, sched_weekday, sched_month).
+    """
+    def __init__(self, maxsize=200_000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # Rows answered by the delay surface before reaching the cache
+        self.surface_hits = 0
+        # The assistant service calls tools from several threads at once
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def record_surface_hits(self, n):
+        with self._lock:
+            self.surface_hits += n
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return dict(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.surface_hits = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.surface_hits
+        return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses,
+                "surface_hits": self.surface_hits,
+                "hit_rate": (self.hits + self.surface_hits) / lookups if lookups else 0.0}
+
+PREDICTION_CACHE = PredictionCache()
+ML_MODEL = None
+# Native-booster twin of ML_MODEL (see fast_model.py), used for scoring when its export matches ML_MODEL
+FAST_MODEL = None
+# Precomputed predictions over route x hour x weekday x month for the loaded model (see delay_surface.py)
+DELAY_SURFACE = None
+_MODEL_SIGNATURE = False  # never equal to a real signature, so the first get_model() loads
+
+def _model_file_signature():
+    try:
+        stat = os.stat(MODEL_PATH)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+def get_model():
+    """
+    Returns the delay model, (re)loading it whenever flight_delay_model.joblib
+    changes on disk. A reload also empties the prediction cache and reloads the
+    fast inference model and the delay surface.
+    """
+    global ML_MODEL, FAST_MODEL, DELAY_SURFACE, _MODEL_SIGNATURE
+    signature = _model_file_signature()
+    if signature == _MODEL_SIGNATURE:
+        return ML_MODEL
+    _MODEL_SIGNATURE = signature
+    PREDICTION_CACHE.clear()
+    if signature is None:
+        print(f"⚠️ Model file '{MODEL_PATH}' not found. Please run train_model.py first.")
+        ML_MODEL = None
+    else:
+        with span('data_load', source='model'):
+            ML_MODEL = joblib.load(MODEL_PATH)
+        print("✅ XGBoost delay prediction model loaded successfully.")
+    FAST_MODEL = load_fast_model(ML_MODEL, FAST_MODEL_PATH)
+    DELAY_SURFACE = load_delay_surface(signature, DELAY_SURFACE_PATH)
+    return ML_MODEL
+
+def use_model_files(model_path=MODEL_PATH, fast_model_path=ARTIFACT_PATH, surface_path=SURFACE_PATH):
+    """
+    Points this process at another model's files (e.g. one airport's, see
+    partitions.py); the next get_model() loads them. The defaults are the
+    single-airport files in the working directory.
+    """
+    global MODEL_PATH, FAST_MODEL_PATH, DELAY_SURFACE_PATH, _MODEL_SIGNATURE
+    if (model_path, fast_model_path, surface_path) != (MODEL_PATH, FAST_MODEL_PATH, DELAY_SURFACE_PATH):
+        MODEL_PATH, FAST_MODEL_PATH, DELAY_SURFACE_PATH = model_path, fast_model_path, surface_path
+        _MODEL_SIGNATURE = False
+
+def use_model(model, signature, cached_predictions=None):
+    """
+    Installs an already-loaded model (e.g. from the agent snapshot) as if it had
+    been loaded from MODEL_PATH with the given file signature, optionally
+    pre-filling the prediction cache.
+    """
+    global ML_MODEL, FAST_MODEL, DELAY_SURFACE, _MODEL_SIGNATURE
+    ML_MODEL, _MODEL_SIGNATURE = model, tuple(signature)
+    FAST_MODEL = load_fast_model(model, FAST_MODEL_PATH)
+    DELAY_SURFACE = load_delay_surface(_MODEL_SIGNATURE, DELAY_SURFACE_PATH)
+    PREDICTION_CACHE.clear()
+    for key, value in (cached_predictions or {}).items():
+        PREDICTION_CACHE.put(key, value)
+    return model
 
 def parse_delay_from_string(text: str) -> float:
     # ... (this function is correct)
@@ -27,79 +155,288 @@ def parse_delay_from_string(text: str) -> float:
     return 0.0
 
 # Define file paths
-RAW_DATA_PATH = 'data/bom_week_flights_synthetic.csv'
 OUTPUT_DIR = 'data'
-os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-def process_flight_data():
-    # ... (this function is correct)
+def process_flight_data(chunksize=None):
+    """
+    Builds the hourly summary files. With `chunksize`, the raw file is read in
+    bounded chunks whose partial aggregates are merged, and no full flight
+    table is kept (the first return value is then None).
+    """
     print("Starting data processing...")
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    # Rebuild the running aggregates from scratch; later appends go through aggregates.ingest_new_flights
+    aggregator = FlightAggregator(state_path=os.path.join(OUTPUT_DIR, 'aggregates_state.json'))
     try:
-        df = pd.read_csv(RAW_DATA_PATH)
-        df['sched_time_local'] = pd.to_datetime(df['sched_time_local'])
-        df['actual_time_local'] = pd.to_datetime(df['actual_time_local'])
-        print(f"Loaded raw data: {df.shape[0]} flights.")
+        if chunksize:
+            for chunk in iter_flight_chunks(RAW_DATA_PATH, chunksize):
+                aggregator.update(chunk)
+            print(f"Loaded raw data in chunks of {chunksize}: {aggregator.n_flights} flights.")
+            df = None
+        else:
+            df = load_flights(RAW_DATA_PATH)
+            print(f"Loaded raw data: {df.shape[0]} flights.")
     except FileNotFoundError:
         print(f"ERROR: Raw data file not found at {RAW_DATA_PATH}")
         return None, None
-    df['delay_min'] = (df['actual_time_local'] - df['sched_time_local']).dt.total_seconds() / 60
-    df['hour'] = df['sched_time_local'].dt.hour
-    busiest_hours = df.groupby('hour').size().reset_index(name='ops_count').sort_values('ops_count', ascending=False)
-    busiest_hours.to_csv(os.path.join(OUTPUT_DIR, 'busiest_hours.csv'), index=False)
-    avg_delay_by_hour = df.groupby('hour')['delay_min'].mean().reset_index()
-    avg_delay_by_hour.to_csv(os.path.join(OUTPUT_DIR, 'avg_delay_by_hour.csv'), index=False)
-    best_hours = avg_delay_by_hour.sort_values('delay_min').head(5)
-    best_hours.to_csv(os.path.join(OUTPUT_DIR, 'best_hours.csv'), index=False)
+    if df is not None:
+        df['delay_min'] = (df['actual_time_local'] - df['sched_time_local']).dt.total_seconds() / 60
+        df['hour'] = df['sched_time_local'].dt.hour
+        aggregator.update(df)
+    aggregator.write_summaries(OUTPUT_DIR)
+    aggregator.save()
     print("Data processing complete.")
-    return df, avg_delay_by_hour
+    return df, aggregator.avg_delay_by_hour()
 
-def predict_delay_for_new_time(flight_id: str, new_time_hour: int, full_flight_df: pd.DataFrame):
-    # ... (this function is correct)
-    if ML_MODEL is None:
+# Columns the delay model was trained on (see train_model.py)
+MODEL_FEATURES = ['origin', 'destination', 'sched_hour', 'sched_weekday', 'sched_month']
+
+@timed('build_features')
+def build_feature_frame(flights: pd.DataFrame, new_hours) -> pd.DataFrame:
+    """
+    Builds one model feature row per flight row, moving each flight to the matching
+    entry of `new_hours` on its original scheduled date.
+    """
+    sched = pd.to_datetime(flights['sched_time_local'])
+    return pd.DataFrame({
+        'origin': flights['origin'].to_numpy(),
+        'destination': flights['destination'].to_numpy(),
+        'sched_hour': np.asarray(new_hours, dtype=int),
+        'sched_weekday': sched.dt.weekday.to_numpy(),
+        'sched_month': sched.dt.month.to_numpy(),
+    })
+
+@timed('build_features')
+def build_feature_frame_at(flights: pd.DataFrame, times) -> pd.DataFrame:
+    """
+    Builds one model feature row per flight row, scheduled at the matching exact
+    timestamp in `times` (hour, weekday and month all come from that timestamp).
+    """
+    times = pd.DatetimeIndex(times)
+    return pd.DataFrame({
+        'origin': flights['origin'].to_numpy(),
+        'destination': flights['destination'].to_numpy(),
+        'sched_hour': times.hour.to_numpy(),
+        'sched_weekday': times.weekday.to_numpy(),
+        'sched_month': times.month.to_numpy(),
+    })
+
+def predict_delays(features_df: pd.DataFrame) -> np.ndarray:
+    """
+    Scores a whole feature matrix and returns the predicted delays in minutes as
+    floats. Rows covered by DELAY_SURFACE are read from it; of the rest, rows
+    already in PREDICTION_CACHE are looked up and the remaining unique feature
+    rows are scored with a single model call (on FAST_MODEL when it is
+    available).
+    """
+    model = get_model()
+    if model is None:
+        raise RuntimeError("ML model is not loaded. Please run train_model.py.")
+    if len(features_df) == 0:
+        return np.empty(0, dtype=float)
+    observe('predict_batch_rows', len(features_df), buckets=SIZE_BUCKETS)
+    if DELAY_SURFACE is not None:
+        with span('delay_surface_lookup'):
+            delays, known = DELAY_SURFACE.lookup(features_df)
+        PREDICTION_CACHE.record_surface_hits(int(known.sum()))
+        increment('prediction_cache_hits', int(known.sum()), layer='delay_surface')
+        if known.all():
+            return delays
+        rest = np.flatnonzero(~known)
+        delays[rest] = _predict_uncached(features_df.iloc[rest])
+        return delays
+    return _predict_uncached(features_df)
+
+def _predict_uncached(features_df: pd.DataFrame) -> np.ndarray:
+    """predict_delays without the delay surface: PREDICTION_CACHE, then the model."""
+    model = get_model()
+    keys = list(zip(*(features_df[col].tolist() for col in MODEL_FEATURES)))
+    delays = np.empty(len(keys), dtype=float)
+    missing = {}
+    for pos, key in enumerate(keys):
+        value = PREDICTION_CACHE.get(key)
+        if value is None:
+            missing.setdefault(key, []).append(pos)
+        else:
+            delays[pos] = value
+    n_missing = sum(len(positions) for positions in missing.values())
+    increment('prediction_cache_hits', len(keys) - n_missing, layer='lru')
+    increment('prediction_cache_misses', n_missing, layer='lru')
+    if missing:
+        missing_df = pd.DataFrame(list(missing), columns=MODEL_FEATURES)
+        observe('model_predict_rows', len(missing_df), buckets=SIZE_BUCKETS)
+        with span('model_predict', path='pipeline' if FAST_MODEL is None else 'fast'):
+            predicted = (model if FAST_MODEL is None else FAST_MODEL).predict(missing_df).astype(float)
+        for key, value in zip(missing, predicted):
+            PREDICTION_CACHE.put(key, value)
+            delays[missing[key]] = value
+    return delays
+
+def warm_prediction_cache(routes, months):
+    """
+    Pre-scores every (origin, destination) route in `routes` for all 24 hours,
+    7 weekdays and the given months, so later what-if queries are cache hits.
+    Routes the delay surface already covers are skipped, as they never reach the cache.
+    """
+    if get_model() is None:
+        return 0
+    if DELAY_SURFACE is not None:
+        routes = [route for route in routes if not DELAY_SURFACE.covers([route])]
+        if not routes:
+            print("✅ Delay surface covers every route; prediction cache warm-up skipped.")
+            return 0
+    grid = pd.DataFrame([(origin, destination, hour, weekday, month)
+                         for (origin, destination), hour, weekday, month
+                         in itertools.product(routes, range(24), range(7), months)], columns=MODEL_FEATURES)
+    predict_delays(grid)
+    print(f"✅ Prediction cache warmed with {len(grid)} feature combinations.")
+    return len(grid)
+
+def rebuild_delay_surface(routes):
+    """
+    Rebuilds the delay surface for the current model file over `routes` and
+    starts serving predictions from it. Returns the surface path, or None
+    without a model.
+    """
+    global DELAY_SURFACE
+    model = get_model()
+    if model is None:
+        return None
+    path = build_delay_surface((model if FAST_MODEL is None else FAST_MODEL).predict, routes, _MODEL_SIGNATURE,
+                               DELAY_SURFACE_PATH)
+    DELAY_SURFACE = load_delay_surface(_MODEL_SIGNATURE, path)
+    return path
+
+def prediction_cache_stats() -> dict:
+    return PREDICTION_CACHE.stats()
+
+def build_candidate_matrix(flights: pd.DataFrame, window_mins=90, step_mins=15) -> pd.DataFrame:
+    """
+    Crosses every flight with every shift in [-window_mins, +window_mins].
+    Returns one row per (flight, candidate time) with the model features attached;
+    `flight_pos` is the position of the flight in `flights`.
+    """
+    shifts = np.arange(-window_mins, window_mins + step_mins, step_mins)
+    flight_pos = np.repeat(np.arange(len(flights)), len(shifts))
+    repeated = flights.iloc[flight_pos]
+    original_times = pd.to_datetime(repeated['sched_time_local']).reset_index(drop=True)
+    candidate_times = original_times + pd.to_timedelta(np.tile(shifts, len(flights)), unit='m')
+    candidates = build_feature_frame(repeated, candidate_times.dt.hour)
+    candidates.insert(0, 'flight_pos', flight_pos)
+    candidates.insert(1, 'shift_min', np.tile(shifts, len(flights)))
+    candidates.insert(2, 'candidate_time', candidate_times)
+    return candidates
+
+@timed('optimize_flights')
+def optimize_flights(flights: pd.DataFrame, window_mins=90, step_mins=15) -> pd.DataFrame:
+    """
+    Finds the least-delayed slot for every flight in `flights` with one batched
+    model call over the full candidate matrix.
+    """
+    candidates = build_candidate_matrix(flights, window_mins, step_mins)
+    n_shifts = len(candidates) // max(len(flights), 1)
+    delays = predict_delays(candidates).reshape(len(flights), n_shifts)
+    shifts = candidates['shift_min'].to_numpy()[:n_shifts]
+
+    original_delay = delays[:, shifts == 0][:, 0]
+    # The original slot never counts as a "move"; ties keep the earliest shift.
+    moved = np.where(shifts == 0, np.inf, delays)
+    best_col = moved.argmin(axis=1)
+    best_delay = moved[np.arange(len(flights)), best_col]
+    improved = best_delay < original_delay
+
+    original_time = pd.to_datetime(flights['sched_time_local']).reset_index(drop=True)
+    best_time = original_time + pd.to_timedelta(np.where(improved, shifts[best_col], 0), unit='m')
+    optimized_delay = np.where(improved, best_delay, original_delay)
+    return pd.DataFrame({
+        'flight_id': flights['flight'].to_numpy(),
+        'original_time': original_time,
+        'optimized_time': best_time,
+        'original_predicted_delay': original_delay,
+        'optimized_predicted_delay': optimized_delay,
+        'delay_reduction_mins': original_delay - optimized_delay,
+    })
+
+def predict_delay_minutes(flight_id: str, new_time_hour: int, full_flight_df, date=None) -> float:
+    """
+    Numeric what-if prediction. `full_flight_df` may be a DataFrame or a FlightIndex.
+    Raises KeyError if the flight (on `date`, if given) is unknown.
+    """
+    flight_info = as_flight_index(full_flight_df).rows(flight_id, date)
+    return float(predict_delays(build_feature_frame(flight_info, [new_time_hour]))[0])
+
+def predict_delay_for_new_time(flight_id: str, new_time_hour: int, full_flight_df, date=None):
+    if get_model() is None:
         return "ML model is not loaded. Please run train_model.py."
     try:
-        flight_info = full_flight_df[full_flight_df['flight'] == flight_id].iloc[0]
-    except IndexError:
-        return f"Flight with ID '{flight_id}' not found."
-    prediction_data = flight_info.copy()
-    new_time = prediction_data['sched_time_local'].replace(hour=new_time_hour, minute=0, second=0)
-    prediction_data['sched_hour'] = new_time.hour
-    prediction_data['sched_weekday'] = new_time.weekday()
-    prediction_data['sched_month'] = new_time.month
-    features_df = pd.DataFrame([prediction_data])[['origin', 'destination', 'sched_hour', 'sched_weekday', 'sched_month']]
-    predicted_delay = ML_MODEL.predict(features_df)[0]
+        predicted_delay = predict_delay_minutes(flight_id, new_time_hour, full_flight_df, date)
+    except KeyError as e:
+        return e.args[0]
     return (f"PREDICTION for flight {flight_id} at {new_time_hour}:00:\n"
             f"The XGBoost model predicts a delay of **{predicted_delay:.2f} minutes**.")
 
+@timed('cascade_scan')
 def find_top_cascading_flights(full_flight_df):
-    # ... (this function is correct)
-    df = full_flight_df.copy()
-    df['date'] = df['sched_time_local'].dt.date
-    df = df.sort_values(['tail_id', 'date', 'sched_time_local'])
-    df['cascade_effect_min'] = df.groupby(['tail_id', 'date'])['delay_min'].diff().fillna(0)
-    top_cascades = df[df['cascade_effect_min'] > 30].sort_values('cascade_effect_min', ascending=False)
-    return top_cascades[['flight', 'tail_id', 'sched_time_local', 'origin', 'destination', 'delay_min', 'cascade_effect_min']].head(10)
-
-def optimize_flight_schedule(flight_id: str, full_flight_df: pd.DataFrame, avg_delay_df, window_mins=90, step_mins=15):
-    # ... (this function is correct)
+    """
+    The 10 flights whose delay grew most (by more than 30 minutes) over the
+    previous flight of the same tail on the same day. Works on NumPy views of
+    the flight table; only the candidate rows are copied.
+    """
+    df = full_flight_df.df if isinstance(full_flight_df, FlightIndex) else full_flight_df
+    sched = df['sched_time_local'].to_numpy()
+    day = sched.astype('datetime64[D]')
+    tail_codes = pd.factorize(df['tail_id'], sort=True)[0]
+    order = np.lexsort((sched, day, tail_codes))
+    delay = df['delay_min'].to_numpy(dtype=float)[order]
+    same_rotation_day = np.zeros(len(order), dtype=bool)
+    same_rotation_day[1:] = (tail_codes[order][1:] == tail_codes[order][:-1]) & (day[order][1:] == day[order][:-1])
+    effect = np.where(same_rotation_day, delay - np.roll(delay, 1), 0.0)
+
+    candidates = effect > 30
+    top_cascades = df.iloc[order[candidates]][['flight', 'tail_id', 'sched_time_local', 'origin', 'destination', 'delay_min']]
+    top_cascades = top_cascades.assign(cascade_effect_min=effect[candidates])
+    return top_cascades.sort_values('cascade_effect_min', ascending=False).head(10)
+
+def find_top_cascading_flights_chunked(path=None, chunksize=100_000, top_n=10):
+    """
+    Chunked version of find_top_cascading_flights for logs that do not fit in
+    memory. Each tail's last flight (date and delay) is carried across chunk
+    boundaries, so a tail's records only need to appear in chronological order
+    across the file (true for both time-ordered and tail-ordered logs).
+    """
+    columns = ['flight', 'tail_id', 'sched_time_local', 'origin', 'destination', 'delay_min', 'cascade_effect_min']
+    last_by_tail = {}
+    top = pd.DataFrame(columns=columns)
+    for chunk in iter_flight_chunks(path or RAW_DATA_PATH, chunksize):
+        chunk['delay_min'] = (chunk['actual_time_local'] - chunk['sched_time_local']).dt.total_seconds() / 60
+        chunk['date'] = chunk['sched_time_local'].dt.normalize()
+        chunk['tail_id'] = chunk['tail_id'].astype(str)
+        chunk = chunk.sort_values(['tail_id', 'date', 'sched_time_local'])
+        prev_delay = chunk.groupby(['tail_id', 'date'])['delay_min'].shift(1)
+
+        # The first flight of each (tail, date) in this chunk may follow one from the previous chunk
+        first_in_group = prev_delay.isna()
+        carried = [last_by_tail.get(tail, (None, np.nan)) for tail in chunk.loc[first_in_group, 'tail_id']]
+        prev_delay[first_in_group] = [delay if date == day else np.nan
+                                      for (date, delay), day in zip(carried, chunk.loc[first_in_group, 'date'])]
+        chunk['cascade_effect_min'] = (chunk['delay_min'] - prev_delay).fillna(0)
+
+        last_rows = chunk.drop_duplicates('tail_id', keep='last')
+        last_by_tail.update(zip(last_rows['tail_id'], zip(last_rows['date'], last_rows['delay_min'])))
+        candidates = chunk.loc[chunk['cascade_effect_min'] > 30, columns]
+        top = pd.concat([top, candidates]).nlargest(top_n, 'cascade_effect_min') if not candidates.empty else top
+    return top.astype({'cascade_effect_min': float})
+
+def optimize_flight_schedule(flight_id: str, full_flight_df, avg_delay_df, window_mins=90, step_mins=15, date=None):
+    if get_model() is None:
+        return "ML model is not loaded. Please run train_model.py."
     try:
-        flight_info = full_flight_df[full_flight_df['flight'] == flight_id].iloc[0]
-        original_time = flight_info['sched_time_local']
-    except IndexError:
-        return f"Flight with ID '{flight_id}' not found in the dataset."
-    original_prediction_str = predict_delay_for_new_time(flight_id, original_time.hour, full_flight_df)
-    original_delay = parse_delay_from_string(original_prediction_str)
-    best_time = original_time
-    best_delay = original_delay
-    for shift in range(-window_mins, window_mins + step_mins, step_mins):
-        if shift == 0:
-            continue
-        candidate_time = original_time + pd.Timedelta(minutes=shift)
-        prediction_str = predict_delay_for_new_time(flight_id, candidate_time.hour, full_flight_df)
-        predicted_delay = parse_delay_from_string(prediction_str)
-        if predicted_delay < best_delay:
-            best_delay = predicted_delay
-            best_time = candidate_time
+        flight_info = as_flight_index(full_flight_df).rows(flight_id, date)
+    except KeyError as e:
+        return e.args[0]
+    result = optimize_flights(flight_info, window_mins, step_mins).iloc[0]
+    original_time, best_time = result['original_time'], result['optimized_time']
+    original_delay, best_delay = result['original_predicted_delay'], result['optimized_predicted_delay']
     if best_time == original_time:
         return (f"OPTIMIZATION COMPLETE for flight {flight_id}:\n"
                 f"The original time at {original_time.strftime('%H:%M')} is already the optimal slot.")
@@ -109,32 +446,123 @@ def optimize_flight_schedule(flight_id: str, full_flight_df: pd.DataFrame, avg_d
                 f"**Recommendation:** Move to **{best_time.strftime('%H:%M')}**.\n"
                 f"Predicted delay will improve from {original_delay:.2f} mins to {best_delay:.2f} mins (a reduction of {improvement:.2f} mins).")
 
-# (All the functions above this are the same, this is just the end of the file)
-# ... (process_flight_data, predict_delay_for_new_time, etc.) ...
+def _optimize_batch(flights: pd.DataFrame, window_mins=90, step_mins=15):
+    """
+    Worker entry point: optimizes one batch of flights with a single model call.
+    If the batch call fails, flights are retried one by one so a bad row only
+    fails itself. Returns (results_df, failures).
+    """
+    try:
+        return optimize_flights(flights, window_mins, step_mins), []
+    except Exception:
+        results, failures = [], []
+        for pos in range(len(flights)):
+            flight = flights.iloc[pos:pos + 1]
+            try:
+                results.append(optimize_flights(flight, window_mins, step_mins))
+            except Exception as e:
+                failures.append({"flight_id": flight['flight'].iloc[0], "sched_time_local": flight['sched_time_local'].iloc[0],
+                                 "error": f"{type(e).__name__}: {e}"})
+        results_df = pd.concat(results, ignore_index=True) if results else pd.DataFrame()
+        return results_df, failures
 
-def run_system_wide_optimization(full_flight_df, avg_delay_df):
-    if ML_MODEL is None: return None
+def _split_invalid_flights(flights: pd.DataFrame):
+    """Separates rows that are missing a model feature; returns (valid_df, failures)."""
+    required = ['origin', 'destination', 'sched_time_local']
+    invalid = flights[required].isna().any(axis=1)
+    failures = [{"flight_id": row['flight'], "sched_time_local": row['sched_time_local'],
+                 "error": "missing " + ", ".join(c for c in required if pd.isna(row[c]))}
+                for _, row in flights[invalid].iterrows()]
+    return flights[~invalid], failures
+
+def _batch_slices(n_flights: int, flights_per_batch: int, first_batch=64):
+    """Batch boundaries that start small and double up to flights_per_batch, so the first results arrive quickly."""
+    size, start = min(first_batch, flights_per_batch), 0
+    while start < n_flights:
+        yield slice(start, start + size)
+        start += size
+        size = min(size * 2, flights_per_batch)
+
+def iter_system_wide_optimization(full_flight_df, avg_delay_df, sample_size=100, n_workers=1, batch_size=50_000,
+                                  window_mins=90, step_mins=15, persist=True):
+    """
+    Generator form of run_system_wide_optimization. After every scored batch it
+    yields {'event': 'batch', 'results': <that batch's recommendations>,
+    'flights_done', 'flights_failed', 'flights_total', 'totals': running delay
+    totals, 'elapsed'}; the last event is {'event': 'summary', 'summary':
+    <summary dict or None>}. Batches start small, so the first partial results
+    arrive within a fraction of a second.
+
+    With persist=False (interactive runs) nothing is written, so the results,
+    summary and failure files of the last full run are left alone.
+    """
+    if get_model() is None:
+        yield {"event": "summary", "summary": None}
+        return
     print("\n--- Starting System-Wide Schedule Optimization ---")
-    flight_ids_to_optimize = full_flight_df.sample(n=100, random_state=42)['flight'].unique()
+    if persist:
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+    flight_index = as_flight_index(full_flight_df)
+    if sample_size is None:
+        flights = flight_index.df
+    else:
+        flight_ids_to_optimize = flight_index.df.sample(n=min(sample_size, len(flight_index.df)), random_state=42)['flight'].unique()
+        flights = flight_index.first_rows(flight_ids_to_optimize)
+    flights, failures = _split_invalid_flights(flights)
+
+    n_shifts = len(range(-window_mins, window_mins + step_mins, step_mins))
+    flights_per_batch = max(1, batch_size // n_shifts)
+    batches = [flights.iloc[s] for s in _batch_slices(len(flights), flights_per_batch)]
+    print(f"Optimizing {len(flights)} flights in {len(batches)} batch(es) using {n_workers} worker(s)...")
+
+    start = time.perf_counter()
+    n_total = len(flights) + len(failures)
     results = []
-    # (Loop logic is the same)
-    for flight_id in flight_ids_to_optimize:
-        try:
-            original_time = full_flight_df[full_flight_df['flight'] == flight_id].iloc[0]['sched_time_local']
-            original_predicted_delay = parse_delay_from_string(predict_delay_for_new_time(flight_id, original_time.hour, full_flight_df))
-            recommendation = optimize_flight_schedule(flight_id, full_flight_df, avg_delay_df)
-            if "Recommendation:" in recommendation:
-                new_predicted_delay = parse_delay_from_string(recommendation.split("mins to ")[1])
-                delay_reduction = original_predicted_delay - new_predicted_delay
-            else:
-                new_predicted_delay, delay_reduction = original_predicted_delay, 0
-            results.append({"flight_id": flight_id, "original_predicted_delay": original_predicted_delay,
-                            "optimized_predicted_delay": new_predicted_delay, "delay_reduction_mins": delay_reduction})
-        except: continue
-    if not results: return None
-    results_df = pd.DataFrame(results)
-    results_df.to_csv(os.path.join(OUTPUT_DIR, 'optimization_results.csv'), index=False)
-    print(f"✅ Optimization results saved to 'data/optimization_results.csv'")
+    totals = {"original_predicted_delay": 0.0, "optimized_predicted_delay": 0.0, "delay_reduction_mins": 0.0}
+    pool = None
+    if n_workers > 1 and len(batches) > 1:
+        # 'spawn' keeps OpenMP state in the XGBoost workers clean
+        pool = ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context('spawn'))
+        outputs = pool.map(_optimize_batch, batches, [window_mins] * len(batches), [step_mins] * len(batches))
+    else:
+        outputs = (_optimize_batch(batch, window_mins, step_mins) for batch in batches)
+    try:
+        for batch_df, batch_failures in outputs:
+            failures.extend(batch_failures)
+            observe('optimize_batch_flights', len(batch_df) + len(batch_failures), buckets=SIZE_BUCKETS)
+            increment('optimized_flights', len(batch_df))
+            if not batch_df.empty:
+                results.append(batch_df)
+                for col in totals:
+                    totals[col] += float(batch_df[col].sum())
+            yield {"event": "batch", "results": batch_df, "flights_done": sum(len(df) for df in results),
+                   "flights_failed": len(failures), "flights_total": n_total,
+                   "totals": dict(totals), "elapsed": time.perf_counter() - start}
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    elapsed = time.perf_counter() - start
+
+    n_done = sum(len(df) for df in results)
+    print(f"Optimized {n_done} flights in {elapsed:.2f}s ({n_done / max(elapsed, 1e-9):.1f} flights/sec), "
+          f"{len(failures)} failed.")
+    failures_path = os.path.join(OUTPUT_DIR, 'optimization_failures.csv')
+    if not persist:
+        if failures:
+            print(f"⚠️ {len(failures)} flight(s) could not be optimized. First error: {failures[0]['error']}")
+    elif failures:
+        pd.DataFrame(failures).to_csv(failures_path, index=False)
+        print(f"⚠️ {len(failures)} flight(s) could not be optimized. See 'data/optimization_failures.csv'. First error: {failures[0]['error']}")
+    elif os.path.exists(failures_path):
+        os.remove(failures_path)
+
+    if not results:
+        yield {"event": "summary", "summary": None}
+        return
+    results_df = pd.concat(results, ignore_index=True)
+    if persist:
+        results_df.to_csv(os.path.join(OUTPUT_DIR, 'optimization_results.csv'), index=False)
+        print(f"✅ Optimization results saved to 'data/optimization_results.csv'")
     
     total_original = results_df['original_predicted_delay'].sum()
     total_optimized = results_df['optimized_predicted_delay'].sum()
@@ -146,6 +574,7 @@ def run_system_wide_optimization(full_flight_df, avg_delay_df):
     cost_saved = total_reduction * 100
     
     summary = {
+        "Flights Optimized": f"{len(results_df)}",
         "Total Delay BEFORE": f"{total_original:.2f} mins", "Total Delay AFTER": f"{total_optimized:.2f} mins",
         "Total Delay SAVED": f"{total_reduction:.2f} mins", "Average Improvement per Flight": f"{avg_pct:.2f}%",
         "Estimated Cost BEFORE": f"${cost_before:,.2f}", "Estimated Cost AFTER": f"${cost_after:,.2f}",
@@ -154,16 +583,45 @@ def run_system_wide_optimization(full_flight_df, avg_delay_df):
     
     # --- NEW: Save summary to a JSON file ---
     import json
-    with open(os.path.join(OUTPUT_DIR, 'optimization_summary.json'), 'w') as f:
-        json.dump(summary, f, indent=4)
-    print(f"✅ Optimization summary saved to 'data/optimization_summary.json'")
+    if persist:
+        with open(os.path.join(OUTPUT_DIR, 'optimization_summary.json'), 'w') as f:
+            json.dump(summary, f, indent=4)
+        print(f"✅ Optimization summary saved to 'data/optimization_summary.json'")
 
     print("\n--- OPTIMIZATION INSIGHTS ---")
     for key, val in summary.items(): print(f"{key}: {val}")
     print("-----------------------------")
-    return summary
+    yield {"event": "summary", "summary": summary}
+
+def run_system_wide_optimization(full_flight_df, avg_delay_df, sample_size=100, n_workers=1, batch_size=50_000,
+                                 window_mins=90, step_mins=15, persist=True):
+    """
+    Optimizes a sample of flights (sample_size=N, one row per flight ID) or every
+    flight row in the dataset (sample_size=None). The candidate matrix is scored
+    in batches of up to `batch_size` rows spread over `n_workers` processes.
+    Flights that cannot be scored are reported in 'optimization_failures.csv'
+    (unless persist=False).
+    """
+    event = None
+    for event in iter_system_wide_optimization(full_flight_df, avg_delay_df, sample_size, n_workers, batch_size,
+                                               window_mins, step_mins, persist):
+        pass
+    return event['summary']
 
 if __name__ == '__main__':
-    full_df, avg_delay_df = process_flight_data()
-    if full_df is not None:
-        run_system_wide_optimization(full_df, avg_delay_df)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Process flight data and run the system-wide schedule optimization.")
+    parser.add_argument('--data', default=RAW_DATA_PATH, help="Raw flight CSV (a week or a multi-week file).")
+    parser.add_argument('--all', action='store_true', help="Optimize every flight instead of a 100-flight sample.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Number of worker processes.")
+    parser.add_argument('--batch-size', type=int, default=50_000, help="Candidate rows scored per model call.")
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help="Stream the raw file in chunks of this many rows (summaries and cascades only).")
+    args = parser.parse_args()
+    RAW_DATA_PATH = args.data
+
+    full_df, avg_delay_df = process_flight_data(chunksize=args.chunksize)
+    if args.chunksize:
+        print(find_top_cascading_flights_chunked(chunksize=args.chunksize).to_string(index=False))
+    elif full_df is not None:
+        run_system_wide_optimization(full_df, avg_delay_df, sample_size=None if args.all else 100,
+                                     n_workers=args.workers, batch_size=args.batch_size)
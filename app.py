@@ -1,5 +1,15 @@
+import os
+import pandas as pd
 import streamlit as st
-from agent_engine import load_agent_and_precomputed_data
+from agent_engine import load_agent_and_precomputed_data, startup_timings
+from router import QueryRouter
+from service import ServiceClient
+from telemetry import TELEMETRY
+
+# Point the UI at a shared `python service.py` backend so sessions share work (and don't block each other)
+SERVICE_URL = os.environ.get("ASSISTANT_SERVICE_URL")
+# Set to serve this process's metrics to Prometheus at http://127.0.0.1:<port>/metrics
+METRICS_PORT = os.environ.get("FLIGHT_METRICS_PORT")
 
 st.set_page_config(page_title="Flight Scheduling AI Assistant", page_icon="✈️", layout="wide")
 
@@ -8,9 +18,40 @@ st.write("A conversational AI co-pilot for airport operators, powered by an XGBo
 
 @st.cache_resource
 def load_resources():
-    return load_agent_and_precomputed_data()
+    if METRICS_PORT:
+        TELEMETRY.serve_prometheus(int(METRICS_PORT))
+    if SERVICE_URL:
+        client = ServiceClient(SERVICE_URL)
+        return client, client.precomputed_answers()
+    agent, precomputed_answers = load_agent_and_precomputed_data()
+    # Structured questions go straight to a tool; only open-ended ones reach the LLM
+    return QueryRouter(agent), precomputed_answers
+
+router, precomputed_answers = load_resources()
 
-agent, precomputed_answers = load_resources()
+with st.sidebar:
+    st.subheader("Startup timings")
+    for step, value in startup_timings().items():
+        st.caption(f"{step}: {value:.2f}s" if isinstance(value, float) else f"{step}: {value}")
+    router_stats = router.stats()
+    if router_stats["queries"]:
+        st.subheader("Query routing")
+        st.metric("Answered without the LLM", f"{router_stats['fast_path_share']:.0%}")
+        for path in ("fast_path", "llm", "first_output"):
+            if f"{path}_p50_ms" in router_stats:
+                st.caption(f"{path}: p50 {router_stats[f'{path}_p50_ms']:.0f} ms, p95 {router_stats[f'{path}_p95_ms']:.0f} ms")
+    metrics = router.telemetry() if SERVICE_URL else TELEMETRY.snapshot()
+    if metrics["histograms"]:
+        with st.expander("Telemetry", expanded=False):
+            timings = pd.DataFrame([{"span": h["metric"].removesuffix("_seconds"),
+                                     "labels": ", ".join(f"{k}={v}" for k, v in h["labels"].items()),
+                                     "count": h["count"], "mean ms": h["mean"] * 1000, "max ms": h["max"] * 1000}
+                                    for h in metrics["histograms"] if h["metric"].endswith("_seconds")])
+            st.dataframe(timings.sort_values("mean ms", ascending=False), hide_index=True)
+            counters = pd.DataFrame([{"counter": c["metric"], "labels": ", ".join(f"{k}={v}" for k, v in c["labels"].items()),
+                                      "value": c["value"]} for c in metrics["counters"]])
+            if not counters.empty:
+                st.dataframe(counters, hide_index=True)
 
 # --- Section 1: The "Safety Net" Pre-Computed Insights ---
 
@@ -49,8 +90,19 @@ if prompt := st.chat_input("Ask a dynamic question..."):
         st.markdown(prompt)
 
     with st.chat_message("assistant"):
-        with st.spinner("AI is thinking..."):
-            response = agent.invoke({"input": prompt})
-            st.markdown(response['output'])
+        # Render tool progress and LLM tokens as they arrive instead of waiting for the full answer
+        placeholder = st.empty()
+        placeholder.markdown("_AI is thinking..._")
+        tokens = ""
+        for event in router.stream(prompt):
+            if event["type"] == "token":
+                tokens += event["text"]
+                placeholder.markdown(tokens + " ▌")
+            elif event["type"] == "partial":
+                placeholder.markdown(event["text"])
+            else:
+                response = event
+        placeholder.markdown(response['output'])
+        st.caption(f"Answered by {response['route']} in {response['latency_ms']:.0f} ms")
     
     st.session_state.messages.append({"role": "assistant", "content": response['output']})
\ No newline at end of file
@@ -0,0 +1,206 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import tracemalloc
+import subprocess
+import numpy as np
+import pandas as pd
+import analysis
+import data_loader
+from data_loader import RAW_DATA_PATH
+
+BENCHMARK_DIR = os.path.join('data', 'benchmarks')
+ALL_CASES = ['process_flight_data', 'find_top_cascading_flights', 'cascade_graph', 'optimize_flight_schedule',
+             'run_system_wide_optimization', 'train_model', 'agent_fast_path', 'agent_llm_stub']
+
+
+def generate_flights(weeks: int, base_path=RAW_DATA_PATH, seed=0) -> pd.DataFrame:
+    """
+    Scales the sample week to `weeks` weeks: copy k is shifted by k*7 days and
+    gets its delays jittered (copy 0 is the original data), so later weeks fall
+    in later months and the same tails keep flying their rotations.
+    """
+    base = pd.read_csv(base_path, parse_dates=['date', 'sched_time_local', 'actual_time_local'])
+    rng = np.random.default_rng(seed)
+    copies = []
+    for k in range(weeks):
+        week = base.copy()
+        shift = pd.Timedelta(days=7 * k)
+        for col in ('date', 'sched_time_local'):
+            week[col] = week[col] + shift
+        if k:
+            week['delay_min'] = np.clip(week['delay_min'] + rng.normal(0, 4, len(week)).round(), -10, 80).astype(int)
+        week['actual_time_local'] = week['sched_time_local'] + pd.to_timedelta(week['delay_min'], unit='m')
+        week['status'] = np.where(week['delay_min'] > 10, 'DELAYED', 'ON_TIME')
+        copies.append(week)
+    flights = pd.concat(copies, ignore_index=True)
+    flights['date'] = flights['date'].dt.strftime('%Y-%m-%d')
+    return flights
+
+
+def _summarize(latencies, n_items, peak_bytes) -> dict:
+    latencies = np.asarray(latencies)
+    median = float(np.median(latencies))
+    return {
+        "runs": len(latencies),
+        "mean_ms": float(latencies.mean()) * 1000,
+        "p50_ms": median * 1000,
+        "p95_ms": float(np.percentile(latencies, 95)) * 1000,
+        "p99_ms": float(np.percentile(latencies, 99)) * 1000,
+        "items_per_call": n_items,
+        "throughput_per_s": n_items / median if median > 0 else None,
+        "peak_mem_mb": peak_bytes / 2**20,
+    }
+
+
+def measure(call, n_items=1, repeat=5, warmup=1) -> dict:
+    """
+    Times `call` (or each callable in a list of calls, giving per-call
+    percentiles) `repeat` times after `warmup` untimed rounds, then runs one
+    more round under tracemalloc for the peak Python/NumPy memory allocated.
+    """
+    calls = call if isinstance(call, list) else [call]
+    for _ in range(warmup):
+        for c in calls:
+            c()
+    latencies = []
+    for _ in range(repeat):
+        for c in calls:
+            start = time.perf_counter()
+            c()
+            latencies.append(time.perf_counter() - start)
+    tracemalloc.start()
+    for c in calls:
+        c()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return _summarize(latencies, n_items, peak)
+
+
+def _quietly(func, *args, **kwargs):
+    """Runs func with stdout silenced (the analysis functions print progress)."""
+    with open(os.devnull, 'w') as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            return func(*args, **kwargs)
+        finally:
+            sys.stdout = stdout
+
+
+def run_benchmarks(weeks: int, cases=ALL_CASES, repeat=5, n_workers=1, workdir=None) -> dict:
+    """Runs the selected cases on `weeks` weeks of generated data; returns {case: stats}."""
+    workdir = workdir or tempfile.mkdtemp(prefix='flight_bench_')
+    data_path = os.path.join(workdir, f'flights_{weeks}w.csv')
+    generate_flights(weeks).to_csv(data_path, index=False)
+    # Keep every output (summaries, results, caches) out of the repo's data/ folder
+    analysis.RAW_DATA_PATH, analysis.OUTPUT_DIR = data_path, workdir
+    data_loader.CACHE_DIR = os.path.join(workdir, '.cache')
+    full_df = _quietly(data_loader.load_flights, data_path)
+    n = len(full_df)
+    print(f"\n=== {weeks} week(s): {n} flights ===")
+
+    results = {}
+
+    def run(name, call, n_items=n, case_repeat=repeat):
+        if name not in cases:
+            return
+        analysis.PREDICTION_CACHE.clear()
+        quiet_call = [lambda c=c: _quietly(c) for c in call] if isinstance(call, list) else (lambda: _quietly(call))
+        results[name] = stats = measure(quiet_call, n_items=n_items, repeat=case_repeat)
+        print(f"{name:32s} p50 {stats['p50_ms']:10.1f} ms  p95 {stats['p95_ms']:10.1f} ms  "
+              f"{stats['throughput_per_s'] or 0:12,.0f} items/s  peak {stats['peak_mem_mb']:8.1f} MB")
+
+    run('process_flight_data', analysis.process_flight_data)
+    run('find_top_cascading_flights', lambda: analysis.find_top_cascading_flights(full_df))
+    if 'cascade_graph' in cases:
+        from create_visuals import build_cascade_graph
+        run('cascade_graph', lambda: build_cascade_graph(full_df))
+
+    if 'optimize_flight_schedule' in cases:
+        from flight_index import FlightIndex
+        flight_index = FlightIndex(full_df)
+        flight_ids = full_df['flight'].drop_duplicates().sample(n=min(20, full_df['flight'].nunique()), random_state=0)
+        # One timed call per flight, so the percentiles are per agent request
+        run('optimize_flight_schedule',
+            [lambda f=f: analysis.optimize_flight_schedule(f, flight_index, None) for f in flight_ids], n_items=1)
+    run('run_system_wide_optimization',
+        lambda: analysis.run_system_wide_optimization(full_df, None, sample_size=None, n_workers=n_workers))
+    if 'train_model' in cases:
+        from train_model import fit_delay_model
+        run('train_model', lambda: fit_delay_model(full_df.copy()), case_repeat=max(1, repeat // 2))
+
+    if 'agent_fast_path' in cases or 'agent_llm_stub' in cases:
+        from langchain_core.language_models import FakeListLLM
+        from agent_engine import load_agent_and_precomputed_data
+        from router import QueryRouter
+        # Offline stand-in for llama3: answers straight away, so this measures the agent overhead only
+        stub = FakeListLLM(responses=["Thought: I know this.\nFinal Answer: Mornings are the busiest period."])
+        agent, _ = _quietly(load_agent_and_precomputed_data, use_snapshot=False, data_path=data_path, llm=stub)
+        router = QueryRouter(agent)
+        run('agent_fast_path', lambda: router.invoke("What are the 3 busiest hours?"), n_items=1)
+        run('agent_llm_stub', lambda: router.invoke("Why are mornings so delayed?"), n_items=1)
+    return {"n_flights": n, "cases": results}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: dict, baseline_path: str):
+    """Prints the p50 ratio (current / baseline) for every case both runs have."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\n--- Compared with {baseline_path} (commit {baseline.get('commit')}) ---")
+    for scale, run in current['results'].items():
+        for case, stats in run['cases'].items():
+            old = baseline.get('results', {}).get(scale, {}).get('cases', {}).get(case)
+            if old:
+                print(f"{scale:>4s} {case:32s} p50 {old['p50_ms']:10.1f} -> {stats['p50_ms']:10.1f} ms "
+                      f"({stats['p50_ms'] / max(old['p50_ms'], 1e-9):.2f}x)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the analysis, optimization, training and agent hot paths.")
+    parser.add_argument('--weeks', type=int, nargs='+', default=[1], help="Data scales to run, in weeks (e.g. 1 4 52).")
+    parser.add_argument('--cases', nargs='+', default=ALL_CASES, choices=ALL_CASES)
+    parser.add_argument('--repeat', type=int, default=5, help="Timed runs per case (after one warm-up run).")
+    parser.add_argument('--workers', type=int, default=1, help="Worker processes for run_system_wide_optimization.")
+    parser.add_argument('--output', default=None, help="Results JSON (default: data/benchmarks/<commit>_<time>.json).")
+    parser.add_argument('--compare', default=None, help="Earlier results JSON to compare against.")
+    args = parser.parse_args()
+
+    if analysis.get_model() is None:
+        sys.exit("Model file not found. Please run train_model.py first.")
+    report = {
+        "commit": _git_commit(),
+        "timestamp": pd.Timestamp.now().isoformat(timespec='seconds'),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "repeat": args.repeat,
+        "workers": args.workers,
+        "results": {},
+    }
+    workdir = tempfile.mkdtemp(prefix='flight_bench_')
+    try:
+        for weeks in args.weeks:
+            report['results'][f"{weeks}w"] = run_benchmarks(weeks, args.cases, args.repeat, args.workers, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = args.output or os.path.join(BENCHMARK_DIR, f"{report['commit'] or 'nogit'}_{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=4)
+    print(f"\n✅ Benchmark results saved to '{output}'")
+    if args.compare:
+        compare(report, args.compare)
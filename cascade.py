@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+
+RESULT_COLUMNS = ['flight', 'tail_id', 'airline', 'sched_time_local', 'origin', 'destination', 'delay_min',
+                  'inherited_delay_min', 'downstream_delay_min', 'downstream_flights']
+
+
+def _to_rotation_grid(values: np.ndarray, tail_codes: np.ndarray, positions: np.ndarray, shape, fill=0.0):
+    """Lays per-flight values out as a (tail, position-in-rotation) array, padded with `fill`."""
+    grid = np.full(shape, fill, dtype=float)
+    grid[tail_codes, positions] = values
+    return grid
+
+
+class CascadeEngine:
+    """
+    Propagates delays along each aircraft's full rotation (across days, so
+    overnight rotations are included) and attributes downstream delay minutes
+    to the flight that started them.
+
+    For consecutive flights i -> i+1 of one tail, the delay flight i+1 inherits is
+    either modelled from the schedule, min(max(delay_i - slack, 0), delay_i+1)
+    with slack = scheduled gap - min_turnaround_mins, or taken from the recorded
+    `propagated_from_prev` column (crew/gate links) when use_recorded_links=True.
+    Flight i+1 passes on the inherited share of its own delay, so the total
+    downstream delay of flight i is computed in one reverse pass per rotation:
+
+        downstream_i = inherited_i+1 + (inherited_i+1 / delay_i+1) * downstream_i+1
+
+    The pass is vectorized across tails, one step per rotation position.
+    """
+
+    def __init__(self, full_flight_df: pd.DataFrame, min_turnaround_mins=30, use_recorded_links=False):
+        df = full_flight_df.sort_values(['tail_id', 'sched_time_local'])
+        tail_codes, tails = pd.factorize(df['tail_id'], sort=True)
+        positions = df.groupby(tail_codes, sort=False).cumcount().to_numpy()
+        shape = (len(tails), positions.max() + 1 if len(df) else 0)
+
+        sched = df['sched_time_local']
+        if 'delay_min' in df.columns:
+            delay = df['delay_min'].to_numpy(dtype=float)
+        else:
+            delay = (df['actual_time_local'] - sched).dt.total_seconds().to_numpy() / 60
+        delay = np.clip(delay, 0, None)
+        sched_min = sched.to_numpy().astype('datetime64[m]').astype(np.int64).astype(float)
+
+        own = _to_rotation_grid(delay, tail_codes, positions, shape)
+        if use_recorded_links:
+            recorded = df['propagated_from_prev'].fillna(0).to_numpy(dtype=float)
+            inherited = np.minimum(_to_rotation_grid(recorded, tail_codes, positions, shape), own)
+        else:
+            times = _to_rotation_grid(sched_min, tail_codes, positions, shape, fill=np.nan)
+            slack = np.clip(np.diff(times, axis=1) - min_turnaround_mins, 0, None)
+            inherited = np.zeros(shape)
+            inherited[:, 1:] = np.clip(own[:, :-1] - slack, 0, None)
+            inherited = np.where(np.isnan(inherited), 0, np.minimum(inherited, own))
+        inherited[:, 0] = 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            share = np.where(own > 0, inherited / own, 0.0)
+
+        downstream = np.zeros(shape)
+        chain = np.zeros(shape)
+        for pos in range(shape[1] - 2, -1, -1):
+            nxt = pos + 1
+            downstream[:, pos] = inherited[:, nxt] + share[:, nxt] * downstream[:, nxt]
+            chain[:, pos] = (inherited[:, nxt] > 0) * (1 + chain[:, nxt])
+
+        # .array keeps categorical columns as codes instead of expanding them into Python strings
+        self.results = pd.DataFrame({
+            'flight': df['flight'].array,
+            'tail_id': df['tail_id'].array,
+            'airline': df['airline'].array,
+            'sched_time_local': sched.to_numpy(),
+            'origin': df['origin'].array,
+            'destination': df['destination'].array,
+            'delay_min': delay,
+            'inherited_delay_min': inherited[tail_codes, positions],
+            'downstream_delay_min': downstream[tail_codes, positions],
+            'downstream_flights': chain[tail_codes, positions].astype(int),
+        }, columns=RESULT_COLUMNS)
+
+    def top_k(self, k=10, airline=None, hour=None, day=None) -> pd.DataFrame:
+        """
+        The k flights with the most attributable downstream delay (flights that
+        triggered none are left out), optionally filtered by airline, scheduled
+        hour, or day (a date like '2025-08-12' or a weekday name like 'Tuesday').
+        """
+        results = self.results
+        mask = (results['downstream_delay_min'] > 0).to_numpy()
+        if airline is not None:
+            mask &= (results['airline'].astype(str) == str(airline)).to_numpy()
+        if hour is not None:
+            mask &= (results['sched_time_local'].dt.hour == int(hour)).to_numpy()
+        if day is not None:
+            day = str(day).strip()
+            if day.capitalize() in ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"):
+                mask &= (results['sched_time_local'].dt.day_name() == day.capitalize()).to_numpy()
+            else:
+                mask &= (results['sched_time_local'].dt.normalize() == pd.Timestamp(day).normalize()).to_numpy()
+        return results[mask].nlargest(k, 'downstream_delay_min')
@@ -2,29 +2,63 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 import os
+import json
+import time
+import hashlib
+import inspect
+import argparse
+import multiprocessing
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 import networkx as nx
+import analysis
+from data_loader import load_flights
+from delay_surface import SURFACE_PATH, DelaySurface
 
-def create_visualizations():
-    print("--- Starting Visualization Generation (Final Version) ---")
-    
-    DATA_DIR = 'data'
-    VISUALS_DIR = 'visuals'
-    os.makedirs(VISUALS_DIR, exist_ok=True)
-    
-    try:
-        full_df = pd.read_csv(os.path.join(DATA_DIR, 'bom_week_flights_synthetic.csv'))
-        full_df['sched_time_local'] = pd.to_datetime(full_df['sched_time_local'])
-        full_df['actual_time_local'] = pd.to_datetime(full_df['actual_time_local'])
+DATA_DIR = 'data'
+VISUALS_DIR = 'visuals'
+RAW_DATA_FILE = os.path.join(DATA_DIR, 'bom_week_flights_synthetic.csv')
+BUSIEST_FILE = os.path.join(DATA_DIR, 'busiest_hours.csv')
+AVG_DELAY_FILE = os.path.join(DATA_DIR, 'avg_delay_by_hour.csv')
+RESULTS_FILE = os.path.join(DATA_DIR, 'optimization_results.csv')
+# Input hashes of the last render of every chart, so unchanged charts are skipped
+MANIFEST_PATH = os.path.join(VISUALS_DIR, '.render_manifest.json')
+
+# One chart: the PNG it writes, the files it reads, render(path, **options), and the helpers render
+# calls, whose code is part of the chart's input hash
+ChartSpec = namedtuple('ChartSpec', ['name', 'output', 'inputs', 'render', 'code'], defaults=((),))
+
+def build_cascade_graph(full_df):
+    """
+    Builds the cascade DiGraph: one node per flight, and an edge from each flight
+    to the next flight flown by the same tail when the delay grew between them.
+    The edge list comes from shifted columns and is added in bulk.
+    """
+    df_sorted = full_df.sort_values(['tail_id', 'sched_time_local'])
+    flights = df_sorted['flight'].astype(str)
+    by_tail = df_sorted.groupby('tail_id', observed=True, sort=False)
+    cascade_effect = by_tail['delay_min'].diff()
+    prev_flight = flights.groupby(df_sorted['tail_id'], observed=True, sort=False).shift(1)
+
+    # Only add an edge if there's a positive cascade effect
+    has_edge = cascade_effect > 0
+    G = nx.DiGraph()
+    G.add_nodes_from((flight, {'tail_id': tail}) for flight, tail in zip(flights, df_sorted['tail_id'].astype(str)))
+    G.add_weighted_edges_from(zip(prev_flight[has_edge], flights[has_edge], cascade_effect[has_edge]))
+    return G
+
+def _load_flights():
+    full_df = load_flights(RAW_DATA_FILE)
+    if 'delay_min' not in full_df.columns:  # the raw file normally carries it already
         full_df['delay_min'] = (full_df['actual_time_local'] - full_df['sched_time_local']).dt.total_seconds() / 60
-        summary_df = pd.read_csv(os.path.join(DATA_DIR, 'busiest_hours.csv')).merge(
-            pd.read_csv(os.path.join(DATA_DIR, 'avg_delay_by_hour.csv')), on='hour'
-        )
-        print("Successfully loaded base data.")
-    except FileNotFoundError as e:
-        print(f"Error loading data: {e}")
-        return
-
-    # Chart 1: Busiest Hours
+    return full_df
+
+def _load_summary():
+    return pd.read_csv(BUSIEST_FILE).merge(pd.read_csv(AVG_DELAY_FILE), on='hour')
+
+# Chart 1: Busiest Hours
+def render_busiest_hours(path):
+    summary_df = pd.read_csv(BUSIEST_FILE)
     plt.figure(figsize=(12, 7))
     sns.barplot(x='hour', y='ops_count', data=summary_df, palette='viridis', hue='hour', legend=False)
     plt.title('Total Flight Operations by Hour', fontsize=16)
@@ -32,11 +66,12 @@ def create_visualizations():
     plt.ylabel('Number of Flights', fontsize=12)
     plt.xticks(rotation=45)
     plt.tight_layout()
-    plt.savefig(os.path.join(VISUALS_DIR, 'busiest_hours_barchart.png'))
-    print(f"Saved: busiest_hours_barchart.png")
+    plt.savefig(path)
     plt.close()
 
-    # Chart 2: Average Delay
+# Chart 2: Average Delay
+def render_average_delay(path):
+    summary_df = pd.read_csv(AVG_DELAY_FILE)
     plt.figure(figsize=(12, 7))
     sns.lineplot(x='hour', y='delay_min', data=summary_df, marker='o', color='crimson')
     plt.title('Average Delay by Hour', fontsize=16)
@@ -44,11 +79,12 @@ def create_visualizations():
     plt.ylabel('Average Delay (Minutes)', fontsize=12)
     plt.grid(True, linestyle='--', alpha=0.6)
     plt.tight_layout()
-    plt.savefig(os.path.join(VISUALS_DIR, 'average_delay_linechart.png'))
-    print(f"Saved: average_delay_linechart.png")
+    plt.savefig(path)
     plt.close()
 
-    # Chart 3: Heatmap
+# Chart 3: Heatmap
+def render_delay_heatmap(path):
+    full_df = _load_flights()
     full_df['day_of_week'] = full_df['sched_time_local'].dt.day_name()
     full_df['hour'] = full_df['sched_time_local'].dt.hour
     heatmap_data = full_df.pivot_table(values='delay_min', index='day_of_week', columns='hour', aggfunc='mean')
@@ -60,11 +96,30 @@ def create_visualizations():
     plt.xlabel('Hour of Day', fontsize=12)
     plt.ylabel('Day of the Week', fontsize=12)
     plt.tight_layout()
-    plt.savefig(os.path.join(VISUALS_DIR, 'delay_heatmap.png'))
-    print(f"Saved: delay_heatmap.png")
+    plt.savefig(path)
+    plt.close()
+
+# Chart 3b: Predicted Delay Heatmap, read from the precomputed delay surface (no model calls)
+def render_predicted_heatmap(path):
+    analysis.get_model()
+    if analysis.DELAY_SURFACE is None:
+        raise FileNotFoundError("no delay surface for the current model (run `python delay_surface.py`)")
+    full_df = _load_flights()
+    route_counts = full_df.groupby(['origin', 'destination'], observed=True).size()
+    route_weights = {(str(o), str(d)): n for (o, d), n in route_counts.items()}
+    predicted = analysis.DELAY_SURFACE.weekday_hour_grid(route_weights, full_df['sched_time_local'].dt.month.unique())
+    plt.figure(figsize=(16, 8))
+    sns.heatmap(predicted, cmap='YlOrRd', annot=True, fmt=".1f", linewidths=.5)
+    plt.title('Heatmap of Predicted Delay (Minutes) by Day and Hour', fontsize=16)
+    plt.xlabel('Hour of Day', fontsize=12)
+    plt.ylabel('Day of the Week', fontsize=12)
+    plt.tight_layout()
+    plt.savefig(path)
     plt.close()
 
-    # Chart 4: Scatter Plot
+# Chart 4: Scatter Plot
+def render_congestion_scatter(path):
+    summary_df = _load_summary()
     plt.figure(figsize=(10, 8))
     sns.regplot(x='ops_count', y='delay_min', data=summary_df, scatter_kws={'s':100, 'alpha':0.7})
     plt.title('Flight Congestion vs. Average Delay', fontsize=16)
@@ -72,76 +127,180 @@ def create_visualizations():
     plt.ylabel('Average Delay (Minutes)', fontsize=12)
     plt.grid(True, linestyle='--', alpha=0.6)
     plt.tight_layout()
-    plt.savefig(os.path.join(VISUALS_DIR, 'congestion_vs_delay_scatter.png'))
-    print(f"Saved: congestion_vs_delay_scatter.png")
+    plt.savefig(path)
     plt.close()
 
-    # Chart 5: Optimization Improvements
-    try:
-        results_df = pd.read_csv(os.path.join(DATA_DIR, 'optimization_results.csv'))
-        top_10_improvements = results_df.sort_values('delay_reduction_mins', ascending=False).head(10)
-        plt.figure(figsize=(12, 8))
-        sns.barplot(x='delay_reduction_mins', y='flight_id', data=top_10_improvements, palette='summer', hue='flight_id', legend=False)
-        plt.title('Top 10 Flights by Predicted Delay Reduction', fontsize=16)
-        plt.xlabel('Predicted Delay Saved (Minutes)', fontsize=12)
-        plt.ylabel('Flight ID', fontsize=12)
-        plt.tight_layout()
-        plt.savefig(os.path.join(VISUALS_DIR, 'optimization_improvements.png'))
-        print(f"Saved: optimization_improvements.png")
-        plt.close()
-    except FileNotFoundError:
-        print("Skipping optimization visuals: 'optimization_results.csv' not found.")
-
-    # Chart 6: Cascading Delay Network Graph
-    print("Generating advanced cascade network graph... this may take a moment.")
-    try:
-        df_sorted = full_df.sort_values(['tail_id', 'sched_time_local'])
-        df_sorted['cascade_effect_min'] = df_sorted.groupby('tail_id')['delay_min'].diff()
-        
-        G = nx.DiGraph()
-        for _, row in df_sorted.iterrows():
-            G.add_node(row['flight'], tail_id=row['tail_id'])
-
-        for tail_id, group in df_sorted.groupby('tail_id'):
-            for i in range(len(group) - 1):
-                flight1 = group.iloc[i]
-                flight2 = group.iloc[i+1]
-                # Only add an edge if there's a positive cascade effect
-                cascade_weight = flight2['cascade_effect_min']
-                if pd.notna(cascade_weight) and cascade_weight > 0:
-                    G.add_edge(flight1['flight'], flight2['flight'], weight=cascade_weight)
+# Chart 5: Optimization Improvements
+def render_optimization_improvements(path):
+    results_df = pd.read_csv(RESULTS_FILE)
+    top_10_improvements = results_df.sort_values('delay_reduction_mins', ascending=False).head(10)
+    plt.figure(figsize=(12, 8))
+    sns.barplot(x='delay_reduction_mins', y='flight_id', data=top_10_improvements, palette='summer', hue='flight_id', legend=False)
+    plt.title('Top 10 Flights by Predicted Delay Reduction', fontsize=16)
+    plt.xlabel('Predicted Delay Saved (Minutes)', fontsize=12)
+    plt.ylabel('Flight ID', fontsize=12)
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close()
+
+# Chart 6: Cascading Delay Network Graph
+def render_cascade_graph(path, centrality_k=None):
+    full_df = _load_flights()
+    stage_start = time.perf_counter()
+    G = build_cascade_graph(full_df)
+    print(f"  Graph build: {time.perf_counter() - stage_start:.2f}s ({G.number_of_nodes()} nodes, {G.number_of_edges()} edges)")
 
+    stage_start = time.perf_counter()
+    if centrality_k and centrality_k < G.number_of_nodes():
+        centrality = nx.betweenness_centrality(G, k=centrality_k, weight='weight', normalized=True, seed=42)
+    else:
         centrality = nx.betweenness_centrality(G, weight='weight', normalized=True)
-        top_nodes = sorted(centrality, key=centrality.get, reverse=True)[:15]
-
-        nodes_to_include = set(top_nodes)
-        for node in top_nodes:
-            for pred in G.predecessors(node):
-                nodes_to_include.add(pred)
-            for succ in G.successors(node):
-                nodes_to_include.add(succ)
-        H = G.subgraph(nodes_to_include)
-
-        plt.figure(figsize=(22, 18))
-        pos = nx.spring_layout(H, k=0.9, iterations=50, seed=42)
-        
-        node_sizes = [centrality.get(node, 0) * 40000 + 800 for node in H.nodes()]
-        edge_weights = [H[u][v].get('weight', 0) for u, v in H.edges()]
-        
-        nx.draw_networkx_edges(H, pos, width=[w/20 for w in edge_weights], edge_color='red', alpha=0.6)
-        nx.draw_networkx_nodes(H, pos, node_size=node_sizes, node_color='skyblue')
-        nx.draw_networkx_labels(H, pos, font_size=10)
-        
-        plt.title('Cascading Delay Network (Top 15 Most Influential Flights)', fontsize=24)
-        plt.box(False)
-        graph_path = os.path.join(VISUALS_DIR, 'cascade_network_graph.png')
-        plt.savefig(graph_path)
-        print(f"Saved: {graph_path}")
-        plt.close()
+    print(f"  Centrality ({'k=' + str(centrality_k) if centrality_k else 'exact'}): {time.perf_counter() - stage_start:.2f}s")
+
+    stage_start = time.perf_counter()
+    top_nodes = sorted(centrality, key=centrality.get, reverse=True)[:15]
+
+    nodes_to_include = set(top_nodes)
+    for node in top_nodes:
+        for pred in G.predecessors(node):
+            nodes_to_include.add(pred)
+        for succ in G.successors(node):
+            nodes_to_include.add(succ)
+    H = G.subgraph(nodes_to_include)
+
+    plt.figure(figsize=(22, 18))
+    pos = nx.spring_layout(H, k=0.9, iterations=50, seed=42)
+
+    node_sizes = [centrality.get(node, 0) * 40000 + 800 for node in H.nodes()]
+    edge_weights = [H[u][v].get('weight', 0) for u, v in H.edges()]
+
+    nx.draw_networkx_edges(H, pos, width=[w/20 for w in edge_weights], edge_color='red', alpha=0.6)
+    nx.draw_networkx_nodes(H, pos, node_size=node_sizes, node_color='skyblue')
+    nx.draw_networkx_labels(H, pos, font_size=10)
+
+    plt.title('Cascading Delay Network (Top 15 Most Influential Flights)', fontsize=24)
+    plt.box(False)
+    plt.savefig(path)
+    print(f"  Layout and render: {time.perf_counter() - stage_start:.2f}s")
+    plt.close()
+
+CHARTS = [
+    ChartSpec('busiest_hours', 'busiest_hours_barchart.png', [BUSIEST_FILE], render_busiest_hours),
+    ChartSpec('average_delay', 'average_delay_linechart.png', [AVG_DELAY_FILE], render_average_delay),
+    ChartSpec('delay_heatmap', 'delay_heatmap.png', [RAW_DATA_FILE], render_delay_heatmap, [_load_flights]),
+    ChartSpec('predicted_heatmap', 'predicted_delay_heatmap.png',
+              [RAW_DATA_FILE, analysis.MODEL_PATH, SURFACE_PATH, os.path.splitext(SURFACE_PATH)[0] + '.json'],
+              render_predicted_heatmap, [_load_flights, DelaySurface.weekday_hour_grid]),
+    ChartSpec('congestion_scatter', 'congestion_vs_delay_scatter.png', [BUSIEST_FILE, AVG_DELAY_FILE],
+              render_congestion_scatter, [_load_summary]),
+    ChartSpec('optimization_improvements', 'optimization_improvements.png', [RESULTS_FILE],
+              render_optimization_improvements),
+    ChartSpec('cascade_graph', 'cascade_network_graph.png', [RAW_DATA_FILE], render_cascade_graph,
+              [_load_flights, build_cascade_graph]),
+]
+CHART_OPTIONS = {'cascade_graph': ['centrality_k']}
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def chart_input_hash(spec: ChartSpec, options: dict, digests: dict) -> str:
+    """Content hash of a chart's input files, its options, its render code and the helpers it calls."""
+    digest = hashlib.sha256(inspect.getsource(spec.render).encode())
+    for helper in spec.code:
+        digest.update(inspect.getsource(helper).encode())
+    digest.update(json.dumps(options, sort_keys=True).encode())
+    for path in spec.inputs:
+        digest.update(f"{path}:{digests[path]}".encode())
+    return digest.hexdigest()
+
+def _render_chart(name: str, options: dict):
+    """Renders one chart (in a worker process or inline); returns (name, seconds, error or None)."""
+    spec = next(spec for spec in CHARTS if spec.name == name)
+    start = time.perf_counter()
+    try:
+        spec.render(os.path.join(VISUALS_DIR, spec.output), **options)
     except Exception as e:
-        print(f"Could not generate network graph. Error: {e}")
+        plt.close('all')
+        return name, time.perf_counter() - start, str(e)
+    return name, time.perf_counter() - start, None
+
+def create_visualizations(centrality_k=None, n_workers=None, force=False):
+    """
+    Renders every chart into visuals/. A chart is skipped when the content hash
+    of its input files, options and render code matches its last render (see
+    MANIFEST_PATH; `force` renders everything); the rest are rendered across
+    `n_workers` processes (default: every core). With `centrality_k`, the
+    cascade graph uses approximate betweenness centrality sampled from k
+    source nodes. Returns {chart name: 'rendered' | 'unchanged' | 'skipped' | 'failed'}.
+    """
+    print("--- Starting Visualization Generation (Final Version) ---")
+    os.makedirs(VISUALS_DIR, exist_ok=True)
+    n_workers = n_workers or os.cpu_count() or 1
+    try:
+        with open(MANIFEST_PATH) as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        manifest = {}
+
+    # Hash every input file once, even when several charts read it
+    digests = {}
+    for path in {path for spec in CHARTS for path in spec.inputs}:
+        if os.path.exists(path):
+            digests[path] = _file_digest(path)
+
+    status, jobs = {}, {}
+    for spec in CHARTS:
+        missing = [path for path in spec.inputs if path not in digests]
+        if missing:
+            print(f"Skipping {spec.output}: {', '.join(missing)} not found.")
+            status[spec.name] = 'skipped'
+            continue
+        options = {key: value for key, value in {'centrality_k': centrality_k}.items()
+                   if key in CHART_OPTIONS.get(spec.name, [])}
+        input_hash = chart_input_hash(spec, options, digests)
+        if not force and manifest.get(spec.name) == input_hash and os.path.exists(os.path.join(VISUALS_DIR, spec.output)):
+            status[spec.name] = 'unchanged'
+            continue
+        jobs[spec.name] = (options, input_hash)
+
+    print(f"Rendering {len(jobs)} chart(s) ({len(CHARTS) - len(jobs)} unchanged or skipped) "
+          f"using {min(n_workers, max(len(jobs), 1))} worker(s)...")
+    start = time.perf_counter()
+    if n_workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(n_workers, len(jobs)),
+                                 mp_context=multiprocessing.get_context('spawn')) as pool:
+            outputs = list(pool.map(_render_chart, list(jobs), [options for options, _ in jobs.values()]))
+    else:
+        outputs = [_render_chart(name, options) for name, (options, _) in jobs.items()]
+
+    for name, seconds, error in outputs:
+        spec = next(spec for spec in CHARTS if spec.name == name)
+        if error is None:
+            manifest[name] = jobs[name][1]
+            status[name] = 'rendered'
+            print(f"Saved: {spec.output} ({seconds:.2f}s)")
+        else:
+            manifest.pop(name, None)
+            status[name] = 'failed'
+            print(f"Could not generate {spec.output}. Error: {error}")
+    # Written whole and swapped in, so an interrupted run never leaves a truncated manifest
+    tmp_path = MANIFEST_PATH + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(tmp_path, MANIFEST_PATH)
 
-    print("\n--- All visualizations have been generated! ---")
+    print(f"\n--- All visualizations are up to date ({time.perf_counter() - start:.2f}s)! ---")
+    return status
 
 if __name__ == '__main__':
-    create_visualizations()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Generate the report charts into visuals/.")
+    parser.add_argument('--centrality-k', type=int, default=None,
+                        help="Approximate cascade-graph centrality by sampling k source nodes (default: exact).")
+    parser.add_argument('--workers', type=int, default=None, help="Render processes (default: every core).")
+    parser.add_argument('--force', action='store_true', help="Re-render every chart even if its inputs are unchanged.")
+    args = parser.parse_args()
+    create_visualizations(centrality_k=args.centrality_k, n_workers=args.workers, force=args.force)
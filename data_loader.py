@@ -0,0 +1,143 @@
+import os
+import hashlib
+import numpy as np
+import pandas as pd
+from telemetry import timed, increment
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # the cache is an optimization; without pyarrow we just parse the CSV
+    pa = feather = None
+
+RAW_DATA_PATH = 'data/bom_week_flights_synthetic.csv'
+CACHE_DIR = os.path.join('data', '.cache')
+
+DATETIME_COLUMNS = ['sched_time_local', 'actual_time_local']
+CATEGORICAL_COLUMNS = ['op_type', 'flight', 'airline', 'tail_id', 'origin', 'destination', 'dow', 'status']
+# Narrow types for the per-flight measures (an integer column only narrows when every value fits)
+COMPACT_NUMERIC_COLUMNS = {'delay_min': 'int16', 'hour': 'int8', 'propagated_from_prev': 'float32',
+                           'cascade_caused': 'float32'}
+# Bumped whenever the cached column types change, so older caches are rebuilt
+CACHE_LAYOUT = b'2'
+
+
+def _source_signature(path: str) -> dict:
+    stat = os.stat(path)
+    return {b'source_mtime_ns': str(stat.st_mtime_ns).encode(), b'source_size': str(stat.st_size).encode(),
+            b'cache_layout': CACHE_LAYOUT}
+
+
+def cache_path_for(path: str) -> str:
+    # Partitions share file names (e.g. BOM/2025-W33.csv and DEL/2025-W33.csv), so the full path is part of the key
+    digest = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:12]
+    return os.path.join(CACHE_DIR, f"{os.path.splitext(os.path.basename(path))[0]}-{digest}.feather")
+
+
+def parse_flights_csv(path: str, **read_csv_kwargs) -> pd.DataFrame:
+    """Parses a raw flight CSV into typed columns (datetimes, categoricals and narrow numeric types)."""
+    df = pd.read_csv(path, **read_csv_kwargs)
+    return _apply_dtypes(df)
+
+
+def iter_flight_chunks(path: str = RAW_DATA_PATH, chunksize: int = 100_000):
+    """
+    Yields the raw flight CSV as typed DataFrames of at most `chunksize` rows,
+    so multi-month logs can be processed with a fixed memory ceiling.
+    """
+    with pd.read_csv(path, chunksize=chunksize) as reader:
+        for chunk in reader:
+            yield _apply_dtypes(chunk)
+
+
+def _apply_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    for col in DATETIME_COLUMNS + ['date']:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col])
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    for col, dtype in COMPACT_NUMERIC_COLUMNS.items():
+        if col in df.columns:
+            df[col] = _narrow(df[col], np.dtype(dtype))
+    return df
+
+
+def _narrow(series: pd.Series, dtype: np.dtype) -> pd.Series:
+    if dtype.kind == 'f':
+        return series.astype(dtype) if pd.api.types.is_numeric_dtype(series) else series
+    info = np.iinfo(dtype)
+    if pd.api.types.is_integer_dtype(series) and (series.empty or info.min <= series.min() and series.max() <= info.max):
+        return series.astype(dtype)
+    return series
+
+
+def _read_cache(cache_path: str, signature: dict):
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with pa.memory_map(cache_path) as source:
+            table = pa.ipc.open_file(source).read_all()
+    except (OSError, pa.ArrowInvalid):
+        return None
+    metadata = table.schema.metadata or {}
+    if any(metadata.get(key) != value for key, value in signature.items()):
+        return None
+    # Numeric and datetime columns without nulls become read-only views of the mapped file (no copy),
+    # so processes loading the same cache share its pages
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def _write_cache(df: pd.DataFrame, cache_path: str, signature: dict):
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), **signature})
+    # Uncompressed so the file can be memory-mapped on later loads
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"  # per process, as fan_out workers may load the same partition
+    feather.write_feather(table, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, cache_path)
+
+
+@timed('data_load', source='flights')
+def load_flights(path: str = RAW_DATA_PATH, use_cache: bool = True) -> pd.DataFrame:
+    """
+    Loads the raw flight CSV with compact dtypes applied: categoricals for the
+    string columns, int16/int8/float32 for the per-flight measures.
+
+    The first load converts the CSV into a Feather (Arrow IPC) cache under
+    data/.cache/; later loads memory-map that file instead of re-parsing the
+    CSV. The cache is rebuilt whenever the CSV's mtime or size changes.
+    Numeric and datetime columns of a cached load are read-only views of the
+    mapped file; copy a column before writing into it in place.
+    Raises FileNotFoundError if the CSV does not exist.
+    """
+    signature = _source_signature(path)
+    if not use_cache or feather is None:
+        return parse_flights_csv(path)
+
+    cache_path = cache_path_for(path)
+    df = _read_cache(cache_path, signature)
+    increment('flight_data_cache', result='miss' if df is None else 'hit')
+    if df is not None:
+        return df
+    df = parse_flights_csv(path)
+    try:
+        _write_cache(df, cache_path, signature)
+    except OSError as e:
+        print(f"⚠️ Could not write flight data cache '{cache_path}': {e}")
+    return df
+
+
+def load_flight_partitions(paths, use_cache: bool = True) -> pd.DataFrame:
+    """
+    Loads several partition CSVs (each with its own cache) as one flight table,
+    in the given order. Categoricals are rebuilt over the union of the
+    partitions' categories. Raises FileNotFoundError if a partition is missing
+    or there are none.
+    """
+    frames = [load_flights(path, use_cache) for path in paths]
+    if not frames:
+        raise FileNotFoundError("No flight partitions to load.")
+    if len(frames) == 1:
+        return frames[0]
+    return _apply_dtypes(pd.concat(frames, ignore_index=True))
@@ -0,0 +1,119 @@
+import os
+import json
+import itertools
+import numpy as np
+import pandas as pd
+
+SURFACE_PATH = os.path.join('data', 'delay_surface.npy')
+# Axis sizes after the route axis: hour of day, weekday (Monday=0), month (January=0)
+GRID_SHAPE = (24, 7, 12)
+
+
+def _meta_path(path):
+    return os.path.splitext(path)[0] + '.json'
+
+
+def build_delay_surface(predict, routes, model_signature, path=SURFACE_PATH):
+    """
+    Scores every (origin, destination) route in `routes` for all 24 hours, 7
+    weekdays and 12 months with `predict` (a model's predict(features_df)) and
+    saves the result as a float32 array of shape (routes, 24, 7, 12), plus a
+    JSON sidecar with the route list and the signature of the model file it
+    was built from.
+    """
+    routes = [(str(origin), str(destination)) for origin, destination in routes]
+    grid = pd.DataFrame([(origin, destination, hour, weekday, month + 1)
+                         for (origin, destination), hour, weekday, month
+                         in itertools.product(routes, *(range(n) for n in GRID_SHAPE))],
+                        columns=['origin', 'destination', 'sched_hour', 'sched_weekday', 'sched_month'])
+    values = np.asarray(predict(grid), dtype=np.float32).reshape(len(routes), *GRID_SHAPE)
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp.npy'
+    np.save(tmp_path, values)
+    os.replace(tmp_path, path)
+    with open(_meta_path(path), 'w') as f:
+        json.dump({"routes": routes, "model_signature": list(model_signature),
+                   "built_at": pd.Timestamp.now().isoformat(timespec='seconds')}, f)
+    print(f"✅ Delay surface saved to '{path}' ({len(routes)} routes, {values.nbytes / 2**20:.1f} MB).")
+    return path
+
+
+class DelaySurface:
+    """
+    Read side of build_delay_surface: the array is memory-mapped, so loading is
+    instant and worker processes share its pages. lookup() answers a model
+    feature frame with array indexing.
+    """
+
+    def __init__(self, path=SURFACE_PATH):
+        self.path = path
+        with open(_meta_path(path)) as f:
+            meta = json.load(f)
+        self.routes = [tuple(route) for route in meta['routes']]
+        self.route_index = {route: i for i, route in enumerate(self.routes)}
+        self.model_signature = tuple(meta['model_signature'])
+        self.values = np.load(path, mmap_mode='r')
+
+    def covers(self, routes) -> bool:
+        return all((str(origin), str(destination)) in self.route_index for origin, destination in routes)
+
+    def lookup(self, features_df: pd.DataFrame):
+        """
+        Returns (delays, known): the surface value for every feature row, and a
+        mask of the rows it covers (rows on unknown routes or out-of-range
+        hours/weekdays/months are left for the model).
+        """
+        route = np.fromiter((self.route_index.get((str(o), str(d)), -1) for o, d
+                             in zip(features_df['origin'].to_numpy(), features_df['destination'].to_numpy())),
+                            dtype=np.int64, count=len(features_df))
+        hour = features_df['sched_hour'].to_numpy(dtype=np.int64)
+        weekday = features_df['sched_weekday'].to_numpy(dtype=np.int64)
+        month = features_df['sched_month'].to_numpy(dtype=np.int64) - 1
+        known = ((route >= 0) & (hour >= 0) & (hour < GRID_SHAPE[0]) & (weekday >= 0) & (weekday < GRID_SHAPE[1])
+                 & (month >= 0) & (month < GRID_SHAPE[2]))
+        delays = np.full(len(features_df), np.nan)
+        delays[known] = self.values[route[known], hour[known], weekday[known], month[known]]
+        return delays, known
+
+    def weekday_hour_grid(self, route_weights=None, months=None) -> pd.DataFrame:
+        """
+        Predicted delay by weekday (rows, Monday first) and hour (columns),
+        averaged over the routes (weighted by `route_weights`, a {route: weight}
+        dict, e.g. flight counts) and the given months (1-12; default: all).
+        Raises ValueError if no weighted route is on the surface.
+        """
+        weights = np.ones(len(self.routes)) if route_weights is None else \
+            np.array([route_weights.get(route, 0.0) for route in self.routes], dtype=float)
+        if not weights.sum() > 0:
+            raise ValueError(f"none of the weighted routes are on the delay surface '{self.path}'")
+        months = np.arange(GRID_SHAPE[2]) if months is None else np.asarray(months, dtype=int) - 1
+        by_route = self.values[:, :, :, months].mean(axis=3)  # (routes, hour, weekday)
+        grid = np.tensordot(weights / weights.sum(), by_route, axes=1)  # (hour, weekday)
+        days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+        return pd.DataFrame(grid.T, index=days, columns=range(GRID_SHAPE[0]))
+
+
+def load_delay_surface(model_signature, path=SURFACE_PATH):
+    """The DelaySurface built from the model file with `model_signature`, or None (missing or out of date)."""
+    if model_signature is None or not os.path.exists(path) or not os.path.exists(_meta_path(path)):
+        return None
+    try:
+        surface = DelaySurface(path)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"⚠️ Not using the delay surface '{path}': {e}")
+        return None
+    if surface.model_signature != tuple(model_signature):
+        print(f"⚠️ Delay surface '{path}' was built for another model; re-run `python delay_surface.py` to rebuild it.")
+        return None
+    return surface
+
+
+if __name__ == '__main__':
+    import analysis
+    from data_loader import RAW_DATA_PATH, load_flights
+
+    flights = load_flights(RAW_DATA_PATH)
+    routes = flights[['origin', 'destination']].drop_duplicates().itertuples(index=False, name=None)
+    if analysis.rebuild_delay_surface(routes) is None:
+        raise SystemExit("Model file not found. Please run train_model.py first.")
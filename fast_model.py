@@ -0,0 +1,143 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+
+ARTIFACT_PATH = 'flight_delay_model.xgb.json'
+ENCODING_ATTR = 'feature_encoding'
+
+
+def _xgboost():
+    """xgboost, imported on first use (it pulls in sklearn and scipy, seconds of startup); None if not installed."""
+    try:
+        import xgboost
+    except ImportError:  # the fast path is an optimization; without xgboost the joblib pipeline is used
+        return None
+    return xgboost
+
+
+def export_inference_artifact(pipeline, path=ARTIFACT_PATH):
+    """
+    Saves the pipeline's booster in native XGBoost JSON, with the
+    ColumnTransformer's layout (numeric column positions, category -> one-hot
+    column maps) stored as a booster attribute, so FastDelayModel can score
+    without sklearn.
+    """
+    from sklearn.preprocessing import OneHotEncoder
+
+    preprocessor = pipeline.named_steps['preprocessor']
+    regressor = pipeline.named_steps['regressor']
+    encoding = {"numeric": {}, "categorical": {}, "sparse": bool(preprocessor.sparse_output_)}
+    column = 0
+    for name, transformer, features in preprocessor.transformers_:
+        if transformer == 'drop':
+            continue
+        if transformer == 'passthrough':
+            for feature in features:
+                encoding['numeric'][feature] = column
+                column += 1
+        elif isinstance(transformer, OneHotEncoder) and transformer.drop is None:
+            for feature, categories in zip(features, transformer.categories_):
+                encoding['categorical'][feature] = {"offset": column, "categories": [str(c) for c in categories]}
+                column += len(categories)
+        else:
+            raise ValueError(f"Cannot export transformer '{name}' ({transformer!r}) to the fast inference path.")
+    encoding['n_columns'] = column
+    try:
+        encoding['iteration_end'] = int(regressor.best_iteration) + 1
+    except AttributeError:  # not trained with early stopping: predict uses every tree
+        encoding['iteration_end'] = 0
+
+    booster = regressor.get_booster().copy()
+    booster.set_attr(**{ENCODING_ATTR: json.dumps(encoding)})
+    booster.save_model(path)
+    print(f"✅ Fast inference model saved to '{path}'")
+    return path
+
+
+class FastDelayModel:
+    """
+    Scores model feature rows straight from NumPy: one-hot encoding is a
+    precomputed category -> column lookup, and the native booster predicts on a
+    dense float32 matrix. Drop-in for the pipeline's predict(features_df).
+    """
+
+    def __init__(self, path=ARTIFACT_PATH):
+        self.path = path
+        self.booster = _xgboost().Booster(model_file=path)
+        encoding = json.loads(self.booster.attr(ENCODING_ATTR))
+        self.numeric = encoding['numeric']
+        self.categorical = {feature: (spec['offset'], {c: i for i, c in enumerate(spec['categories'])})
+                            for feature, spec in encoding['categorical'].items()}
+        self.n_columns = encoding['n_columns']
+        # The pipeline hands XGBoost a sparse matrix, where every zero counts as "missing"
+        self.sparse = encoding['sparse']
+        self.iteration_range = (0, encoding['iteration_end'])
+
+    def encode(self, features_df: pd.DataFrame) -> np.ndarray:
+        n = len(features_df)
+        X = np.full((n, self.n_columns), np.nan if self.sparse else 0.0, dtype=np.float32)
+        for feature, column in self.numeric.items():
+            values = features_df[feature].to_numpy(dtype=np.float32)
+            X[:, column] = np.where(values == 0, np.nan, values) if self.sparse else values
+        rows = np.arange(n)
+        for feature, (offset, lookup) in self.categorical.items():
+            codes = np.fromiter((lookup.get(str(value), -1) for value in features_df[feature].to_numpy()), dtype=np.int64, count=n)
+            known = codes >= 0  # unknown categories encode as all-zero, like handle_unknown='ignore'
+            X[rows[known], offset + codes[known]] = 1.0
+        return X
+
+    def predict(self, features_df: pd.DataFrame) -> np.ndarray:
+        return self.booster.inplace_predict(self.encode(features_df), iteration_range=self.iteration_range,
+                                            missing=np.nan)
+
+    def probe_features(self, n_rows=512, seed=0) -> pd.DataFrame:
+        """Random feature rows over every known category (plus an unknown one) and the full hour/weekday/month ranges."""
+        rng = np.random.default_rng(seed)
+        frame = {}
+        for feature, (_, lookup) in self.categorical.items():
+            frame[feature] = rng.choice(list(lookup) + ['UNKNOWN'], n_rows)
+        ranges = {'sched_hour': 24, 'sched_weekday': 7, 'sched_month': 13}
+        for feature in self.numeric:
+            frame[feature] = rng.integers(1 if feature == 'sched_month' else 0, ranges.get(feature, 24), n_rows)
+        return pd.DataFrame(frame)
+
+
+def verify_fast_model(fast_model: FastDelayModel, pipeline, features_df=None, tolerance=1e-3) -> float:
+    """
+    Equivalence check: scores features_df (default: fast_model.probe_features())
+    with both the fast path and the sklearn pipeline and returns the largest
+    absolute difference in minutes. Raises ValueError above `tolerance`.
+    """
+    if features_df is None:
+        features_df = fast_model.probe_features()
+    columns = list(pipeline.named_steps['preprocessor'].feature_names_in_)
+    expected = pipeline.predict(features_df[columns]).astype(float)
+    diff = float(np.max(np.abs(fast_model.predict(features_df).astype(float) - expected))) if len(features_df) else 0.0
+    if diff > tolerance:
+        raise ValueError(f"Fast model '{fast_model.path}' differs from the pipeline by up to {diff:.4f} minutes.")
+    return diff
+
+
+def load_fast_model(pipeline, path=ARTIFACT_PATH):
+    """The verified fast model for `pipeline`, or None (artifact missing, xgboost missing, or out of date)."""
+    xgb = _xgboost() if pipeline is not None and os.path.exists(path) else None
+    if xgb is None:
+        return None
+    try:
+        fast_model = FastDelayModel(path)
+        verify_fast_model(fast_model, pipeline)
+    except (ValueError, KeyError, TypeError, xgb.core.XGBoostError) as e:
+        print(f"⚠️ Not using the fast inference model: {e} Re-run train_model.py (or `python fast_model.py`) to re-export it.")
+        return None
+    return fast_model
+
+
+if __name__ == '__main__':
+    import joblib
+    from analysis import MODEL_PATH
+
+    pipeline = joblib.load(MODEL_PATH)
+    export_inference_artifact(pipeline)
+    diff = verify_fast_model(FastDelayModel(), pipeline)
+    print(f"✅ Fast path matches the sklearn pipeline (max difference {diff:.2e} minutes).")
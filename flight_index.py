@@ -0,0 +1,104 @@
+import threading
+from collections import OrderedDict
+import pandas as pd
+import numpy as np
+from telemetry import timed, increment
+
+# (signature, index) for the last few DataFrames passed to as_flight_index, keyed by id(). Each index
+# holds its DataFrame, so an id cannot be recycled while its entry is cached. (Not df.attrs: pandas
+# copies attrs onto derived frames, which would hand a filtered frame its parent's index.)
+_INDEX_CACHE = OrderedDict()
+_INDEX_CACHE_SIZE = 4
+_INDEX_CACHE_LOCK = threading.Lock()
+
+
+class FlightIndex:
+    """
+    O(1) lookup of flight rows by flight ID, or by (flight ID, date).
+
+    The same flight number repeats on every day it operates, so a plain
+    flight-ID lookup returns the first scheduled occurrence; pass a date to
+    pick a specific day.
+    """
+
+    def __init__(self, full_flight_df: pd.DataFrame):
+        self.df = full_flight_df
+        positions = np.arange(len(full_flight_df))
+        flights = full_flight_df['flight'].to_numpy()
+        dates = pd.to_datetime(full_flight_df['sched_time_local']).dt.date.to_numpy()
+        sched = pd.to_datetime(full_flight_df['sched_time_local']).to_numpy()
+
+        # Walk rows from latest to earliest so the earliest occurrence wins.
+        order = np.lexsort((positions, sched))[::-1]
+        self._by_flight = dict(zip(flights[order], positions[order]))
+        self._by_flight_date = dict(zip(zip(flights[order], dates[order]), positions[order]))
+        self._occurrences = full_flight_df.groupby('flight', sort=False, observed=True).indices
+
+    def __len__(self):
+        return len(self._by_flight)
+
+    def __contains__(self, flight_id):
+        return flight_id in self._by_flight
+
+    @staticmethod
+    def _as_date(date):
+        return pd.Timestamp(date).date()
+
+    def position(self, flight_id: str, date=None) -> int:
+        """Row position of the flight in `df`. Raises KeyError if it is not scheduled."""
+        if date is None:
+            if flight_id not in self._by_flight:
+                raise KeyError(f"Flight with ID '{flight_id}' not found.")
+            return self._by_flight[flight_id]
+        key = (flight_id, self._as_date(date))
+        if key not in self._by_flight_date:
+            raise KeyError(f"Flight with ID '{flight_id}' is not scheduled on {key[1]}.")
+        return self._by_flight_date[key]
+
+    def get(self, flight_id: str, date=None) -> pd.Series:
+        return self.df.iloc[self.position(flight_id, date)]
+
+    @timed('flight_lookup')
+    def rows(self, flight_id: str, date=None) -> pd.DataFrame:
+        """The matching flight as a one-row DataFrame (ready for feature building)."""
+        return self.df.iloc[[self.position(flight_id, date)]]
+
+    def first_rows(self, flight_ids) -> pd.DataFrame:
+        """The first scheduled occurrence of each flight ID, in the given order."""
+        return self.df.iloc[[self._by_flight[f] for f in flight_ids]]
+
+    def occurrences(self, flight_id: str) -> pd.DataFrame:
+        """Every scheduled occurrence of a flight number."""
+        return self.df.iloc[self._occurrences.get(flight_id, [])]
+
+
+def _frame_signature(df: pd.DataFrame):
+    """Cheap change check: row count and scheduled-time range (adding rows or moving times changes it)."""
+    sched = df['sched_time_local']
+    return (len(df), sched.min(), sched.max()) if len(df) else (0,)
+
+
+def as_flight_index(flights) -> FlightIndex:
+    """
+    Accepts either a prebuilt FlightIndex or a raw flight DataFrame. The index
+    built for a DataFrame is reused on later calls with the same frame, and
+    rebuilt when its row count or scheduled-time range has changed. Other
+    in-place edits (e.g. renumbering flights) are not detected; pass a fresh
+    frame or a new FlightIndex after making them.
+    """
+    if isinstance(flights, FlightIndex):
+        return flights
+    signature = _frame_signature(flights)
+    with _INDEX_CACHE_LOCK:
+        cached = _INDEX_CACHE.get(id(flights))
+        if cached is not None and cached[1].df is flights and cached[0] == signature:
+            _INDEX_CACHE.move_to_end(id(flights))
+            increment('flight_index_cache', result='hit')
+            return cached[1]
+    index = FlightIndex(flights)
+    increment('flight_index_cache', result='miss')
+    with _INDEX_CACHE_LOCK:
+        _INDEX_CACHE[id(flights)] = (signature, index)
+        if len(_INDEX_CACHE) > _INDEX_CACHE_SIZE:
+            _INDEX_CACHE.popitem(last=False)
+    return index
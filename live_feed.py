@@ -0,0 +1,281 @@
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+import socketserver
+import numpy as np
+import pandas as pd
+from analysis import build_feature_frame, build_feature_frame_at, predict_delays, get_model
+from flight_index import as_flight_index
+from data_loader import RAW_DATA_PATH, load_flights
+from telemetry import span, increment, observe, SIZE_BUCKETS
+
+EVENTS_PATH = os.path.join('data', 'live_events.jsonl')
+# Feed for the agent's live tool: a JSONL path to tail, or tcp://host:port to listen on
+FEED_ENV = 'FLIGHT_EVENT_FEED'
+
+
+class LiveDelayTracker:
+    """
+    Current expected delay of every flight, updated from actual movement
+    events. A flight's rotation is its tail's flights on the same day (as in
+    find_top_cascading_flights). Applying an event is O(1): it records the
+    observed delay and marks the flight for re-forecasting.
+
+    flush() re-forecasts the unobserved flights downstream of every marked
+    flight, stepping along all affected rotations at once. At each step the
+    delay passed on is max(expected delay of the previous flight - slack, 0),
+    where slack = scheduled gap - min_turnaround_mins. The model is then
+    asked, in one batch for all rotations, about each flight at its pushed-back
+    time. The expected delay is the larger of the two.
+    """
+
+    def __init__(self, full_flight_df, min_turnaround_mins=30):
+        self.flight_index = as_flight_index(full_flight_df)
+        df = self.flight_index.df
+        self.df = df
+        sched = df['sched_time_local'].to_numpy()
+        self.sched = sched
+        day = sched.astype('datetime64[D]')
+        tail_codes = pd.factorize(df['tail_id'], sort=True)[0]
+        order = np.lexsort((sched, day, tail_codes))
+        same_rotation = (tail_codes[order][1:] == tail_codes[order][:-1]) & (day[order][1:] == day[order][:-1])
+        # next_pos[i]: the same tail's next flight on the same day (-1 for the last one)
+        self.next_pos = np.full(len(df), -1, dtype=np.int64)
+        self.next_pos[order[:-1][same_rotation]] = order[1:][same_rotation]
+        gap = np.zeros(len(df))
+        has_next = self.next_pos >= 0
+        gap[has_next] = (sched[self.next_pos[has_next]] - sched[has_next]) / np.timedelta64(1, 'm')
+        self.slack = np.clip(gap - min_turnaround_mins, 0, None)
+
+        with span('live_reforecast', stage='initial'):
+            self.model_delay = predict_delays(build_feature_frame(df, df['sched_time_local'].dt.hour))
+        self.expected = self.model_delay.copy()
+        self.propagated = np.zeros(len(df))
+        self.observed = np.zeros(len(df), dtype=bool)
+        self.updated_at = np.full(len(df), time.time())
+        self.n_events = 0
+        self.last_event_at = None
+        self._dirty = set()
+        self._lock = threading.Lock()
+
+    def _position(self, event: dict) -> int:
+        flight = str(event['flight']).strip().upper()
+        date = event.get('date')
+        if date is None and event.get('actual_time') is not None:
+            try:
+                return self.flight_index.position(flight, pd.Timestamp(event['actual_time']).date())
+            except KeyError:  # landed after midnight: fall back to the first occurrence
+                pass
+        return self.flight_index.position(flight, date)
+
+    def apply(self, event: dict) -> int:
+        """
+        Records one movement event, {"flight": "SQ279", "actual_time": "2025-08-12 10:21"}
+        (or "delay_min" instead of "actual_time"; "date" picks the day). O(1). Raises KeyError for an unknown flight.
+        """
+        pos = self._position(event)
+        if event.get('delay_min') is not None:
+            delay = float(event['delay_min'])
+        else:
+            delay = (pd.Timestamp(event['actual_time']).to_datetime64() - self.sched[pos]) / np.timedelta64(1, 'm')
+        with self._lock:
+            self.expected[pos] = delay
+            self.propagated[pos] = 0.0
+            self.observed[pos] = True
+            self.updated_at[pos] = self.last_event_at = time.time()
+            self.n_events += 1
+            self._dirty.add(pos)
+        increment('live_events')
+        return pos
+
+    def flush(self) -> int:
+        """Re-forecasts everything downstream of the events applied since the last flush; returns the flights updated."""
+        with self._lock:
+            if not self._dirty:
+                return 0
+            previous = np.fromiter(self._dirty, dtype=np.int64)
+            self._dirty.clear()
+            n_updated = 0
+            with span('live_reforecast', stage='micro_batch'):
+                while len(previous):
+                    current = self.next_pos[previous]
+                    # A rotation stops at its end or at the next flight that has reported its own delay
+                    keep = current >= 0
+                    keep[keep] &= ~self.observed[current[keep]]
+                    previous, current = previous[keep], current[keep]
+                    if not len(current):
+                        break
+                    passed_on = np.clip(self.expected[previous] - self.slack[previous], 0, None)
+                    pushed_back = self.sched[current] + (passed_on * 60).astype('timedelta64[s]')
+                    model_delay = predict_delays(build_feature_frame_at(self.df.iloc[current], pushed_back))
+                    self.propagated[current] = passed_on
+                    self.expected[current] = np.maximum(passed_on, model_delay)
+                    self.updated_at[current] = time.time()
+                    n_updated += len(current)
+                    previous = current
+            observe('live_reforecast_flights', n_updated, buckets=SIZE_BUCKETS)
+            return n_updated
+
+    def expected_delay(self, flight_id: str, date=None) -> dict:
+        """The flight's current expected delay (flushing pending events first). Raises KeyError if unknown."""
+        pos = self.flight_index.position(str(flight_id).strip().upper(), date)
+        self.flush()
+        with self._lock:
+            row = self.df.iloc[pos]
+            return {
+                "flight": str(row['flight']), "tail_id": str(row['tail_id']),
+                "sched_time_local": row['sched_time_local'],
+                "status": "observed" if self.observed[pos] else "forecast",
+                "expected_delay_min": float(self.expected[pos]),
+                "propagated_delay_min": float(self.propagated[pos]),
+                "model_delay_min": float(self.model_delay[pos]),
+                "age_seconds": time.time() - self.updated_at[pos],
+                "events": self.n_events,
+            }
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"events": self.n_events, "observed_flights": int(self.observed.sum()), "pending": len(self._dirty),
+                    "last_event_age_seconds": None if self.last_event_at is None else time.time() - self.last_event_at}
+
+
+def _apply_lines(tracker: LiveDelayTracker, lines) -> int:
+    applied = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            tracker.apply(json.loads(line))
+            applied += 1
+        except (ValueError, KeyError, TypeError) as e:
+            increment('live_event_errors')
+            print(f"⚠️ Skipping live event {line.strip()[:120]!r}: {e!r}")
+    return applied
+
+
+def follow_jsonl(tracker: LiveDelayTracker, path=EVENTS_PATH, from_start=True, poll_interval=0.1, stop=None):
+    """
+    Tails a JSONL event file (like `tail -f`), applying every new line and
+    flushing once per read, so each micro-batch holds whatever arrived since
+    the last poll. Runs until `stop` (a threading.Event) is set.
+    """
+    stop = stop or threading.Event()
+    while not os.path.exists(path):
+        if stop.wait(poll_interval):
+            return
+    with open(path) as f:
+        if not from_start:
+            f.seek(0, os.SEEK_END)
+        pending = ""
+        while not stop.is_set():
+            chunk = f.read()
+            if not chunk:
+                stop.wait(poll_interval)
+                continue
+            pending += chunk
+            *lines, pending = pending.split("\n")  # keep a partly written last line for the next read
+            if _apply_lines(tracker, lines):
+                tracker.flush()
+
+
+def flush_every(tracker: LiveDelayTracker, interval=0.1, stop=None):
+    """Flushes the tracker every `interval` seconds, so events that arrive one at a time are re-forecast in micro-batches."""
+    stop = stop or threading.Event()
+    while not stop.wait(interval):
+        tracker.flush()
+
+
+def serve_socket(tracker: LiveDelayTracker, port=9009, host='127.0.0.1', flush_interval=0.1):
+    """Accepts newline-delimited JSON events on a local TCP socket, from background threads."""
+    class EventHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                _apply_lines(tracker, [line.decode()])
+
+    server = socketserver.ThreadingTCPServer((host, port), EventHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    threading.Thread(target=flush_every, args=(tracker, flush_interval), daemon=True).start()
+    print(f"✅ Listening for live flight events on tcp://{host}:{port}")
+    return server
+
+
+def start_live_tracker(full_flight_df, source=None) -> LiveDelayTracker:
+    """A tracker fed from `source` (a JSONL path or tcp://host:port; default: $FLIGHT_EVENT_FEED), if any."""
+    tracker = LiveDelayTracker(full_flight_df)
+    source = source or os.environ.get(FEED_ENV)
+    if source and source.startswith('tcp://'):
+        host, _, port = source[len('tcp://'):].rpartition(':')
+        tracker.server = serve_socket(tracker, int(port), host or '127.0.0.1')
+    elif source:
+        threading.Thread(target=follow_jsonl, args=(tracker, source), daemon=True).start()
+        print(f"✅ Following live flight events in '{source}'")
+    return tracker
+
+
+def replay_events(full_flight_df, path=EVENTS_PATH, date=None, speed=600.0, send_to=None):
+    """
+    Writes the recorded movements (of one date, or all of them) as live events
+    in actual-time order, `speed` times faster than real time, to a JSONL file
+    or (send_to='host:port') a socket. For demos and load tests.
+    """
+    df = full_flight_df
+    if date is not None:
+        df = df[df['sched_time_local'].dt.normalize() == pd.Timestamp(date).normalize()]
+    df = df.sort_values('actual_time_local')
+    sink = socket.create_connection(tuple(send_to.rsplit(':', 1))) if send_to else open(path, 'a', buffering=1)
+    previous = None
+    try:
+        for flight, sched, actual in zip(df['flight'].astype(str), df['sched_time_local'], df['actual_time_local']):
+            if previous is not None and speed:
+                time.sleep(max((actual - previous).total_seconds(), 0) / speed)
+            previous = actual
+            line = json.dumps({"flight": flight, "date": f"{sched:%Y-%m-%d}", "actual_time": f"{actual:%Y-%m-%d %H:%M:%S}"}) + "\n"
+            if send_to:
+                sink.sendall(line.encode())
+            else:
+                sink.write(line)
+    finally:
+        sink.close()
+    print(f"✅ Replayed {len(df)} events to {send_to or path}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Live delay forecasting over a stream of movement events.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    follow = sub.add_parser('follow', help="Tail a JSONL file (or listen on --port) and print expected delays.")
+    follow.add_argument('path', nargs='?', default=EVENTS_PATH)
+    follow.add_argument('--port', type=int, default=None, help="Listen on this local TCP port instead of tailing a file.")
+    follow.add_argument('--watch', nargs='*', default=[], help="Flight IDs to print after every update.")
+    replay = sub.add_parser('replay', help="Write the recorded movements as live events.")
+    replay.add_argument('path', nargs='?', default=EVENTS_PATH)
+    replay.add_argument('--date', default=None, help="Only replay this date (YYYY-MM-DD).")
+    replay.add_argument('--speed', type=float, default=600.0, help="Replay speed-up (0 = as fast as possible).")
+    replay.add_argument('--send-to', default=None, help="host:port of a `follow --port` listener.")
+    args = parser.parse_args()
+
+    flights = load_flights(RAW_DATA_PATH)
+    if args.command == 'replay':
+        replay_events(flights, args.path, args.date, args.speed, args.send_to)
+        sys.exit(0)
+    if get_model() is None:
+        sys.exit("Model file not found. Please run train_model.py first.")
+    tracker = start_live_tracker(flights, f"tcp://127.0.0.1:{args.port}" if args.port else args.path)
+    try:
+        while True:
+            time.sleep(1)
+            stats = tracker.stats()
+            line = f"{stats['events']} events, {stats['observed_flights']} flights observed"
+            for flight in args.watch:
+                try:
+                    e = tracker.expected_delay(flight)
+                    line += f" | {e['flight']}: {e['expected_delay_min']:.1f} min ({e['status']})"
+                except KeyError as err:
+                    line += f" | {err.args[0]}"
+            print(line)
+    except KeyboardInterrupt:
+        pass
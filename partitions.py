@@ -0,0 +1,304 @@
+import os
+import re
+import time
+import atexit
+import argparse
+import threading
+import multiprocessing
+from collections import namedtuple
+import joblib
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+import analysis
+from aggregates import FlightAggregator
+from data_loader import RAW_DATA_PATH, iter_flight_chunks, load_flight_partitions
+from fast_model import export_inference_artifact, verify_fast_model, FastDelayModel
+from telemetry import span
+
+# data/airports/<AIRPORT>/flights/<ISO week>.csv, plus that airport's model files and summaries next to flights/
+PARTITIONS_DIR = os.path.join('data', 'airports')
+WEEK_FILE = re.compile(r"^(\d{4}-W\d{2})\.csv$")
+# Airport the agent engine serves from the partitioned dataset (unset: the single-airport files)
+AIRPORT_ENV = 'FLIGHT_AIRPORT'
+
+AirportFiles = namedtuple('AirportFiles', ['airport', 'root', 'flights_dir', 'model_path', 'fast_model_path',
+                                           'surface_path', 'aggregates_path'])
+
+# name -> (function(files, **kwargs) -> DataFrame, column to sort the merged result by or None,
+#          whether it switches the process's delay model)
+AirportTask = namedtuple('AirportTask', ['run', 'sort_by', 'uses_model'])
+
+# Flight tables loaded by this process, so repeated tasks for one airport reuse them
+_LOADED_FLIGHTS = {}
+# Held while analysis's model paths and OUTPUT_DIR point at another airport, so threads don't swap them under each other
+_MODEL_SWAP_LOCK = threading.RLock()
+# Long-lived worker pool for callers that fan out repeatedly (see shared_pool)
+_POOL = None
+_POOL_WORKERS = 0
+_POOL_LOCK = threading.Lock()
+
+
+def airport_files(airport: str, root=PARTITIONS_DIR) -> AirportFiles:
+    base = os.path.join(root, airport.upper())
+    return AirportFiles(airport.upper(), base, os.path.join(base, 'flights'),
+                        os.path.join(base, 'flight_delay_model.joblib'), os.path.join(base, 'flight_delay_model.xgb.json'),
+                        os.path.join(base, 'delay_surface.npy'), os.path.join(base, 'aggregates_state.json'))
+
+
+def flight_airport(df: pd.DataFrame) -> pd.Series:
+    """The airport each movement belongs to: the origin of a departure, the destination of an arrival."""
+    departure = (df['op_type'].astype(str) == 'DEPARTURE').to_numpy()
+    return pd.Series(np.where(departure, df['origin'].astype(str), df['destination'].astype(str)), index=df.index)
+
+
+def partition_flights(path=RAW_DATA_PATH, root=PARTITIONS_DIR, chunksize=100_000) -> dict:
+    """
+    Splits a flight CSV into one CSV per airport and ISO week (of the scheduled
+    time), streaming it in chunks. Partitions written by this call are
+    replaced, so re-running on the same file is safe. Returns {airport: [weeks]}.
+    """
+    written = set()
+    for chunk in iter_flight_chunks(path, chunksize):
+        iso = chunk['sched_time_local'].dt.isocalendar()
+        keys = pd.DataFrame({'airport': flight_airport(chunk).to_numpy(),
+                             'week': [f"{y}-W{w:02d}" for y, w in zip(iso['year'], iso['week'])]}, index=chunk.index)
+        for (airport, week), rows in chunk.groupby([keys['airport'], keys['week']], sort=False).groups.items():
+            files = airport_files(airport, root)
+            os.makedirs(files.flights_dir, exist_ok=True)
+            target = os.path.join(files.flights_dir, f"{week}.csv")
+            chunk.loc[rows].to_csv(target, mode='a' if target in written else 'w', header=target not in written,
+                                   index=False)
+            written.add(target)
+    partitions = list_partitions(root=root)
+    print(f"✅ Wrote {len(written)} partition(s) for {len(partitions)} airport(s) under '{root}'.")
+    return partitions
+
+
+def list_partitions(airports=None, weeks=None, root=PARTITIONS_DIR) -> dict:
+    """{airport: [weeks]} from the directory layout alone (no data is read), optionally filtered."""
+    if not os.path.isdir(root):
+        return {}
+    wanted = None if airports is None else {a.upper() for a in airports}
+    partitions = {}
+    for airport in sorted(os.listdir(root)):
+        if wanted is not None and airport not in wanted:
+            continue
+        flights_dir = airport_files(airport, root).flights_dir
+        found = sorted(m.group(1) for m in map(WEEK_FILE.match, os.listdir(flights_dir) if os.path.isdir(flights_dir) else [])
+                       if m and (weeks is None or m.group(1) in weeks))
+        if found:
+            partitions[airport] = found
+    return partitions
+
+
+def load_airport_flights(airport: str, weeks=None, root=PARTITIONS_DIR) -> pd.DataFrame:
+    """One airport's flight table from its week partitions only. Raises FileNotFoundError if it has none."""
+    files = airport_files(airport, root)
+    found = list_partitions([airport], weeks, root).get(files.airport, [])
+    return load_flight_partitions([os.path.join(files.flights_dir, f"{week}.csv") for week in found])
+
+
+def use_airport(airport: str, root=PARTITIONS_DIR) -> AirportFiles:
+    """Points this process's delay model and analysis outputs (optimization results and summary) at one airport's files."""
+    files = airport_files(airport, root)
+    with _MODEL_SWAP_LOCK:
+        analysis.use_model_files(files.model_path, files.fast_model_path, files.surface_path)
+        analysis.OUTPUT_DIR = files.root
+    return files
+
+
+def use_airport_model(airport: str, root=PARTITIONS_DIR):
+    """Makes this process predict with the airport's model; returns it, or None if it has not been built."""
+    files = use_airport(airport, root)
+    return analysis.get_model() if os.path.exists(files.model_path) else None
+
+
+def build_airport(airport: str, root=PARTITIONS_DIR):
+    """
+    Builds one airport's summaries (the same CSVs analysis.py writes for the
+    single-airport dataset, plus the running aggregates), its delay model,
+    fast inference artifact and delay surface, from its partitions.
+    """
+    # train_model pulls in sklearn; only builds need it
+    from train_model import fit_delay_model
+
+    files = airport_files(airport, root)
+    df = load_airport_flights(airport, root=root)
+    with span('airport_build', airport=files.airport):
+        aggregator = FlightAggregator(state_path=files.aggregates_path).update(df)
+        aggregator.write_summaries(files.root)
+        aggregator.save()
+
+        pipeline, mae = fit_delay_model(df.copy())
+        joblib.dump(pipeline, files.model_path)
+        verify_fast_model(FastDelayModel(export_inference_artifact(pipeline, files.fast_model_path)), pipeline)
+        use_airport_model(airport, root)
+        analysis.rebuild_delay_surface(df[['origin', 'destination']].drop_duplicates().itertuples(index=False, name=None))
+    print(f"✅ Built '{files.airport}': {len(df)} flights, model MAE {mae:.2f} minutes.")
+    return {'airport': files.airport, 'flights': len(df), 'mae': mae}
+
+
+# --- Per-airport query tasks (run in worker processes by fan_out) ---
+
+def _flights(files: AirportFiles, root) -> pd.DataFrame:
+    if files.airport not in _LOADED_FLIGHTS:
+        _LOADED_FLIGHTS[files.airport] = load_airport_flights(files.airport, root=root)
+    return _LOADED_FLIGHTS[files.airport]
+
+
+def _aggregator(files: AirportFiles, root) -> FlightAggregator:
+    # The saved aggregates answer hourly questions without loading any flights
+    try:
+        return FlightAggregator.load(files.aggregates_path)
+    except FileNotFoundError:
+        return FlightAggregator().update(_flights(files, root))
+
+
+def _summary_task(files, root):
+    aggregator = _aggregator(files, root)
+    busiest, best = aggregator.busiest_hours(), aggregator.best_hours(1)
+    return pd.DataFrame([{'flights': aggregator.n_flights,
+                          'avg_delay_min': float(aggregator.hour_delay_sum.sum() / max(aggregator.hour_delay_count.sum(), 1)),
+                          'busiest_hour': int(busiest['hour'].iloc[0]) if len(busiest) else None,
+                          'best_hour': int(best['hour'].iloc[0]) if len(best) else None}])
+
+
+def _busiest_task(files, root, n=5):
+    return _aggregator(files, root).busiest_hours().head(int(n))
+
+
+def _cascades_task(files, root, n=10):
+    return analysis.find_top_cascading_flights(_flights(files, root)).head(int(n))
+
+
+def _optimize_task(files, root, sample_size=100):
+    if use_airport_model(files.airport, root) is None:
+        return pd.DataFrame()
+    flights = _flights(files, root)
+    flights = flights.sample(n=min(int(sample_size), len(flights)), random_state=42)
+    results = analysis.optimize_flights(flights)
+    return pd.DataFrame([{'flights_optimized': len(results),
+                          'original_predicted_delay': float(results['original_predicted_delay'].sum()),
+                          'optimized_predicted_delay': float(results['optimized_predicted_delay'].sum()),
+                          'delay_reduction_mins': float(results['delay_reduction_mins'].sum())}])
+
+
+AIRPORT_TASKS = {
+    'summary': AirportTask(_summary_task, 'flights', False),
+    'busiest': AirportTask(_busiest_task, 'ops_count', False),
+    'cascades': AirportTask(_cascades_task, 'cascade_effect_min', False),
+    'optimize': AirportTask(_optimize_task, 'delay_reduction_mins', True),
+}
+
+
+def _run_airport_task(task: str, airport: str, root, kwargs):
+    """Worker entry point: one task for one airport; returns (airport, result_df, seconds)."""
+    start = time.perf_counter()
+    files = airport_files(airport, root)
+    # Tasks may switch models; put back the caller's when run in-process (e.g. from the agent engine)
+    with _MODEL_SWAP_LOCK:
+        previous = (analysis.MODEL_PATH, analysis.FAST_MODEL_PATH, analysis.DELAY_SURFACE_PATH), analysis.OUTPUT_DIR
+        try:
+            with span('airport_task', task=task):
+                result = AIRPORT_TASKS[task].run(files, root, **kwargs)
+        finally:
+            analysis.use_model_files(*previous[0])
+            analysis.OUTPUT_DIR = previous[1]
+    return files.airport, result, time.perf_counter() - start
+
+
+def _shutdown_pool():
+    global _POOL, _POOL_WORKERS
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.shutdown(cancel_futures=True)
+        _POOL, _POOL_WORKERS = None, 0
+
+
+def shared_pool(n_workers: int) -> ProcessPoolExecutor:
+    """
+    A spawn pool of at least `n_workers` processes that lives until exit. Its
+    workers keep the flight tables they have loaded, so repeated fan_out calls
+    (e.g. from the agent) don't reload partitions or restart processes.
+    """
+    global _POOL, _POOL_WORKERS
+    with _POOL_LOCK:
+        if _POOL is None or _POOL_WORKERS < n_workers:
+            if _POOL is None:
+                atexit.register(_shutdown_pool)
+            else:
+                _POOL.shutdown(wait=False)
+            # 'spawn' keeps OpenMP state in the XGBoost workers clean
+            _POOL = ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context('spawn'))
+            _POOL_WORKERS = n_workers
+        return _POOL
+
+
+def fan_out(task: str, airports=None, n_workers=1, root=PARTITIONS_DIR, pool=None, **kwargs) -> pd.DataFrame:
+    """
+    Runs an AIRPORT_TASKS task for each airport (default: every partitioned
+    airport) and merges the results into one table with an 'airport' column.
+    With n_workers > 1 the airports run in parallel processes, each loading
+    only its own airport's partitions and model. With a `pool` (e.g.
+    shared_pool), its workers are used instead. Only a single airport's task
+    that leaves the delay model alone runs in this process.
+    """
+    if task not in AIRPORT_TASKS:
+        raise KeyError(f"Unknown airport task '{task}'; choose from {', '.join(AIRPORT_TASKS)}.")
+    airports = list(list_partitions(airports, root=root))
+    if not airports:
+        return pd.DataFrame()
+    n_workers = min(n_workers, len(airports))
+    if pool is not None and (len(airports) > 1 or AIRPORT_TASKS[task].uses_model):
+        outputs = list(pool.map(_run_airport_task, [task] * len(airports), airports,
+                                [root] * len(airports), [kwargs] * len(airports)))
+    elif n_workers > 1:
+        # 'spawn' keeps OpenMP state in the XGBoost workers clean
+        with ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            outputs = list(pool.map(_run_airport_task, [task] * len(airports), airports,
+                                    [root] * len(airports), [kwargs] * len(airports)))
+    else:
+        outputs = [_run_airport_task(task, airport, root, kwargs) for airport in airports]
+
+    merged = pd.concat([result.assign(airport=airport) for airport, result, _ in outputs if not result.empty],
+                       ignore_index=True) if outputs else pd.DataFrame()
+    if merged.empty:
+        return merged
+    merged = merged[['airport'] + [c for c in merged.columns if c != 'airport']]
+    sort_by = AIRPORT_TASKS[task].sort_by
+    return merged.sort_values(sort_by, ascending=False, ignore_index=True) if sort_by in merged else merged
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Per-airport, per-week partitions with per-airport models and summaries.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    split = sub.add_parser('split', help="Partition a flight CSV by airport and ISO week.")
+    split.add_argument('path', nargs='?', default=RAW_DATA_PATH)
+    sub.add_parser('list', help="List the partitioned airports and weeks.")
+    build = sub.add_parser('build', help="Build summaries and a delay model for each airport.")
+    build.add_argument('airports', nargs='*', help="Airports to build (default: all).")
+    query = sub.add_parser('query', help="Run a task for each airport and merge the results.")
+    query.add_argument('task', choices=list(AIRPORT_TASKS))
+    query.add_argument('airports', nargs='*', help="Airports to query (default: all).")
+    for command in (build, query):
+        command.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Number of worker processes.")
+    parser.add_argument('--root', default=PARTITIONS_DIR, help="Partitioned dataset directory.")
+    args = parser.parse_args()
+
+    if args.command == 'split':
+        partition_flights(args.path, args.root)
+    elif args.command == 'list':
+        for airport, weeks in list_partitions(root=args.root).items():
+            print(f"{airport}: {', '.join(weeks)}")
+    elif args.command == 'build':
+        airports = list(list_partitions(args.airports or None, root=args.root))
+        if args.workers > 1 and len(airports) > 1:
+            with ProcessPoolExecutor(max_workers=min(args.workers, len(airports)),
+                                     mp_context=multiprocessing.get_context('spawn')) as pool:
+                list(pool.map(build_airport, airports, [args.root] * len(airports)))
+        else:
+            for airport in airports:
+                build_airport(airport, args.root)
+    else:
+        print(fan_out(args.task, args.airports or None, args.workers, args.root).to_string(index=False))
@@ -0,0 +1,228 @@
+import os
+import json
+import time
+import argparse
+import multiprocessing
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from analysis import OUTPUT_DIR, build_feature_frame, build_feature_frame_at, predict_delays, optimize_flights, get_model
+from aggregates import FlightAggregator
+from data_loader import RAW_DATA_PATH, load_flights
+from telemetry import span
+
+SUMMARY_PATH = os.path.join(OUTPUT_DIR, 'robustness_summary.json')
+
+# Per-worker schedules and residual pool, set by _init_sim_worker
+_SIM_SCHEDULES = None
+_SIM_Z = None
+
+
+def _rotation_layout(tail_codes: np.ndarray, sched_min: np.ndarray, min_turnaround_mins: float):
+    """
+    (tail, position-in-rotation) coordinates of every flight when each tail's
+    flights are ordered by `sched_min`, plus the slack after each cell
+    (scheduled gap - min_turnaround_mins, at least 0; inf after a tail's last flight).
+    """
+    order = np.lexsort((sched_min, tail_codes))
+    sorted_tails = tail_codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_tails[1:] != sorted_tails[:-1]])
+    positions = np.empty(len(order), dtype=np.int64)
+    positions[order] = np.arange(len(order)) - np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+    shape = (tail_codes.max() + 1 if len(order) else 0, positions.max() + 1 if len(order) else 0)
+
+    times = np.full(shape, np.nan)
+    times[tail_codes, positions] = sched_min
+    slack = np.full(shape, np.inf)
+    gap = np.diff(times, axis=1)
+    slack[:, :-1] = np.where(np.isnan(gap), np.inf, np.clip(gap - min_turnaround_mins, 0, None))
+    return tail_codes, positions, shape, slack
+
+
+def _schedule_grids(mean_delay, delay_std, tail_codes, sched_min, min_turnaround_mins):
+    """Everything a worker needs to simulate one schedule: per-cell mean, std, slack and flight number."""
+    tails, positions, shape, slack = _rotation_layout(tail_codes, sched_min, min_turnaround_mins)
+    mean, std = np.zeros(shape), np.zeros(shape)
+    mean[tails, positions], std[tails, positions] = mean_delay, delay_std
+    flight = np.zeros(shape, dtype=np.int64)
+    flight[tails, positions] = np.arange(len(tails))
+    return {'mean': mean, 'std': std, 'slack': slack, 'flight': flight, 'n_flights': len(tails)}
+
+
+def _init_sim_worker(schedules, z_pool):
+    global _SIM_SCHEDULES, _SIM_Z
+    _SIM_SCHEDULES, _SIM_Z = schedules, z_pool
+
+
+def _simulate_chunk(n_scenarios: int, seed):
+    """
+    Simulates n_scenarios days-of-operation for every schedule, as (scenario,
+    tail, position) arrays. Each flight draws one standardized residual per
+    scenario, shared by all schedules (so their differences are paired), and
+    scales it by the delay spread of the hour it is scheduled in:
+
+        own_i       = max(mean_i + z_i * std_i, 0)
+        delay_i     = max(own_i, delay_i-1 - slack_i-1)     (along the rotation)
+
+    Returns one (total delay, knock-on minutes, flights hit by knock-on) tuple per schedule, each an array over scenarios.
+    """
+    rng = np.random.default_rng(seed)
+    draws = _SIM_Z[rng.integers(len(_SIM_Z), size=(n_scenarios, _SIM_SCHEDULES[0]['n_flights']))]
+    outputs = []
+    for grids in _SIM_SCHEDULES:
+        own = np.maximum(grids['mean'] + draws[:, grids['flight']] * grids['std'], 0)
+        delay = own.copy()
+        for pos in range(1, own.shape[2]):
+            np.maximum(delay[:, :, pos], delay[:, :, pos - 1] - grids['slack'][:, pos - 1], out=delay[:, :, pos])
+        knock_on = delay - own
+        outputs.append((delay.sum(axis=(1, 2)), knock_on.sum(axis=(1, 2)), (knock_on > 0).sum(axis=(1, 2))))
+    return outputs
+
+
+def _optimized_times(flights: pd.DataFrame, results_df: pd.DataFrame) -> pd.Series:
+    """Scheduled times with every flight in `results_df` (optimize_flights output) moved to its optimized_time."""
+    moves = results_df.drop_duplicates(['flight_id', 'original_time']).set_index(['flight_id', 'original_time'])['optimized_time']
+    keys = pd.MultiIndex.from_arrays([flights['flight'].astype(str).to_numpy(), flights['sched_time_local'].to_numpy()])
+    moved = moves.reindex(keys).to_numpy()
+    return pd.Series(np.where(pd.isna(moved), flights['sched_time_local'].to_numpy(), moved).astype('datetime64[ns]'),
+                     index=flights.index)
+
+
+def _results_coverage(flights: pd.DataFrame, results_df: pd.DataFrame):
+    """(results whose flight_id and original_time are a flight of `flights`, flights that have a result)."""
+    results = pd.MultiIndex.from_arrays([results_df['flight_id'].astype(str).to_numpy(),
+                                         pd.to_datetime(results_df['original_time']).to_numpy()])
+    keys = pd.MultiIndex.from_arrays([flights['flight'].astype(str).to_numpy(), flights['sched_time_local'].to_numpy()])
+    return int(results.isin(keys).sum()), int(keys.isin(results).sum())
+
+
+def _load_results(results_path):
+    """The optimizer's recommendations from `results_path`, or None if missing or written by an older version."""
+    if not os.path.exists(results_path):
+        return None
+    results = pd.read_csv(results_path)
+    if not {'original_time', 'optimized_time'} <= set(results.columns):
+        return None
+    for column in ('original_time', 'optimized_time'):
+        results[column] = pd.to_datetime(results[column])
+    return results
+
+
+def _percentiles(values) -> str:
+    p50, p90 = np.percentile(values, [50, 90])
+    return f"{p50:,.0f} / {p90:,.0f} mins"
+
+
+def simulate_robustness(full_flight_df, results_df=None, n_scenarios=2000, n_workers=1, chunk_size=250,
+                        min_turnaround_mins=30, seed=42, delay_std_df=None):
+    """
+    Monte Carlo comparison of the original schedule with the optimized one
+    (`results_df` from optimize_flights; default: data/optimization_results.csv,
+    or every flight optimized now if that file is missing or was written for
+    other flights). Raises ValueError if a given `results_df` has flights that
+    are not in `full_flight_df`.
+
+    Each flight's mean delay is the model's prediction at its time in each
+    schedule. The noise comes from the model's residuals on the recorded
+    delays. Each residual is standardized by the delay spread of its scheduled
+    hour (`delay_std_df`, default FlightAggregator.delay_std_by_hour). It is
+    then rescaled to the hour the flight ends up in, and propagated along every
+    aircraft's rotation. Scenarios are simulated in chunks of `chunk_size`
+    across `n_workers` processes. Returns the P50/P90 summary, also saved to
+    'data/robustness_summary.json'.
+    """
+    if get_model() is None:
+        return None
+    start = time.perf_counter()
+    df = full_flight_df
+    from_disk = results_df is None
+    if from_disk:
+        results_df = _load_results(os.path.join(OUTPUT_DIR, 'optimization_results.csv'))
+    if results_df is not None:
+        matched, _ = _results_coverage(df, results_df)
+        if matched < len(results_df):
+            problem = f"{len(results_df) - matched} of {len(results_df)} optimizer results are not flights of this table"
+            if not from_disk:
+                raise ValueError(problem + ".")
+            print(f"⚠️ {problem}; re-optimizing the table instead.")
+            results_df = None
+    if results_df is None:
+        with span('robustness', stage='optimize'):
+            results_df = optimize_flights(df)
+    if delay_std_df is None:
+        delay_std_df = FlightAggregator().update(df).delay_std_by_hour()
+
+    hour_std = np.full(24, np.sqrt(np.nanmean(delay_std_df['delay_std'].to_numpy() ** 2)))
+    hour_std[delay_std_df['hour'].to_numpy(dtype=int)] = delay_std_df['delay_std'].to_numpy()
+    hour_std = np.where(hour_std > 0, hour_std, 1.0)
+
+    _, n_covered = _results_coverage(df, results_df)
+    if n_covered < len(df):
+        print(f"⚠️ Optimizer results cover {n_covered} of {len(df)} flights; the rest keep their scheduled times.")
+
+    tail_codes = pd.factorize(df['tail_id'], sort=True)[0]
+    times = {'original': df['sched_time_local'], 'optimized': _optimized_times(df, results_df)}
+    schedules = []
+    with span('robustness', stage='model'):
+        original_mean = predict_delays(build_feature_frame(df, times['original'].dt.hour))
+        recorded = df['delay_min'].to_numpy(dtype=float)
+        z_pool = (recorded - original_mean) / hour_std[times['original'].dt.hour.to_numpy()]
+        for name, sched in times.items():
+            mean = original_mean if name == 'original' else predict_delays(build_feature_frame_at(df, sched))
+            sched_min = sched.to_numpy().astype('datetime64[m]').astype(np.int64).astype(float)
+            schedules.append(_schedule_grids(mean, hour_std[sched.dt.hour.to_numpy()], tail_codes, sched_min,
+                                             min_turnaround_mins))
+
+    chunks = [min(chunk_size, n_scenarios - s) for s in range(0, n_scenarios, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    with span('robustness', stage='simulate'):
+        if n_workers > 1 and len(chunks) > 1:
+            # 'spawn' keeps OpenMP state in the workers clean, as in the optimizer
+            with ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=_init_sim_worker, initargs=(schedules, z_pool)) as pool:
+                outputs = list(pool.map(_simulate_chunk, chunks, seeds))
+        else:
+            _init_sim_worker(schedules, z_pool)
+            outputs = [_simulate_chunk(n, s) for n, s in zip(chunks, seeds)]
+    # stats[schedule][metric] -> one value per scenario
+    stats = [[np.concatenate([chunk[i][m] for chunk in outputs]) for m in range(3)] for i in range(len(schedules))]
+    (total_before, knock_before, hit_before), (total_after, knock_after, hit_after) = stats
+    saved = total_before - total_after
+    elapsed = time.perf_counter() - start
+
+    summary = {
+        "Scenarios": f"{n_scenarios}",
+        "Flights Simulated": f"{len(df)}",
+        "Flights With Optimizer Results": f"{n_covered}",
+        "Flights Moved": f"{int((times['optimized'] != times['original']).sum())}",
+        "Total Delay BEFORE (P50 / P90)": _percentiles(total_before),
+        "Total Delay AFTER (P50 / P90)": _percentiles(total_after),
+        "Total Delay SAVED (P50 / P90)": _percentiles(saved),
+        "Knock-on Delay BEFORE (P50 / P90)": _percentiles(knock_before),
+        "Knock-on Delay AFTER (P50 / P90)": _percentiles(knock_after),
+        "Flights Hit by Knock-on BEFORE (P50 / P90)": "{:,.0f} / {:,.0f}".format(*np.percentile(hit_before, [50, 90])),
+        "Flights Hit by Knock-on AFTER (P50 / P90)": "{:,.0f} / {:,.0f}".format(*np.percentile(hit_after, [50, 90])),
+        "Chance the Optimized Schedule Is Worse": f"{(saved < 0).mean() * 100:.1f}%",
+    }
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    with open(SUMMARY_PATH, 'w') as f:
+        json.dump(summary, f, indent=4)
+    print(f"✅ Simulated {n_scenarios} scenarios in {elapsed:.2f}s; summary saved to '{SUMMARY_PATH}'")
+
+    print("\n--- ROBUSTNESS (P50 / P90 over scenarios) ---")
+    for key, val in summary.items(): print(f"{key}: {val}")
+    print("---------------------------------------------")
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Monte Carlo robustness of the original vs the optimized schedule.")
+    parser.add_argument('--data', default=RAW_DATA_PATH, help="Raw flight CSV (a week or a multi-week file).")
+    parser.add_argument('--scenarios', type=int, default=2000, help="Number of simulated scenarios.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Number of worker processes.")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if get_model() is None:
+        raise SystemExit("Model file not found. Please run train_model.py first.")
+    simulate_robustness(load_flights(args.data), n_scenarios=args.scenarios, n_workers=args.workers, seed=args.seed)
@@ -0,0 +1,268 @@
+import re
+import time
+from collections import Counter, deque
+import numpy as np
+from time_index import MAX_LOOKAHEAD_MINS
+
+# Airline code (two letters, or a letter and a digit like 6E/G8) followed by the flight number
+FLIGHT = r"(?P<flight>(?:[A-Z]{2}|[A-Z]\d|\d[A-Z])\d{1,4})"
+DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+
+FLAGS = re.IGNORECASE | re.DOTALL
+PREDICT = re.compile(r"\b(?:predict\w*|what[- ]if|move|moving|reschedul\w*|shift\w*|delay\w*)\b.*?\b" + FLIGHT
+                     + r"\b.*?\b(?:to|at)\s+(?P<hour>\d{1,2})(?::00)?\s*(?P<ampm>am|pm)?\b", FLAGS)
+OPTIMIZE_FLIGHT = re.compile(r"\b(?:optimi[sz]\w*|best time|better time|improve)\b.*?\b" + FLIGHT + r"\b", FLAGS)
+OPTIMIZE_DAY = re.compile(r"\b(?:optimi[sz]\w*|re-?plan|plan|assign)\b.*?\b(?:day|schedule|flights|slots?|capacity)\b", FLAGS)
+BUSIEST = re.compile(r"\bbusiest\b.*\bhours?\b|\bhours?\b.*\bbusiest\b", FLAGS)
+BEST = re.compile(r"\b(?:best|quietest|least delayed|lowest delay)\b.*\bhours?\b", FLAGS)
+CASCADE = re.compile(r"\bcascad\w*|\bdownstream\b|\bknock-on\b|\bripple\b", FLAGS)
+# Only an imperative ("run/re-run/launch ... optimization") starts a run; "start by showing the summary" must not
+RUN_OPTIMIZATION = re.compile(r"^\s*(?:please\s+)?(?:run|re-?run|launch)\b.*\boptimi[sz]\w*", FLAGS)
+RUNWAY_LOAD = re.compile(r"\b(?:runway|movements?|traffic|arrivals|departures)\b", FLAGS)
+NEXT_MINUTES = re.compile(r"\bnext\s+(\d+)\s*(?:min\w*|m)\b|\b(\d+)\s*min\w*\b", FLAGS)
+CLOCK = r"\d{1,2}:\d{2}"
+TIME_WINDOW = re.compile(rf"\b(?:between|from)\s+(?P<start>{CLOCK})\s*(?:and|to|until|-)\s*(?P<end>{CLOCK})\b|"
+                         rf"\b(?P<start2>{CLOCK})\s*-\s*(?P<end2>{CLOCK})\b", FLAGS)
+CURRENT_DELAY = re.compile(r"\b(?:current(?:ly)?|expected|live|latest|right now|status)\b.*?\bdelay\w*\b.*?\b" + FLIGHT + r"\b|\b"
+                           + FLIGHT.replace('flight>', 'flight2>') + r"\b.*?\b(?:current(?:ly)?|expected|live|latest|right now)\b.*?\bdelay", FLAGS)
+AIRPORTS = re.compile(r"\b(?:airports|each airport|every airport|per airport|by airport)\b", FLAGS)
+SUMMARY = re.compile(r"\bsummary\b.*\boptimi[sz]\w*|\b(?:optimi[sz]\w*|system[- ]wide)\b.*\b(?:summary|savings)\b", FLAGS)
+
+# Questions about how or why, which the canned tables don't answer
+EXPLAIN = re.compile(r"\b(?:explain\w*|why|what does|definition|methodology)\b|\bhow\s+(?:is|are|does|do|was|were)\b|"
+                     r"\bhow\b.*\b(?:computed|calculated|derived|works?)\b", FLAGS)
+# Qualifiers the hour-level tools can't filter by (they always cover every day and airline)
+HOUR_QUALIFIERS = re.compile(r"\d{4}-\d{2}-\d{2}|\b(?:airlines?|carriers?|today|tomorrow|yesterday|weekends?|weekdays?|"
+                             + "|".join(WEEKDAYS) + r")s?\b", FLAGS)
+
+CASCADE_FILTERS = {
+    'airline': re.compile(r"\bairline\s*[=:]?\s*(\w{2})\b", re.IGNORECASE),
+    'hour': re.compile(r"\bhour\s*[=:]?\s*(\d{1,2})\b|\bat\s+(\d{1,2})(?::00)?\b", re.IGNORECASE),
+    'top': re.compile(r"\btop\s*[=:]?\s*(\d+)\b", re.IGNORECASE),
+}
+
+
+def _without_dates(query: str) -> str:
+    return DATE.sub(" ", query)
+
+def _first_number(query: str):
+    match = re.search(r"\b(\d+)\b", _without_dates(query))
+    return match.group(1) if match else None
+
+def _with_date(tool_input: str, query: str) -> str:
+    date = DATE.search(query)
+    return f"{tool_input}, {date.group(0)}" if date else tool_input
+
+def _to_24h(hour: str, ampm) -> int:
+    hour = int(hour)
+    if ampm:
+        hour = hour % 12 + (12 if ampm.lower() == 'pm' else 0)
+    return hour
+
+def _predict_input(query: str):
+    match = PREDICT.search(query)
+    if not match:
+        return None
+    hour = _to_24h(match.group('hour'), match.group('ampm'))
+    if not 0 <= hour <= 23:
+        return None
+    return _with_date(f"{match.group('flight').upper()}, {hour}", query)
+
+def _optimize_flight_input(query: str):
+    match = OPTIMIZE_FLIGHT.search(_without_dates(query))
+    return _with_date(match.group('flight').upper(), query) if match else None
+
+def _optimize_day_input(query: str):
+    date = DATE.search(query)
+    return date.group(0) if date and OPTIMIZE_DAY.search(query) else None
+
+def _count_input(pattern):
+    def parse(query: str):
+        # "busiest hours on 2025-08-12 for 6E" would get the all-days table; leave it to the LLM
+        if not pattern.search(query) or HOUR_QUALIFIERS.search(query) or EXPLAIN.search(query):
+            return None
+        return _first_number(query) or "5"
+    return parse
+
+def _cascade_filters(query: str) -> str:
+    filters = []
+    for key, pattern in CASCADE_FILTERS.items():
+        match = pattern.search(_without_dates(query))
+        if match:
+            filters.append(f"{key}={next(group for group in match.groups() if group)}")
+    date = DATE.search(query)
+    day = date.group(0) if date else next((d for d in WEEKDAYS if re.search(rf"\b{d}\b", query, re.IGNORECASE)), None)
+    if day:
+        filters.append(f"day={day}")
+    return ", ".join(filters)
+
+def _rank_cascade_input(query: str):
+    if not CASCADE.search(query):
+        return None
+    filters = _cascade_filters(query)
+    # Plain "which flights cause cascades" questions keep the original top-10 table
+    if filters or re.search(r"\brank\w*|\bdownstream\b|\bmulti-?hop\b", query, re.IGNORECASE):
+        return filters
+    return None
+
+def _find_cascade_input(query: str):
+    return "" if CASCADE.search(query) else None
+
+def _run_optimization_input(query: str):
+    if not RUN_OPTIMIZATION.search(query):
+        return None
+    if re.search(r"\b(?:all|every|full)\b", query, re.IGNORECASE):
+        return "all"
+    return _first_number(query) or "100"
+
+def _runway_load_input(query: str):
+    minutes = NEXT_MINUTES.search(query)
+    if not (minutes and RUNWAY_LOAD.search(query)) or TIME_WINDOW.search(query):
+        return None
+    tool_input = str(min(int(next(group for group in minutes.groups() if group)), MAX_LOOKAHEAD_MINS))
+    start = re.search(rf"\b(?:at|from|starting)\s+({CLOCK})\b", query, re.IGNORECASE)
+    if start:
+        date = DATE.search(query)
+        tool_input += f", {date.group(0) + ' ' if date else ''}{start.group(1)}"
+    return tool_input
+
+def _time_window_input(query: str):
+    match = TIME_WINDOW.search(query)
+    if not match:
+        return None
+    start, end = match.group('start') or match.group('start2'), match.group('end') or match.group('end2')
+    date = DATE.search(query)
+    day = date.group(0) if date else next((d for d in WEEKDAYS if re.search(rf"\b{d}\b", query, re.IGNORECASE)), None)
+    return f"{day + ', ' if day else ''}{start}-{end}"
+
+def _current_delay_input(query: str):
+    match = CURRENT_DELAY.search(_without_dates(query))
+    return _with_date((match.group('flight') or match.group('flight2')).upper(), query) if match else None
+
+def _airports_input(query: str):
+    if not AIRPORTS.search(query):
+        return None
+    task = ("busiest" if BUSIEST.search(query) else "cascades" if CASCADE.search(query)
+            else "optimize" if re.search(r"\boptimi[sz]", query, re.IGNORECASE) else "summary")
+    codes = re.findall(r"\b[A-Z]{3}\b", query)
+    count = _first_number(query)
+    return ", ".join([task] + ([" ".join(codes)] if codes else []) + ([count] if count else []))
+
+def _summary_input(query: str):
+    return "" if SUMMARY.search(query) and not EXPLAIN.search(query) else None
+
+
+# Checked in order; the first rule that yields a tool input wins
+RULES = [
+    ("Predict Schedule Impact", _predict_input),
+    ("Optimize Single Flight Schedule", _optimize_flight_input),
+    ("Optimize Day Schedule With Capacity", _optimize_day_input),
+    # After the optimize rules: "optimize 6E123 for the lowest expected delay" is not a status query
+    ("Get Current Expected Delay", _current_delay_input),
+    # After the flight-specific rules, so a question about one flight that mentions "airports" still gets its tool
+    ("Compare Airports", _airports_input),
+    ("Get System-Wide Optimization Summary", _summary_input),
+    ("Run System-Wide Optimization", _run_optimization_input),
+    ("Get Runway Load", _runway_load_input),
+    ("Get Flights In Time Window", _time_window_input),
+    ("Get Busiest Hours", _count_input(BUSIEST)),
+    ("Get Best Hours", _count_input(BEST)),
+    ("Rank Cascade Sources", _rank_cascade_input),
+    ("Find Cascade Flights", _find_cascade_input),
+]
+
+
+class QueryRouter:
+    """
+    Sends structured questions ("Optimize flight SQ279", "busiest 3 hours",
+    "what if SQ279 moves to 14") straight to the matching agent tool, and only
+    open-ended questions to the LLM agent. invoke() returns the same dict
+    shape as the agent, plus the route taken and its latency.
+    """
+
+    def __init__(self, agent, rules=RULES, window=10_000):
+        self.agent = agent
+        self.tools = {tool.name: tool for tool in agent.tools}
+        self.rules = [(name, parse) for name, parse in rules if name in self.tools]
+        # Percentiles cover the last `window` queries per path, so a long-running service keeps bounded memory
+        self.latencies = {'fast_path': deque(maxlen=window), 'llm': deque(maxlen=window)}
+        self.first_output = deque(maxlen=window)
+        self.counts = Counter()
+        self.routes = Counter()
+
+    def match(self, query: str):
+        """Returns (tool name, tool input) for a structured query, or None."""
+        for name, parse in self.rules:
+            tool_input = parse(query)
+            if tool_input is not None:
+                return name, tool_input
+        return None
+
+    def invoke(self, query: str) -> dict:
+        start = time.perf_counter()
+        matched = self.match(query)
+        if matched is not None:
+            name, tool_input = matched
+            try:
+                output = self.tools[name].func(tool_input)
+                return self.record({"input": query, "output": output}, 'fast_path', name, start)
+            except Exception as e:
+                # A rule matched but its input didn't make sense to the tool; let the LLM interpret the question
+                print(f"⚠️ Fast path '{name}' failed for {query!r} ({e}); falling back to the LLM agent.")
+        output = self.agent.invoke({"input": query})['output']
+        return self.record({"input": query, "output": output}, 'llm', 'LLM agent', start)
+
+    def stream(self, query: str):
+        """
+        Like invoke(), but yields events while the answer is being produced:
+        {'type': 'partial', 'text'} replaces what is shown so far (progress of a
+        streaming tool), {'type': 'token', 'text'} appends LLM output, and the last
+        event is the invoke() response with 'type': 'final'.
+        """
+        start = time.perf_counter()
+        first_output = None
+        matched = self.match(query)
+        if matched is not None:
+            name, tool_input = matched
+            tool = self.tools[name]
+            try:
+                if getattr(tool, 'stream', None) is None:
+                    output = tool.func(tool_input)
+                else:
+                    for output in tool.stream(tool_input):
+                        first_output = first_output or time.perf_counter() - start
+                        yield {"type": "partial", "text": output}
+                response = self.record({"input": query, "output": output}, 'fast_path', name, start, first_output)
+                yield {**response, "type": "final"}
+                return
+            except Exception as e:
+                print(f"⚠️ Fast path '{name}' failed for {query!r} ({e}); falling back to the LLM agent.")
+        output = None
+        for kind, text in self.agent.stream(query):
+            first_output = first_output or time.perf_counter() - start
+            if kind == 'token':
+                yield {"type": "token", "text": text}
+            else:
+                output = text
+        response = self.record({"input": query, "output": output}, 'llm', 'LLM agent', start, first_output)
+        yield {**response, "type": "final"}
+
+    def record(self, response: dict, path: str, route: str, start: float, first_output=None) -> dict:
+        latency = time.perf_counter() - start
+        self.latencies[path].append(latency)
+        self.first_output.append(latency if first_output is None else first_output)
+        self.counts[path] += 1
+        self.routes[route] += 1
+        return {**response, "route": route, "latency_ms": latency * 1000}
+
+    def stats(self) -> dict:
+        """Share of queries answered without the LLM; latency and time-to-first-output percentiles (ms, recent queries)."""
+        n_fast, n_llm = self.counts['fast_path'], self.counts['llm']
+        stats = {"queries": n_fast + n_llm, "fast_path_share": n_fast / max(n_fast + n_llm, 1)}
+        for path, latencies in {**self.latencies, 'first_output': self.first_output}.items():
+            if latencies:
+                stats[f"{path}_p50_ms"] = float(np.percentile(latencies, 50)) * 1000
+                stats[f"{path}_p95_ms"] = float(np.percentile(latencies, 95)) * 1000
+        stats["routes"] = dict(self.routes)
+        return stats
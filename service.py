@@ -0,0 +1,266 @@
+import json
+import time
+import asyncio
+import argparse
+import multiprocessing
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from agent_engine import load_agent_and_precomputed_data
+from router import QueryRouter
+from telemetry import TELEMETRY, span
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# Tools that keep a CPU busy in the model/optimizer; they run in worker processes. Run System-Wide
+# Optimization stays in-process: it streams progress and updates this process's optimization summary.
+CPU_BOUND_TOOLS = ("Optimize Single Flight Schedule", "Optimize Day Schedule With Capacity")
+
+# Per-worker tool functions, set by _init_worker
+_WORKER_TOOLS = None
+
+
+def _init_worker(use_snapshot):
+    global _WORKER_TOOLS
+    agent, _ = load_agent_and_precomputed_data(use_snapshot=use_snapshot)
+    _WORKER_TOOLS = {tool.name: tool.func for tool in agent.tools}
+
+
+def _run_tool_in_worker(name: str, tool_input: str):
+    return _WORKER_TOOLS[name](tool_input)
+
+
+class AssistantService:
+    """
+    The agent engine behind an asyncio front end. Structured queries go
+    through the QueryRouter. CPU-bound tools run on a process pool; the
+    other tools and LLM calls run on a thread pool, so one slow call doesn't
+    block the others. Identical requests that arrive while one is already
+    running wait for that result instead of computing it again.
+    """
+
+    def __init__(self, n_workers=2, llm_threads=8, use_snapshot=True):
+        self.agent, self.precomputed_answers = load_agent_and_precomputed_data(use_snapshot=use_snapshot)
+        self.router = QueryRouter(self.agent)
+        self.process_pool = None
+        if n_workers > 0:
+            self.process_pool = ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context('spawn'),
+                                                    initializer=_init_worker, initargs=(use_snapshot,))
+        self.thread_pool = ThreadPoolExecutor(max_workers=llm_threads)
+        self._in_flight = {}
+        self.coalesced = 0
+
+    async def _run_once(self, key, make_call):
+        """Runs make_call() unless an identical call is in flight; returns (result, coalesced)."""
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future), True
+        future = asyncio.ensure_future(make_call())
+        self._in_flight[key] = future
+        future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # shield: a client that disconnects must not cancel the call for everyone else waiting on it
+        return await asyncio.shield(future), False
+
+    async def call_tool(self, name: str, tool_input: str):
+        """Runs one tool (raises KeyError for an unknown tool name)."""
+        func = self.router.tools[name].func
+        loop = asyncio.get_running_loop()
+        if self.process_pool is not None and name in CPU_BOUND_TOOLS:
+            return await loop.run_in_executor(self.process_pool, _run_tool_in_worker, name, tool_input)
+        return await loop.run_in_executor(self.thread_pool, func, tool_input)
+
+    def _run_tool_once(self, name: str, tool_input: str):
+        # /tool and /query share in-flight calls, so both key (and call) them on the same normalized input
+        tool_input = tool_input.strip()
+        return self._run_once(('tool', name, tool_input), lambda: self.call_tool(name, tool_input))
+
+    async def tool(self, name: str, tool_input: str) -> dict:
+        start = time.perf_counter()
+        output, coalesced = await self._run_tool_once(name, tool_input)
+        return {"tool": name, "input": tool_input, "output": output, "coalesced": coalesced,
+                "latency_ms": (time.perf_counter() - start) * 1000}
+
+    async def query(self, text: str) -> dict:
+        start = time.perf_counter()
+        matched = self.router.match(text)
+        if matched is not None:
+            name, tool_input = matched
+            try:
+                output, coalesced = await self._run_tool_once(name, tool_input)
+                response = self.router.record({"input": text, "output": output}, 'fast_path', name, start)
+                return {**response, "coalesced": coalesced}
+            except Exception as e:
+                print(f"⚠️ Fast path '{name}' failed for {text!r} ({e}); falling back to the LLM agent.")
+        loop = asyncio.get_running_loop()
+        output, coalesced = await self._run_once(
+            ('llm', " ".join(text.lower().split())),
+            lambda: loop.run_in_executor(self.thread_pool, lambda: self.agent.invoke({"input": text})['output']))
+        response = self.router.record({"input": text, "output": output}, 'llm', 'LLM agent', start)
+        return {**response, "coalesced": coalesced}
+
+    async def stream(self, text: str):
+        """Async iterator over QueryRouter.stream events (streamed requests are not coalesced)."""
+        matched = self.router.match(text)
+        if self.process_pool is not None and matched is not None and matched[0] in CPU_BOUND_TOOLS:
+            # These tools don't stream, so the worker's answer is the one final event
+            start = time.perf_counter()
+            name, tool_input = matched
+            try:
+                output = await self.call_tool(name, tool_input)
+                response = self.router.record({"input": text, "output": output}, 'fast_path', name, start)
+                yield {**response, "type": "final"}
+            except Exception as e:
+                yield {"type": "final", "input": text, "output": f"Error: {e}", "route": "error", "latency_ms": 0.0}
+            return
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+
+        def produce():
+            try:
+                for event in self.router.stream(text):
+                    loop.call_soon_threadsafe(events.put_nowait, event)
+            except Exception as e:
+                loop.call_soon_threadsafe(events.put_nowait, {"type": "final", "input": text, "output": f"Error: {e}",
+                                                              "route": "error", "latency_ms": 0.0})
+            loop.call_soon_threadsafe(events.put_nowait, None)
+
+        loop.run_in_executor(self.thread_pool, produce)
+        while (event := await events.get()) is not None:
+            yield event
+
+    async def answers(self) -> dict:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.thread_pool,
+                                          lambda: {key: self.precomputed_answers[key] for key in self.precomputed_answers})
+
+    def stats(self) -> dict:
+        return {**self.router.stats(), "coalesced": self.coalesced, "in_flight": len(self._in_flight)}
+
+    def close(self):
+        if self.process_pool is not None:
+            self.process_pool.shutdown(cancel_futures=True)
+        self.thread_pool.shutdown(wait=False, cancel_futures=True)
+
+
+def create_app(service: AssistantService):
+    """
+    JSON API:
+      POST /query   {"query": "..."}               -> routed answer (tool or LLM)
+      POST /query/stream {"query": "..."}          -> the same, as newline-delimited JSON events
+      POST /tool    {"tool": "...", "input": "..."} -> one tool call
+      GET  /precomputed, /stats, /health
+      GET  /metrics (Prometheus text), /telemetry (the same metrics as JSON)
+    """
+    from aiohttp import web
+
+    async def read_json(request):
+        try:
+            body = await request.json()
+        except json.JSONDecodeError:
+            raise web.HTTPBadRequest(text="Request body must be JSON.")
+        if not isinstance(body, dict):
+            raise web.HTTPBadRequest(text="Request body must be a JSON object.")
+        return body
+
+    async def handle_query(request):
+        body = await read_json(request)
+        if not isinstance(body.get('query'), str):
+            raise web.HTTPBadRequest(text="Expected a JSON body like {\"query\": \"Optimize flight SQ279\"}.")
+        with span('http_request', endpoint='/query'):
+            return web.json_response(await service.query(body['query']))
+
+    async def handle_stream(request):
+        body = await read_json(request)
+        if not isinstance(body.get('query'), str):
+            raise web.HTTPBadRequest(text="Expected a JSON body like {\"query\": \"Optimize flight SQ279\"}.")
+        response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+        await response.prepare(request)
+        async for event in service.stream(body['query']):
+            await response.write((json.dumps(event) + "\n").encode())
+        await response.write_eof()
+        return response
+
+    async def handle_tool(request):
+        body = await read_json(request)
+        if body.get('tool') not in service.router.tools:
+            raise web.HTTPNotFound(text=f"Unknown tool {body.get('tool')!r}. Tools: {list(service.router.tools)}")
+        with span('http_request', endpoint='/tool'):
+            return web.json_response(await service.tool(body['tool'], str(body.get('input', ''))))
+
+    async def handle_precomputed(request):
+        return web.json_response(await service.answers())
+
+    async def handle_stats(request):
+        return web.json_response(service.stats())
+
+    async def handle_metrics(request):
+        return web.Response(text=TELEMETRY.to_prometheus(), content_type='text/plain')
+
+    async def handle_telemetry(request):
+        return web.json_response(TELEMETRY.snapshot())
+
+    async def handle_health(request):
+        return web.json_response({"status": "ok"})
+
+    async def on_cleanup(app):
+        service.close()
+
+    app = web.Application()
+    app.add_routes([web.post('/query', handle_query), web.post('/query/stream', handle_stream),
+                    web.post('/tool', handle_tool),
+                    web.get('/precomputed', handle_precomputed), web.get('/stats', handle_stats),
+                    web.get('/metrics', handle_metrics), web.get('/telemetry', handle_telemetry),
+                    web.get('/health', handle_health)])
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+class ServiceClient:
+    """Blocking client for a running service, with the same invoke()/stream()/stats() interface as QueryRouter."""
+
+    def __init__(self, url=f"http://{DEFAULT_HOST}:{DEFAULT_PORT}", timeout=600):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def _request(self, path: str, payload=None):
+        data = None if payload is None else json.dumps(payload).encode()
+        request = urllib.request.Request(self.url + path, data=data, headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+    def invoke(self, query: str) -> dict:
+        return self._request('/query', {'query': query})
+
+    def stream(self, query: str):
+        request = urllib.request.Request(self.url + '/query/stream', data=json.dumps({'query': query}).encode(),
+                                         headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            for line in response:
+                if line.strip():
+                    yield json.loads(line)
+
+    def stats(self) -> dict:
+        return self._request('/stats')
+
+    def telemetry(self) -> dict:
+        return self._request('/telemetry')
+
+    def precomputed_answers(self) -> dict:
+        return self._request('/precomputed')
+
+
+if __name__ == '__main__':
+    from aiohttp import web
+
+    parser = argparse.ArgumentParser(description="Serve the flight scheduling assistant as a local HTTP/JSON API.")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, default=2, help="Worker processes for CPU-bound tools (0 = run them on threads).")
+    parser.add_argument('--llm-threads', type=int, default=8, help="Concurrent LLM agent / light tool calls.")
+    parser.add_argument('--no-snapshot', action='store_true', help="Load from the source files even if a snapshot exists.")
+    args = parser.parse_args()
+
+    service = AssistantService(n_workers=args.workers, llm_threads=args.llm_threads, use_snapshot=not args.no_snapshot)
+    print(f"✅ Assistant service listening on http://{args.host}:{args.port}")
+    web.run_app(create_app(service), host=args.host, port=args.port, print=None)
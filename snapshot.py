@@ -0,0 +1,106 @@
+import os
+import json
+import time
+import pickle
+import zipfile
+import pandas as pd
+from data_loader import RAW_DATA_PATH, load_flights
+from flight_index import FlightIndex
+from aggregates import FlightAggregator
+from cascade import CascadeEngine
+import analysis
+
+SNAPSHOT_PATH = os.path.join('data', 'agent_snapshot.zip')
+SUMMARY_PATH = os.path.join('data', 'optimization_summary.json')
+
+
+def _file_signature(path: str):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def summary_to_markdown(optimization_summary) -> str:
+    if not optimization_summary:
+        return "No system-wide optimization summary is available yet. Run `python analysis.py` first."
+    return pd.DataFrame.from_dict(optimization_summary, orient='index', columns=['Value']).to_markdown()
+
+
+def build_snapshot(path=SNAPSHOT_PATH, data_path=RAW_DATA_PATH):
+    """
+    Precomputes everything the agent needs at startup into one zip archive:
+    the UI's pre-computed answers, the optimization summary and hourly
+    aggregates (manifest.json), plus pickled members for the FlightIndex (which
+    carries the flight table), CascadeEngine, the delay model and a warmed
+    prediction cache. Members are stored uncompressed so each can be loaded on
+    its own, on demand.
+    """
+    start = time.perf_counter()
+    model = analysis.get_model()
+    if model is None:
+        raise FileNotFoundError(f"Model file '{analysis.MODEL_PATH}' not found. Please run train_model.py first.")
+    full_df = load_flights(data_path)
+    aggregator = FlightAggregator().update(full_df)
+    try:
+        with open(SUMMARY_PATH) as f:
+            optimization_summary = json.load(f)
+    except FileNotFoundError:
+        optimization_summary = analysis.run_system_wide_optimization(full_df, aggregator.avg_delay_by_hour())
+
+    routes = list(full_df[['origin', 'destination']].drop_duplicates().itertuples(index=False, name=None))
+    analysis.warm_prediction_cache(routes, full_df['sched_time_local'].dt.month.unique().tolist())
+
+    manifest = {
+        'built_at': pd.Timestamp.now().isoformat(timespec='seconds'),
+        'sources': {data_path: _file_signature(data_path), analysis.MODEL_PATH: _file_signature(analysis.MODEL_PATH)},
+        'precomputed_answers': {
+            "What are the 3 busiest hours?": aggregator.busiest_hours().head(3).to_markdown(),
+            "What are the best hours to fly?": aggregator.best_hours().to_markdown(),
+            "Which flights are the biggest cascade risks?": analysis.find_top_cascading_flights(full_df).to_markdown(),
+            "Show me the optimization summary": summary_to_markdown(optimization_summary),
+        },
+        'optimization_summary': optimization_summary,
+        'aggregates': aggregator.to_dict(),
+    }
+    members = {
+        'flight_index.pkl': FlightIndex(full_df),
+        'cascade_engine.pkl': CascadeEngine(full_df),
+        'model.pkl': model,
+        'prediction_cache.pkl': analysis.PREDICTION_CACHE.to_dict(),
+    }
+
+    tmp_path = path + '.tmp'
+    with zipfile.ZipFile(tmp_path, 'w', compression=zipfile.ZIP_STORED) as zf:
+        zf.writestr('manifest.json', json.dumps(manifest))
+        for name, obj in members.items():
+            zf.writestr(name, pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+    os.replace(tmp_path, path)
+    print(f"✅ Agent snapshot saved to '{path}' in {time.perf_counter() - start:.2f}s.")
+    return path
+
+
+class Snapshot:
+    """Read side of build_snapshot: the manifest is read eagerly, every other member on demand."""
+
+    def __init__(self, path=SNAPSHOT_PATH):
+        self.path = path
+        with zipfile.ZipFile(path) as zf:
+            self.manifest = json.loads(zf.read('manifest.json'))
+
+    def is_fresh(self) -> bool:
+        """False if the raw data or the model changed after the snapshot was built."""
+        return all(_file_signature(source) == signature for source, signature in self.manifest['sources'].items())
+
+    @property
+    def model_signature(self):
+        return tuple(self.manifest['sources'][analysis.MODEL_PATH])
+
+    def load(self, member: str):
+        with zipfile.ZipFile(self.path) as zf:
+            return pickle.loads(zf.read(member))
+
+
+if __name__ == '__main__':
+    build_snapshot()
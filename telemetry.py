@@ -0,0 +1,166 @@
+import os
+import json
+import time
+import bisect
+import threading
+from functools import wraps
+from contextlib import contextmanager
+
+PREFIX = 'flight_assistant'
+# Histogram bucket upper bounds: seconds for spans, row counts for batch sizes
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0)
+SIZE_BUCKETS = (1, 10, 100, 1_000, 10_000, 100_000, 1_000_000)
+# Set to a file path to append every measurement to a JSONL log
+LOG_PATH_ENV = 'FLIGHT_TELEMETRY_LOG'
+
+
+def _escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+
+class Telemetry:
+    """
+    In-process counters and histograms. span() times a block of code into the
+    histogram '<name>_seconds' (and counts '<name>_errors' when it raises).
+    Metrics are exported as Prometheus text, and each measurement can also be
+    appended to a JSONL log.
+    """
+
+    def __init__(self, log_path=None):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self._log = None
+        if log_path:
+            self.enable_jsonl_log(log_path)
+
+    def enable_jsonl_log(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self._lock:
+            self._log = open(path, 'a', buffering=1)
+
+    def _write_log(self, kind, name, value, labels):
+        if self._log is not None:
+            self._log.write(json.dumps({"ts": time.time(), "type": kind, "metric": name, "value": value, "labels": labels}) + "\n")
+
+    def increment(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+            self._write_log('counter', name, value, labels)
+
+    def observe(self, name, value, buckets=DURATION_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = _Histogram(buckets)
+            histogram.observe(value)
+            self._write_log('histogram', name, value, labels)
+
+    @contextmanager
+    def span(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.increment(f"{name}_errors", **labels)
+            raise
+        finally:
+            self.observe(f"{name}_seconds", time.perf_counter() - start, **labels)
+
+    def timed(self, name, **labels):
+        """Decorator form of span()."""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name, **labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def snapshot(self) -> dict:
+        """Plain-dict view for the UI: totals for counters, count/mean/max for histograms."""
+        with self._lock:
+            counters = [{"metric": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in sorted(self.counters.items())]
+            histograms = [{"metric": name, "labels": dict(labels), "count": h.count, "sum": h.sum,
+                           "mean": h.sum / h.count if h.count else 0.0, "max": h.max}
+                          for (name, labels), h in sorted(self.histograms.items())]
+        return {"counters": counters, "histograms": histograms}
+
+    def to_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        def fmt(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            return "{" + ",".join(f'{k}="{_escape_label(v)}"' for k, v in pairs) + "}" if pairs else ""
+
+        lines = []
+        with self._lock:
+            for name in sorted({name for name, _ in self.counters}):
+                lines.append(f"# TYPE {PREFIX}_{name}_total counter")
+                for (metric, labels), value in sorted(self.counters.items()):
+                    if metric == name:
+                        lines.append(f"{PREFIX}_{name}_total{fmt(labels)} {value}")
+            for name in sorted({name for name, _ in self.histograms}):
+                lines.append(f"# TYPE {PREFIX}_{name} histogram")
+                for (metric, labels), h in sorted(self.histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(list(h.buckets) + ['+Inf'], h.counts):
+                        cumulative += count
+                        lines.append(f"{PREFIX}_{name}_bucket{fmt(labels, [('le', bound)])} {cumulative}")
+                    lines.append(f"{PREFIX}_{name}_sum{fmt(labels)} {h.sum}")
+                    lines.append(f"{PREFIX}_{name}_count{fmt(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def serve_prometheus(self, port=9108, host='127.0.0.1'):
+        """Serves to_prometheus() at http://host:port/metrics from a background thread."""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        telemetry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = telemetry.to_prometheus().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"✅ Prometheus metrics at http://{host}:{port}/metrics")
+        return server
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+
+# Process-wide instance used by the analysis code, the agent tools and the UI
+TELEMETRY = Telemetry(os.environ.get(LOG_PATH_ENV))
+span = TELEMETRY.span
+timed = TELEMETRY.timed
+increment = TELEMETRY.increment
+observe = TELEMETRY.observe
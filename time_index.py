@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+from telemetry import timed
+
+WEEKDAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+# Longest look-ahead the runway-load questions answer; occupancy() builds one window per step
+MAX_LOOKAHEAD_MINS = 24 * 60
+
+
+def _minutes(times) -> np.ndarray:
+    """Whole minutes since the epoch, as int64."""
+    return pd.to_datetime(times).to_numpy().astype('datetime64[m]').astype(np.int64)
+
+
+def _minute(timestamp) -> int:
+    return int(pd.Timestamp(timestamp).to_datetime64().astype('datetime64[m]').astype(np.int64))
+
+
+class TimeIndex:
+    """
+    Sorted-array index over the scheduled and actual movement times. Counting
+    or listing the movements in a window is two binary searches (O(log n),
+    plus the rows returned), and sliding-window occupancy is two vectorized
+    searchsorted calls over all the windows at once. Windows are half-open:
+    [start, end).
+
+    Each flight also has a delay interval, from its scheduled to its actual
+    time (the other way round for early flights); overlap() finds the flights
+    whose interval touches a window, e.g. late flights still to operate.
+    """
+
+    def __init__(self, full_flight_df: pd.DataFrame):
+        self.df = full_flight_df
+        sched = _minutes(full_flight_df['sched_time_local'])
+        actual = _minutes(full_flight_df['actual_time_local']) if 'actual_time_local' in full_flight_df else sched
+        self._order = {}
+        self._times = {}
+        for column, values in (('sched', sched), ('actual', actual)):
+            self._order[column] = np.argsort(values, kind='stable')
+            self._times[column] = values[self._order[column]]
+
+        start, stop = np.minimum(sched, actual), np.maximum(sched, actual)
+        self._interval_order = np.argsort(start, kind='stable')
+        self._interval_starts = start[self._interval_order]
+        self._interval_stops = stop
+        self._sorted_stops = np.sort(stop)
+        self._max_interval = int((stop - start).max()) if len(start) else 0
+
+    def __len__(self):
+        return len(self.df)
+
+    def _bounds(self, start, end, column):
+        times = self._times[column]
+        return times.searchsorted(_minute(start), 'left'), times.searchsorted(_minute(end), 'left')
+
+    def count(self, start, end, column='sched') -> int:
+        """Movements in [start, end) by scheduled ('sched') or actual ('actual') time."""
+        lo, hi = self._bounds(start, end, column)
+        return int(hi - lo)
+
+    @timed('time_index_query', kind='range')
+    def between(self, start, end, column='sched') -> pd.DataFrame:
+        """The flight rows with their `column` time in [start, end), in time order."""
+        lo, hi = self._bounds(start, end, column)
+        return self.df.iloc[self._order[column][lo:hi]]
+
+    def count_overlap(self, start, end) -> int:
+        """Flights whose delay interval overlaps [start, end)."""
+        start, end = _minute(start), _minute(end)
+        # Every interval that ends before `start` also starts before `end`
+        return int(self._interval_starts.searchsorted(end, 'left') - self._sorted_stops.searchsorted(start, 'left'))
+
+    @timed('time_index_query', kind='overlap')
+    def overlap(self, start, end) -> pd.DataFrame:
+        """The flight rows whose delay interval overlaps [start, end), by start of interval."""
+        start, end = _minute(start), _minute(end)
+        # Only intervals starting in [start - longest interval, end) can reach the window
+        lo = self._interval_starts.searchsorted(start - self._max_interval, 'left')
+        hi = self._interval_starts.searchsorted(end, 'left')
+        positions = self._interval_order[lo:hi]
+        return self.df.iloc[positions[self._interval_stops[positions] >= start]]
+
+    @timed('time_index_query', kind='occupancy')
+    def occupancy(self, start, end, window_mins=60, step_mins=15, column='sched') -> pd.DataFrame:
+        """Movements in every sliding window [t, t + window_mins), for t from start to end in steps of step_mins."""
+        starts = np.arange(_minute(start), _minute(end), step_mins, dtype=np.int64)
+        times = self._times[column]
+        counts = times.searchsorted(starts + window_mins, 'left') - times.searchsorted(starts, 'left')
+        window_starts = pd.to_datetime(starts.astype('datetime64[m]'))
+        return pd.DataFrame({'window_start': window_starts,
+                             'window_end': window_starts + pd.Timedelta(minutes=window_mins),
+                             'movements': counts})
+
+    def peak_window(self, start, end, window_mins=15, step_mins=5, column='sched') -> pd.Series:
+        """The busiest window_mins-long window starting in [start, end)."""
+        occupancy = self.occupancy(start, end, window_mins, step_mins, column)
+        return occupancy.iloc[int(occupancy['movements'].to_numpy().argmax())] if len(occupancy) else None
+
+    @property
+    def first_time(self) -> pd.Timestamp:
+        return pd.Timestamp(self._times['sched'][0].astype('datetime64[m]'))
+
+    @property
+    def last_time(self) -> pd.Timestamp:
+        return pd.Timestamp(self._times['sched'][-1].astype('datetime64[m]'))
+
+    def reference_time(self, now=None) -> pd.Timestamp:
+        """
+        `now` (default: the current time) if the schedule covers it; otherwise
+        the same weekday and time of day in the schedule's last week, so "the
+        next 45 minutes" still means something for a historical schedule.
+        """
+        now = pd.Timestamp.now().floor('min') if now is None else pd.Timestamp(now)
+        if self.first_time <= now <= self.last_time:
+            return now
+        last = self.last_time
+        candidate = last.normalize() + (now - now.normalize()) - pd.Timedelta(days=(last.weekday() - now.weekday()) % 7)
+        return candidate - pd.Timedelta(days=7) if candidate > last else candidate
+
+    def day_windows(self, day, start_time, end_time):
+        """
+        [(start, end)] timestamps for a time-of-day window ('09:30'-'10:15') on a
+        date ('2025-08-12'), on every date with that weekday ('Tuesday'), or on
+        every date in the schedule (day=None). An end before the start runs past midnight.
+        """
+        if day is None or str(day).strip().capitalize() in WEEKDAYS:
+            dates = pd.date_range(self.first_time.normalize(), self.last_time.normalize(), freq='D')
+            if day is not None:
+                dates = dates[dates.weekday == WEEKDAYS.index(str(day).strip().capitalize())]
+        else:
+            dates = [pd.Timestamp(day).normalize()]
+        start_offset, end_offset = pd.Timedelta(f"{start_time}:00"), pd.Timedelta(f"{end_time}:00")
+        if end_offset <= start_offset:
+            end_offset += pd.Timedelta(days=1)
+        return [(date + start_offset, date + end_offset) for date in dates]
@@ -1,5 +1,16 @@
+import os
+import io
+import json
+import time
+import shutil
+import argparse
+import itertools
+import tempfile
+import contextlib
+import multiprocessing
 import pandas as pd
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import OneHotEncoder
 from sklearn.compose import ColumnTransformer
@@ -7,73 +18,386 @@ from sklearn.pipeline import Pipeline
 from xgboost import XGBRegressor
 from sklearn.metrics import mean_absolute_error
 import joblib
+from data_loader import RAW_DATA_PATH, load_flights
+import analysis
+from analysis import MODEL_PATH, MODEL_FEATURES
+from fast_model import export_inference_artifact, verify_fast_model, FastDelayModel
 
-def train_and_save_model():
-    """
-    Loads raw data, trains an XGBoost model to predict flight delays,
-    and saves the entire pipeline to a file.
-    """
-    print("--- Starting ML Model Training ---")
-    
-    # --- 1. Load Data ---
-    try:
-        df = pd.read_csv('data/bom_week_flights_synthetic.csv')
-        df['sched_time_local'] = pd.to_datetime(df['sched_time_local'])
-        df['actual_time_local'] = pd.to_datetime(df['actual_time_local'])
-    except FileNotFoundError:
-        print("Error: Raw data file not found. Please ensure it's in the data/ folder.")
-        return
+REGISTRY_PATH = os.path.join('data', 'model_registry.json')
+MODELS_DIR = os.path.join('data', 'models')
 
-    # --- 2. Feature Engineering ---
+# name -> (categorical features, numeric features). Only 'base' can be promoted to
+# MODEL_PATH: it is the feature set analysis.predict_delays builds for candidate times.
+FEATURE_SETS = {
+    'base': (['origin', 'destination'], ['sched_hour', 'sched_weekday', 'sched_month']),
+    'operator': (['origin', 'destination', 'airline', 'op_type'], ['sched_hour', 'sched_weekday', 'sched_month']),
+    'rotation': (['origin', 'destination', 'airline', 'op_type'],
+                 ['sched_hour', 'sched_weekday', 'sched_month', 'tail_leg_of_day', 'tail_turnaround_min']),
+    'full': (['origin', 'destination', 'airline', 'op_type'],
+             ['sched_hour', 'sched_weekday', 'sched_month', 'tail_leg_of_day', 'tail_turnaround_min', 'hour_movements']),
+}
+DEFAULT_PARAMS = {'n_estimators': 100, 'learning_rate': 0.1}
+# Hyperparameter grid for search_models(); n_estimators is an upper bound, early stopping picks the rounds
+SEARCH_SPACE = {
+    'max_depth': [3, 6, 9],
+    'learning_rate': [0.03, 0.1, 0.3],
+    'min_child_weight': [1, 5],
+    'subsample': [0.8, 1.0],
+}
+SEARCH_MAX_ROUNDS = 1000
+
+# Per-worker training data and XGBoost thread count, set by _init_trial_worker
+_TRIAL_DF = None
+_TRIAL_THREADS = None
+
+
+def add_model_features(df: pd.DataFrame) -> pd.DataFrame:
+    """Adds the target and every feature column used by FEATURE_SETS to a flight table (in place)."""
     df['delay_min'] = (df['actual_time_local'] - df['sched_time_local']).dt.total_seconds() / 60
     # Handle potential outliers or negative delays (early flights)
     df['delay_min'] = df['delay_min'].clip(lower=0)
-    
-    df['sched_hour'] = df['sched_time_local'].dt.hour
-    df['sched_weekday'] = df['sched_time_local'].dt.weekday
-    df['sched_month'] = df['sched_time_local'].dt.month
 
-    # --- 3. Define Features and Target ---
-    # Note: 'tail_id' can have too many unique values, making the model complex.
-    # We will use 'origin', 'destination', and time-based features for a robust model.
-    features = ['origin', 'destination', 'sched_hour', 'sched_weekday', 'sched_month']
-    target = 'delay_min'
+    sched = df['sched_time_local']
+    df['sched_hour'] = sched.dt.hour
+    df['sched_weekday'] = sched.dt.weekday
+    df['sched_month'] = sched.dt.month
 
-    X = df[features]
-    y = df[target]
+    # 'tail_id' itself has too many values to one-hot encode; use the aircraft's rotation instead:
+    # which leg of its day this is, and the scheduled minutes since its previous leg (NaN for the first)
+    day = sched.dt.normalize().rename('day')
+    ordered = df[['tail_id', 'sched_time_local']].assign(day=day).sort_values('sched_time_local', kind='stable')
+    legs = ordered.groupby(['tail_id', 'day'], observed=True, sort=False)
+    df['tail_leg_of_day'] = (legs.cumcount() + 1).reindex(df.index)
+    df['tail_turnaround_min'] = (legs['sched_time_local'].diff().dt.total_seconds() / 60).reindex(df.index)
+    # Congestion: scheduled movements in the same hour of the same day
+    df['hour_movements'] = df.groupby([day, sched.dt.hour.rename('hour')])['flight'].transform('size')
+    return df
 
-    # --- 4. Preprocessing ---
-    categorical_features = ['origin', 'destination']
-    numeric_features = ['sched_hour', 'sched_weekday', 'sched_month']
 
-    # Create a preprocessor pipeline
+def build_pipeline(feature_set='base', **params) -> Pipeline:
+    categorical_features, numeric_features = FEATURE_SETS[feature_set]
     preprocessor = ColumnTransformer(
         transformers=[
             ('num', 'passthrough', numeric_features),
             ('cat', OneHotEncoder(handle_unknown='ignore'), categorical_features)
         ])
-
-    # --- 5. Create and Train the XGBoost Model Pipeline ---
-    model_pipeline = Pipeline(steps=[
+    return Pipeline(steps=[
         ('preprocessor', preprocessor),
-        ('regressor', XGBRegressor(n_estimators=100, learning_rate=0.1, random_state=42))
+        ('regressor', XGBRegressor(random_state=42, **{**DEFAULT_PARAMS, **params}))
     ])
 
+
+def feature_columns(feature_set='base'):
+    categorical_features, numeric_features = FEATURE_SETS[feature_set]
+    return categorical_features + numeric_features
+
+
+def fit_delay_model(df: pd.DataFrame):
+    """Trains the delay model pipeline on a flight table; returns (pipeline, test MAE in minutes)."""
+    # --- 2. Feature Engineering ---
+    add_model_features(df)
+
+    # --- 3. Define Features and Target ---
+    # We use 'origin', 'destination', and time-based features for a robust model.
+    X = df[MODEL_FEATURES]
+    y = df['delay_min']
+
+    # --- 4./5. Create and Train the XGBoost Model Pipeline ---
+    model_pipeline = build_pipeline('base')
+
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
     print("Training XGBoost model...")
     model_pipeline.fit(X_train, y_train)
-    
+
     # --- 6. Evaluate the Model ---
     y_pred = model_pipeline.predict(X_test)
     mae = mean_absolute_error(y_test, y_pred)
     print(f"Model Training Complete. Mean Absolute Error on test data: {mae:.2f} minutes.")
-    
-    # --- 7. Save the Trained Model Pipeline ---
-    model_filename = 'flight_delay_model.joblib'
-    joblib.dump(model_pipeline, model_filename)
-    print(f"✅ Model pipeline saved successfully as '{model_filename}'")
+    return model_pipeline, mae
+
+
+# --- Model registry ---
+
+def load_registry(path=REGISTRY_PATH) -> dict:
+    """{'current': id of the model at MODEL_PATH (or None), 'models': [entries, oldest first]}."""
+    if not os.path.exists(path):
+        return {"current": None, "models": []}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_registry(registry, path=REGISTRY_PATH):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(registry, f, indent=4)
+
+
+def measure_inference_latency(pipeline, features_df: pd.DataFrame, repeat=50) -> dict:
+    """Single-row p50 latency (ms) and batch cost (us/row) of the fast inference path for `pipeline`."""
+    with tempfile.TemporaryDirectory() as tmp:
+        fast = FastDelayModel(_quietly_export(pipeline, os.path.join(tmp, 'model.xgb.json')))
+    rows = [features_df.iloc[[i % len(features_df)]] for i in range(repeat)]
+    single = []
+    for row in rows:
+        start = time.perf_counter()
+        fast.predict(row)
+        single.append(time.perf_counter() - start)
+    batch = features_df.iloc[:10_000]
+    start = time.perf_counter()
+    fast.predict(batch)
+    batch_seconds = time.perf_counter() - start
+    return {"latency_ms": float(np.median(single)) * 1000, "batch_us_per_row": batch_seconds / len(batch) * 1e6}
+
+
+def _quietly_export(pipeline, path):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return export_inference_artifact(pipeline, path)
+
+
+def register_model(pipeline, entry: dict, features_df: pd.DataFrame, registry_path=REGISTRY_PATH) -> dict:
+    """
+    Saves `pipeline` under data/models/ and appends `entry` (kind, feature_set,
+    params, mae, train_seconds, ...) plus its measured inference latency to
+    the registry. Returns the completed entry.
+    """
+    registry = load_registry(registry_path)
+    model_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{entry['kind']}-{len(registry['models']):04d}"
+    os.makedirs(MODELS_DIR, exist_ok=True)
+    path = os.path.join(MODELS_DIR, f"{model_id}.joblib")
+    joblib.dump(pipeline, path)
+    entry = {"id": model_id, "path": path, "created": pd.Timestamp.now().isoformat(timespec='seconds'), **entry,
+             **measure_inference_latency(pipeline, features_df[feature_columns(entry['feature_set'])])}
+    registry['models'].append(entry)
+    _save_registry(registry, registry_path)
+    return entry
+
+
+def pareto_front(entries) -> list:
+    """Entries no other entry beats on both MAE and single-row latency."""
+    return [e for e in entries
+            if not any(o['mae'] <= e['mae'] and o['latency_ms'] <= e['latency_ms']
+                       and (o['mae'] < e['mae'] or o['latency_ms'] < e['latency_ms']) for o in entries)]
+
+
+def print_registry(registry_path=REGISTRY_PATH):
+    registry = load_registry(registry_path)
+    if not registry['models']:
+        print("No registered models yet. Run train_model.py (or --search) first.")
+        return
+    front = {e['id'] for e in pareto_front(registry['models'])}
+    print(f"{'':2s}{'id':34s}{'features':10s}{'MAE':>8s}{'train s':>9s}{'1-row ms':>10s}{'us/row':>8s}  params")
+    for e in sorted(registry['models'], key=lambda e: e['mae']):
+        mark = ('>' if e['id'] == registry['current'] else ' ') + ('*' if e['id'] in front else ' ')
+        print(f"{mark}{e['id']:34s}{e['feature_set']:10s}{e['mae']:8.2f}{e['train_seconds']:9.2f}"
+              f"{e['latency_ms']:10.3f}{e['batch_us_per_row']:8.1f}  {e['params']}")
+    print("('>' = current model, '*' = best accuracy-vs-latency trade-off)")
+
+
+def promote_model(model_id: str, data_path=RAW_DATA_PATH, registry_path=REGISTRY_PATH):
+    """
+    Makes a registered model the one analysis.py loads, re-exports the fast
+    inference artifact and rebuilds the delay surface over the routes in
+    `data_path`.
+    """
+    registry = load_registry(registry_path)
+    entry = next((e for e in registry['models'] if e['id'] == model_id), None)
+    if entry is None:
+        print(f"⚠️ No registered model '{model_id}'. Run `python train_model.py --list` to see them.")
+        return False
+    if feature_columns(entry['feature_set']) != feature_columns('base'):
+        print(f"⚠️ Model '{model_id}' uses the '{entry['feature_set']}' features, but the optimizer only builds "
+              f"{MODEL_FEATURES}; it stays in the registry for comparison.")
+        return False
+    pipeline = joblib.load(entry['path'])
+    shutil.copyfile(entry['path'], MODEL_PATH)
+    print(f"✅ Model pipeline saved successfully as '{MODEL_PATH}'")
+    # Export the standalone booster used by analysis.py's fast inference path
+    artifact = export_inference_artifact(pipeline)
+    diff = verify_fast_model(FastDelayModel(artifact), pipeline)
+    print(f"✅ Fast inference path matches the pipeline (max difference {diff:.2e} minutes).")
+    # Precompute route x hour x weekday x month so what-if queries and the optimizer skip the model
+    routes = load_flights(data_path)[['origin', 'destination']].drop_duplicates()
+    analysis.rebuild_delay_surface(routes.itertuples(index=False, name=None))
+    registry['current'] = model_id
+    _save_registry(registry, registry_path)
+    return True
+
+
+def _data_through(df) -> str:
+    return df['sched_time_local'].max().strftime('%Y-%m-%d')
+
+
+def train_and_save_model(data_path=RAW_DATA_PATH):
+    """
+    Loads raw data, trains an XGBoost model to predict flight delays,
+    registers it and saves the entire pipeline to a file.
+    """
+    print("--- Starting ML Model Training ---")
+
+    # --- 1. Load Data ---
+    try:
+        df = load_flights(data_path)
+    except FileNotFoundError:
+        print("Error: Raw data file not found. Please ensure it's in the data/ folder.")
+        return
+
+    start = time.perf_counter()
+    model_pipeline, mae = fit_delay_model(df)
+    entry = register_model(model_pipeline, {
+        "kind": "full", "feature_set": "base", "params": DEFAULT_PARAMS, "mae": mae,
+        "train_seconds": time.perf_counter() - start, "n_rows": len(df), "data_through": _data_through(df)}, df)
+
+    # --- 7. Save the Trained Model Pipeline (with its fast inference artifact and delay surface) ---
+    promote_model(entry['id'], data_path)
+
+
+# --- Incremental training ---
+
+def continue_training(data_path=RAW_DATA_PATH, since=None, rounds=50):
+    """
+    Boosts `rounds` more trees onto the current model using only the flights
+    scheduled after `since` (default: the last day the current model was
+    trained on, from the registry). The fitted preprocessing is kept, so
+    airports the model has never seen are ignored as before. The result is
+    registered, and promoted only if it is at least as accurate as the current
+    model on held-out new flights.
+    """
+    print("--- Continuing ML Model Training ---")
+    registry = load_registry()
+    current = next((e for e in registry['models'] if e['id'] == registry['current']), None)
+    since = since or (current or {}).get('data_through')
+    if since is None:
+        print("⚠️ The current model is not in the registry, so the new days are unknown; pass --since YYYY-MM-DD.")
+        return None
+    if not os.path.exists(MODEL_PATH):
+        print(f"⚠️ Model file '{MODEL_PATH}' not found. Please run train_model.py first.")
+        return None
+    df = add_model_features(load_flights(data_path))
+    new = df[df['sched_time_local'] >= pd.Timestamp(since) + pd.Timedelta(days=1)]
+    if len(new) < 10:
+        print(f"⚠️ Only {len(new)} flight(s) after {since}; nothing to train on.")
+        return None
+    X_train, X_test, y_train, y_test = train_test_split(new[MODEL_FEATURES], new['delay_min'], test_size=0.2, random_state=42)
+
+    pipeline = joblib.load(MODEL_PATH)
+    preprocessor, regressor = pipeline.named_steps['preprocessor'], pipeline.named_steps['regressor']
+    mae_before = mean_absolute_error(y_test, pipeline.predict(X_test))
+    booster = regressor.get_booster()
+    try:
+        booster = booster[:regressor.best_iteration + 1]  # continue from the trees predict actually uses
+    except AttributeError:  # not trained with early stopping
+        pass
+
+    print(f"Boosting {rounds} more rounds on {len(X_train)} new flights (after {since})...")
+    start = time.perf_counter()
+    params = {k: v for k, v in regressor.get_params().items() if k != 'early_stopping_rounds'}
+    continued = XGBRegressor(**{**params, 'n_estimators': rounds})
+    continued.fit(preprocessor.transform(X_train), y_train, xgb_model=booster)
+    train_seconds = time.perf_counter() - start
+    model_pipeline = Pipeline(steps=[('preprocessor', preprocessor), ('regressor', continued)])
+    mae = mean_absolute_error(y_test, model_pipeline.predict(X_test))
+    print(f"MAE on held-out new flights: {mae_before:.2f} -> {mae:.2f} minutes.")
+
+    entry = register_model(model_pipeline, {
+        "kind": "continued", "feature_set": "base", "params": {**(current or {}).get('params', {}), 'extra_rounds': rounds},
+        "mae": mae, "train_seconds": train_seconds, "n_rows": len(new), "data_through": _data_through(new),
+        "parent": registry['current']}, new)
+    if mae > mae_before:
+        print(f"⚠️ Continued model '{entry['id']}' is less accurate on the new flights; keeping the current model.")
+        return entry
+    promote_model(entry['id'], data_path)
+    return entry
+
+
+# --- Hyperparameter / feature search ---
+
+def _init_trial_worker(df, n_threads):
+    global _TRIAL_DF, _TRIAL_THREADS
+    _TRIAL_DF, _TRIAL_THREADS = df, n_threads
+
+
+def _run_trial(feature_set, params, early_stopping_rounds):
+    """One search trial: fits on the train split, early-stops on a validation split, scores on the test split."""
+    df = _TRIAL_DF
+    X, y = df[feature_columns(feature_set)], df['delay_min']
+    # Same test split as fit_delay_model, so MAEs are comparable with the full-retrain models
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    X_train, X_val, y_train, y_val = train_test_split(X_train, y_train, test_size=0.1, random_state=42)
+
+    start = time.perf_counter()
+    pipeline = build_pipeline(feature_set, n_estimators=SEARCH_MAX_ROUNDS, n_jobs=_TRIAL_THREADS,
+                              early_stopping_rounds=early_stopping_rounds, **params)
+    preprocessor, regressor = pipeline.named_steps['preprocessor'], pipeline.named_steps['regressor']
+    regressor.fit(preprocessor.fit_transform(X_train), y_train,
+                  eval_set=[(preprocessor.transform(X_val), y_val)], verbose=False)
+    train_seconds = time.perf_counter() - start
+    mae = mean_absolute_error(y_test, pipeline.predict(X_test))
+    return pipeline, {"kind": "search", "feature_set": feature_set, "params": params, "mae": mae,
+                      "train_seconds": train_seconds, "rounds": int(regressor.best_iteration) + 1}
+
+
+def search_models(data_path=RAW_DATA_PATH, n_trials=24, n_workers=None, feature_sets=tuple(FEATURE_SETS),
+                  early_stopping_rounds=20, seed=0):
+    """
+    Trains `n_trials` random (feature set, hyperparameter) combinations from
+    FEATURE_SETS x SEARCH_SPACE across `n_workers` processes (default: every
+    core), each with early stopping on a validation split. Every trial is
+    registered with its test MAE, training time and inference latency.
+    Returns the registered entries.
+    """
+    n_workers = n_workers or os.cpu_count() or 1
+    df = add_model_features(load_flights(data_path))
+    grid = [dict(zip(SEARCH_SPACE, values)) for values in itertools.product(*SEARCH_SPACE.values())]
+    trials = list(itertools.product(feature_sets, grid))
+    rng = np.random.default_rng(seed)
+    trials = [trials[i] for i in rng.choice(len(trials), size=min(n_trials, len(trials)), replace=False)]
+    print(f"--- Searching {len(trials)} model(s) on {len(df)} flights using {n_workers} worker(s) ---")
+
+    columns = sorted({c for feature_set in feature_sets for c in feature_columns(feature_set)} | {'delay_min'})
+    train_df = df[columns]
+    start = time.perf_counter()
+    if n_workers > 1:
+        # One XGBoost thread per trial, so the trials don't fight over the cores
+        with ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_trial_worker, initargs=(train_df, 1)) as pool:
+            outputs = list(pool.map(_run_trial, *zip(*trials), [early_stopping_rounds] * len(trials)))
+    else:
+        _init_trial_worker(train_df, None)
+        outputs = [_run_trial(feature_set, params, early_stopping_rounds) for feature_set, params in trials]
+    print(f"Trained {len(outputs)} model(s) in {time.perf_counter() - start:.1f}s.")
+
+    # Latency is measured here, one model at a time, so the timings aren't skewed by concurrent trials
+    entries = [register_model(pipeline, {**entry, "n_rows": len(df), "data_through": _data_through(df)}, df)
+               for pipeline, entry in outputs]
+    best = min(entries, key=lambda e: e['mae'])
+    print(f"✅ Best model: '{best['id']}' ({best['feature_set']} features, MAE {best['mae']:.2f} minutes).")
+    return entries
 
 
 if __name__ == '__main__':
-    train_and_save_model()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Train, search and register the flight delay model.")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--continue', dest='resume', action='store_true',
+                      help="Boost more rounds onto the current model using only the newly appended days.")
+    mode.add_argument('--search', action='store_true', help="Parallel hyperparameter/feature search with early stopping.")
+    mode.add_argument('--list', action='store_true', help="Show every registered model.")
+    mode.add_argument('--promote', metavar='MODEL_ID', help="Make a registered model the current one.")
+    parser.add_argument('--data', default=RAW_DATA_PATH, help="Flight CSV to train on.")
+    parser.add_argument('--since', default=None, help="--continue: train on flights after this date (YYYY-MM-DD).")
+    parser.add_argument('--rounds', type=int, default=50, help="--continue: boosting rounds to add.")
+    parser.add_argument('--trials', type=int, default=24, help="--search: number of trials.")
+    parser.add_argument('--workers', type=int, default=None, help="--search: worker processes (default: every core).")
+    args = parser.parse_args()
+
+    if args.resume:
+        continue_training(args.data, since=args.since, rounds=args.rounds)
+    elif args.search:
+        search_models(args.data, n_trials=args.trials, n_workers=args.workers)
+        print_registry()
+    elif args.list:
+        print_registry()
+    elif args.promote:
+        promote_model(args.promote, args.data)
+    else:
+        train_and_save_model(args.data)